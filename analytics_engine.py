@@ -0,0 +1,300 @@
+# Analytics engine for the Advanced Analytics tabs
+# Runs profit, turnover, ABC and KPI queries in DuckDB when it is installed,
+# reading the analytics replica of inventory.db through the sqlite scanner (or,
+# when the extension cannot be loaded, from a columnar copy refreshed with each
+# replica). Falls back to pandas over the replica when DuckDB is not available.
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from analytics_replica import current_replica, replica_connection
+from database import day_range_clause
+from inventory_overview import aging_frame, query_aging
+from kpi_engine import derive_kpis, query_kpis, query_weekly_kpis
+from stock_ledger import query_average_inventory, query_inventory_levels
+
+try:
+    import duckdb
+except ImportError:  # DuckDB is optional
+    duckdb = None
+
+ANALYTICS_TABLES = ('products', 'sales', 'expenses')
+SQLITE_TO_DUCKDB_TYPES = {'INTEGER': 'BIGINT', 'REAL': 'DOUBLE', 'TEXT': 'VARCHAR'}
+MAX_COLUMNAR_COPIES = 8
+RETIRED_CONNECTION_GRACE_SECONDS = 60
+
+_duckdb_lock = threading.Lock()
+_attached_connections = {}
+_columnar_copies = {}  # least recently used first
+_retired_connections = []
+_scanner_unavailable = set()
+
+def analytics_backend():
+    """Name of the engine used for analytics queries"""
+    return 'duckdb' if duckdb is not None else 'pandas'
+
+def _attach_sqlite(db_path):
+    """Attach the SQLite database read-only through DuckDB's sqlite scanner"""
+    con = duckdb.connect()
+    try:
+        con.execute('LOAD sqlite')
+    except duckdb.Error:
+        con.execute('INSTALL sqlite')
+        con.execute('LOAD sqlite')
+    con.execute(f"ATTACH '{db_path.replace(chr(39), chr(39) * 2)}' AS inv (TYPE SQLITE, READ_ONLY)")
+    return con
+
+def _columnar_copy(user_id):
+    """Copy a user's rows from the replica into an in-memory DuckDB database"""
+    con = duckdb.connect()
+    con.execute('CREATE SCHEMA inv')
+    conn = replica_connection()
+    for table in ANALYTICS_TABLES:
+        # Declare columns from the SQLite schema so empty copies keep their types
+        columns = [f"{name} {SQLITE_TO_DUCKDB_TYPES.get(declared.upper(), 'VARCHAR')}"
+                   for _, name, declared, *_ in conn.execute(f'PRAGMA table_info({table})').fetchall()]
+        con.execute(f"CREATE TABLE inv.{table} ({', '.join(columns)})")
+        df = pd.read_sql_query(f'SELECT * FROM {table} WHERE user_id = ?', conn, params=(user_id,))
+        if not df.empty:
+            con.register('source_frame', df)
+            con.execute(f'INSERT INTO inv.{table} SELECT * FROM source_frame')
+            con.unregister('source_frame')
+    conn.close()
+    return con
+
+def _retire(con):
+    """Close a replaced DuckDB connection after a grace period; closing it at once would break
+    cursors other sessions took from it just before the swap"""
+    _retired_connections.append((time.monotonic(), con))
+
+def _close_retired():
+    now = time.monotonic()
+    while _retired_connections and now - _retired_connections[0][0] > RETIRED_CONNECTION_GRACE_SECONDS:
+        _retired_connections.pop(0)[1].close()
+
+def _duckdb_cursor(user_id):
+    """Return a DuckDB cursor with products, sales and expenses under the inv schema"""
+    db_path, as_of = current_replica()
+    with _duckdb_lock:
+        _close_retired()
+        if db_path not in _scanner_unavailable:
+            # A refresh replaces the replica file, so attach each copy afresh
+            attached = _attached_connections.get(db_path)
+            if attached is None or attached[0] != as_of:
+                if attached is not None:
+                    _retire(_attached_connections.pop(db_path)[1])
+                try:
+                    attached = (as_of, _attach_sqlite(db_path))
+                    _attached_connections[db_path] = attached
+                except duckdb.Error:
+                    _scanner_unavailable.add(db_path)
+                    attached = None
+            if attached is not None:
+                return attached[1].cursor()
+
+        cached = _columnar_copies.pop((db_path, user_id), None)
+        if cached is None or cached[0] != as_of:
+            if cached is not None:
+                _retire(cached[1])
+            # Copies of an older replica would be rebuilt anyway, and only the
+            # most recently used users keep one
+            for key in [key for key, (copy_as_of, _) in _columnar_copies.items() if copy_as_of != as_of]:
+                _retire(_columnar_copies.pop(key)[1])
+            while len(_columnar_copies) >= MAX_COLUMNAR_COPIES:
+                _retire(_columnar_copies.pop(next(iter(_columnar_copies)))[1])
+            cached = (as_of, _columnar_copy(user_id))
+        _columnar_copies[(db_path, user_id)] = cached
+        return cached[1].cursor()
+
+def _load_frame(query, params):
+    conn = replica_connection()
+    df = pd.read_sql_query(query, conn, params=params)
+    conn.close()
+    return df
+
+def profit_over_time(user_id, since=None, until=None):
+    """Daily revenue, cost, profit and cumulative profit within [since, until]"""
+    day_clause, day_params = day_range_clause(since, until)
+    if duckdb is not None:
+        return _duckdb_cursor(user_id).execute(f'''
+            WITH s AS (
+                SELECT TRY_CAST(day AS DATE) AS date, SUM(revenue) AS revenue
+                FROM inv.sales WHERE user_id = ?{day_clause} GROUP BY 1
+            ), e AS (
+                SELECT TRY_CAST(day AS DATE) AS date, SUM(cost) AS cost
+                FROM inv.expenses WHERE user_id = ?{day_clause} GROUP BY 1
+            )
+            SELECT date, COALESCE(revenue, 0) AS revenue, COALESCE(cost, 0) AS cost,
+                   COALESCE(revenue, 0) - COALESCE(cost, 0) AS profit,
+                   SUM(COALESCE(revenue, 0) - COALESCE(cost, 0)) OVER (ORDER BY date) AS cumulative_profit
+            FROM s FULL OUTER JOIN e USING (date)
+            WHERE date IS NOT NULL
+            ORDER BY date
+        ''', (user_id, *day_params, user_id, *day_params)).df()
+
+    sales_by_date = _load_frame(f'SELECT day, revenue FROM sales WHERE user_id = ?{day_clause}', (user_id, *day_params))
+    expenses_by_date = _load_frame(f'SELECT day, cost FROM expenses WHERE user_id = ?{day_clause}', (user_id, *day_params))
+    sales_by_date = sales_by_date.groupby(pd.to_datetime(sales_by_date['day'], errors='coerce').rename('date'))['revenue'].sum().reset_index()
+    expenses_by_date = expenses_by_date.groupby(pd.to_datetime(expenses_by_date['day'], errors='coerce').rename('date'))['cost'].sum().reset_index()
+
+    profit_df = pd.merge(sales_by_date, expenses_by_date, on='date', how='outer').fillna(0)
+    profit_df = profit_df.sort_values('date').reset_index(drop=True)
+    profit_df['profit'] = profit_df['revenue'] - profit_df['cost']
+    profit_df['cumulative_profit'] = profit_df['profit'].cumsum()
+    return profit_df
+
+def profit_by_product(user_id, since=None, until=None):
+    """Revenue, cost, profit and margin per product within [since, until], most profitable first"""
+    day_clause, day_params = day_range_clause(since, until)
+    if duckdb is not None:
+        return _duckdb_cursor(user_id).execute(f'''
+            WITH s AS (
+                SELECT product, SUM(revenue) AS revenue FROM inv.sales WHERE user_id = ?{day_clause} GROUP BY product
+            ), e AS (
+                SELECT product, SUM(cost) AS cost FROM inv.expenses WHERE user_id = ?{day_clause} GROUP BY product
+            )
+            SELECT product, COALESCE(revenue, 0) AS revenue, COALESCE(cost, 0) AS cost,
+                   COALESCE(revenue, 0) - COALESCE(cost, 0) AS profit,
+                   ROUND((COALESCE(revenue, 0) - COALESCE(cost, 0)) / NULLIF(revenue, 0) * 100, 2) AS margin
+            FROM s FULL OUTER JOIN e USING (product)
+            ORDER BY profit DESC, product
+        ''', (user_id, *day_params, user_id, *day_params)).df()
+
+    product_profit = _load_frame(f'SELECT product, revenue FROM sales WHERE user_id = ?{day_clause}', (user_id, *day_params))
+    product_cost = _load_frame(f'SELECT product, cost FROM expenses WHERE user_id = ?{day_clause}', (user_id, *day_params))
+    product_profit = product_profit.groupby('product')['revenue'].sum().reset_index()
+    product_cost = product_cost.groupby('product')['cost'].sum().reset_index()
+
+    profit_margin_df = pd.merge(product_profit, product_cost, on='product', how='outer').fillna(0)
+    profit_margin_df['profit'] = profit_margin_df['revenue'] - profit_margin_df['cost']
+    profit_margin_df['margin'] = (profit_margin_df['profit'] / profit_margin_df['revenue'].where(profit_margin_df['revenue'] != 0) * 100).round(2)
+    return profit_margin_df.sort_values(['profit', 'product'], ascending=[False, True]).reset_index(drop=True)
+
+def sales_rows(user_id, since=None, until=None):
+    """Day, quantity and revenue of each sale within [since, until], from the replica"""
+    day_clause, day_params = day_range_clause(since, until)
+    return _load_frame(f'SELECT day, quantity, revenue FROM sales WHERE user_id = ?{day_clause}', (user_id, *day_params))
+
+def has_expenses(user_id, since=None, until=None):
+    """Whether any purchase was recorded within [since, until], from the replica"""
+    day_clause, day_params = day_range_clause(since, until)
+    return not _load_frame(f'SELECT 1 FROM expenses WHERE user_id = ?{day_clause} LIMIT 1', (user_id, *day_params)).empty
+
+def inventory_aging(user_id):
+    """Products, quantity and stock value per aging bucket and category, from the replica"""
+    conn = replica_connection()
+    rows = query_aging(conn.cursor(), datetime.now().strftime('%Y-%m-%d'), user_id)
+    conn.close()
+    return aging_frame(rows)
+
+def weekly_kpis(user_id, since=None, until=None):
+    """Weekly revenue, transactions, quantity, cost and profit within [since, until], from the replica"""
+    conn = replica_connection()
+    weekly = query_weekly_kpis(conn, user_id, since, until)
+    conn.close()
+    return weekly
+
+def inventory_levels(user_id, since=None, until=None):
+    """Average units on hand per product over [since, until], from the stock ledger in the replica"""
+    conn = replica_connection()
+    levels = query_inventory_levels(conn.cursor(), user_id, since, until)
+    conn.close()
+    return levels
+
+def category_turnover(user_id, since=None, until=None):
+    """Quantity sold within [since, until], revenue, average units on hand and turnover ratio per category"""
+    day_clause, day_params = day_range_clause(since, until)
+    if duckdb is not None:
+        sales_day_clause, _ = day_range_clause(since, until, column='s.day')
+        sold = _duckdb_cursor(user_id).execute(f'''
+            WITH names AS (
+                SELECT name, MIN(category) AS category FROM inv.products WHERE user_id = ? GROUP BY name
+            )
+            SELECT n.category AS Category, SUM(s.quantity) AS quantity, SUM(s.revenue) AS revenue
+            FROM inv.sales s JOIN names n ON s.product = n.name
+            WHERE s.user_id = ?{sales_day_clause}
+            GROUP BY n.category
+        ''', (user_id, user_id, *day_params)).df()
+    else:
+        df_sales = _load_frame(f'SELECT product, quantity, revenue FROM sales WHERE user_id = ?{day_clause}', (user_id, *day_params))
+        df_products = _load_frame('SELECT name AS Name, category AS Category FROM products WHERE user_id = ?', (user_id,))
+        names = df_products.sort_values('Category').drop_duplicates('Name')
+        sold = df_sales.merge(names, left_on='product', right_on='Name', how='inner')
+        sold = sold.groupby('Category').agg({'quantity': 'sum', 'revenue': 'sum'}).reset_index()
+
+    # Stock held over the same days, summed per category rather than averaged over its products
+    stock = inventory_levels(user_id, since, until).groupby('Category')['avg_inventory'].sum().reset_index()
+    category_analysis = pd.merge(sold, stock, on='Category', how='left')
+    category_analysis['turnover_ratio'] = category_analysis['quantity'] / category_analysis['avg_inventory'].where(category_analysis['avg_inventory'] != 0)
+    return category_analysis.sort_values(['turnover_ratio', 'Category'], ascending=[False, True], na_position='last').reset_index(drop=True)
+
+def abc_classification(user_id, since=None, until=None):
+    """Products ranked by revenue within [since, until] with cumulative share and A/B/C class"""
+    day_clause, day_params = day_range_clause(since, until)
+    if duckdb is not None:
+        return _duckdb_cursor(user_id).execute(f'''
+            WITH revenue AS (
+                SELECT product, SUM(revenue) AS revenue FROM inv.sales WHERE user_id = ?{day_clause} GROUP BY product
+            ), ranked AS (
+                SELECT product, revenue,
+                       SUM(revenue) OVER (ORDER BY revenue DESC, product ROWS UNBOUNDED PRECEDING) AS cumulative_revenue,
+                       SUM(revenue) OVER () AS total_revenue
+                FROM revenue
+            )
+            SELECT product, revenue, cumulative_revenue,
+                   cumulative_revenue / total_revenue * 100 AS cumulative_percentage,
+                   CASE
+                       WHEN cumulative_revenue / total_revenue * 100 <= 80 THEN 'A (High Value)'
+                       WHEN cumulative_revenue / total_revenue * 100 <= 95 THEN 'B (Medium Value)'
+                       ELSE 'C (Low Value)'
+                   END AS abc_class
+            FROM ranked
+            ORDER BY revenue DESC, product
+        ''', (user_id, *day_params)).df()
+
+    product_revenue = _load_frame(f'SELECT product, revenue FROM sales WHERE user_id = ?{day_clause}', (user_id, *day_params))
+    product_revenue = product_revenue.groupby('product')['revenue'].sum().reset_index()
+    product_revenue = product_revenue.sort_values(['revenue', 'product'], ascending=[False, True]).reset_index(drop=True)
+    product_revenue['cumulative_revenue'] = product_revenue['revenue'].cumsum()
+    product_revenue['cumulative_percentage'] = product_revenue['cumulative_revenue'] / product_revenue['revenue'].sum() * 100
+    product_revenue['abc_class'] = pd.cut(product_revenue['cumulative_percentage'], bins=[-float('inf'), 80, 95, float('inf')],
+                                          labels=['A (High Value)', 'B (Medium Value)', 'C (Low Value)']).astype(str)
+    return product_revenue
+
+def kpi_summary(user_id, since=None, until=None):
+    """KPI dictionary for sales and purchases within [since, until], aggregated in DuckDB when available"""
+    if duckdb is None:
+        conn = replica_connection()
+        kpis = query_kpis(conn.cursor(), user_id, datetime.now().strftime('%Y-%m-%d'), since, until)
+        conn.close()
+        return kpis
+
+    day_clause, day_params = day_range_clause(since, until)
+    cursor = _duckdb_cursor(user_id)
+    total_transactions, total_revenue, total_sales_qty, products_sold = cursor.execute(f'''
+        SELECT COUNT(*), COALESCE(SUM(revenue), 0), COALESCE(SUM(quantity), 0), COUNT(DISTINCT product)
+        FROM inv.sales WHERE user_id = ?{day_clause}
+    ''', (user_id, *day_params)).fetchone()
+    total_purchases, total_cost, total_purchased_qty = cursor.execute(f'''
+        SELECT COUNT(*), COALESCE(SUM(cost), 0), COALESCE(SUM(quantity), 0)
+        FROM inv.expenses WHERE user_id = ?{day_clause}
+    ''', (user_id, *day_params)).fetchone()
+    total_products, active_products = cursor.execute('''
+        SELECT COUNT(*),
+               COALESCE(SUM(CASE
+                   WHEN status = 'expired' THEN 0
+                   WHEN expiry_day < ? THEN 0
+                   ELSE 1
+               END), 0)
+        FROM inv.products WHERE user_id = ?
+    ''', (datetime.now().strftime('%Y-%m-%d'), user_id)).fetchone()
+    # Average units on hand over the period, from the stock ledger in the replica
+    conn = replica_connection()
+    avg_inventory_level = sum(query_average_inventory(conn.cursor(), user_id, since, until).values())
+    conn.close()
+
+    return derive_kpis(total_revenue, total_cost, total_purchases, total_purchased_qty,
+                       total_products, int(active_products), total_transactions, products_sold,
+                       total_sales_qty, avg_inventory_level)
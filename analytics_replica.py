@@ -0,0 +1,107 @@
+# Read-only analytics copy of inventory.db
+# The Advanced Analytics queries and the offline reports read from a copy of
+# the database taken with the SQLite online backup API instead of the live
+# file, so long aggregate scans never share locks, WAL checkpoints or the page
+# cache with checkout writes. The copy is refreshed on a daemon thread every
+# few minutes (or when a reader finds it missing or too old), written to a
+# temporary file and swapped in atomically; its modification time is the
+# moment the backup's read transaction started, which the UI shows as the
+# data's age.
+#
+# Usage: python analytics_replica.py --once              (e.g. from cron)
+#        python analytics_replica.py --interval 300      (keep refreshing)
+import argparse
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+
+import database
+
+DEFAULT_REFRESH_SECONDS = int(os.environ.get('INVENTORY_ANALYTICS_REFRESH_SECONDS', 300))
+
+_refresh_lock = threading.Lock()
+
+def replica_path():
+    """Analytics copy, next to the database unless INVENTORY_ANALYTICS_REPLICA is set"""
+    return os.environ.get('INVENTORY_ANALYTICS_REPLICA') or os.path.splitext(database.DB_PATH)[0] + '-analytics.db'
+
+def replica_as_of():
+    """Unix time the current copy was taken, or None before the first refresh"""
+    try:
+        return os.path.getmtime(replica_path())
+    except OSError:
+        return None
+
+def refresh_replica():
+    """Copy the live database into a fresh analytics replica; returns the copy's as-of time"""
+    path = replica_path()
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    source = database.get_connection()
+    target = sqlite3.connect(tmp_path)
+    try:
+        as_of = time.time()
+        # One step: a multi-step backup restarts whenever a checkout commits
+        # in between, while a single pass is one WAL read transaction that
+        # never blocks the writer
+        source.backup(target)
+        # The copy is never written, so it needs no WAL or -shm files
+        target.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        target.close()
+        source.close()
+    os.utime(tmp_path, (as_of, as_of))
+    os.replace(tmp_path, path)
+    return as_of
+
+def current_replica(max_age=DEFAULT_REFRESH_SECONDS * 2):
+    """(path, as_of) of the analytics copy, refreshed first if missing or older than max_age seconds"""
+    as_of = replica_as_of()
+    if as_of is None or time.time() - as_of > max_age:
+        with _refresh_lock:
+            # Another session may have refreshed it while this one waited
+            as_of = replica_as_of()
+            if as_of is None or time.time() - as_of > max_age:
+                as_of = refresh_replica()
+    return replica_path(), as_of
+
+def replica_connection():
+    """Open the analytics copy read-only; the file is replaced, never modified, so no locking is needed"""
+    path, _ = current_replica()
+    return sqlite3.connect(pathlib.Path(path).resolve().as_uri() + '?immutable=1', uri=True)
+
+def _refresh_forever(interval):
+    while True:
+        try:
+            with _refresh_lock:
+                refresh_replica()
+        except Exception as e:
+            print(f"Analytics replica refresh failed: {e}")
+        time.sleep(interval)
+
+def start_background_refresher(interval=DEFAULT_REFRESH_SECONDS):
+    """Refresh the copy now and then every `interval` seconds on a daemon thread"""
+    thread = threading.Thread(target=_refresh_forever, args=(interval,), name='analytics-replica', daemon=True)
+    thread.start()
+    return thread
+
+def main():
+    parser = argparse.ArgumentParser(description='Refresh the read-only analytics copy of the inventory database')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--once', action='store_true', help='take a single copy and exit (default)')
+    mode.add_argument('--interval', type=int, help='keep running, one copy every N seconds')
+    args = parser.parse_args()
+
+    database.init_user_database()
+    if args.interval:
+        print(f"Copying {database.DB_PATH} to {replica_path()} every {args.interval}s")
+        _refresh_forever(args.interval)
+    else:
+        started = time.perf_counter()
+        refresh_replica()
+        print(f"Copied {database.DB_PATH} to {replica_path()} "
+              f"({os.path.getsize(replica_path()) / 2**20:.1f} MB) in {time.perf_counter() - started:.2f}s")
+
+if __name__ == '__main__':
+    main()
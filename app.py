@@ -1,388 +1,126 @@
 # Smart Inventory Dashboard with Streamlit UI
 import streamlit as st
 import os
-import json
 from datetime import datetime, timedelta
 import csv
 import pandas as pd
 import io
-import sqlite3
 import random
-import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.metrics import r2_score, mean_absolute_error
-from sklearn.model_selection import train_test_split
 import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import matplotlib.pyplot as plt
-import seaborn as sns
 import warnings
 warnings.filterwarnings('ignore')
 
-# Authentication imports
-import bcrypt
-import streamlit_authenticator as stauth
-from streamlit_authenticator import Authenticate
-
-def round_quantity(quantity, measurement_category):
-    """Round quantity based on measurement category"""
-    if measurement_category in ['Units', 'Packets']:
-        return round(quantity, 0)
-    else:  # Kilograms, Liters
-        return round(quantity, 3)
-
-# Database functions
-def get_products(user_id=None):
-    conn = sqlite3.connect('inventory.db')
-    cursor = conn.cursor()
-    if user_id:
-        cursor.execute('SELECT id, name, category, price, purchase_price, quantity, measurement_category, expiry_date FROM products WHERE user_id = ?', (user_id,))
-    else:
-        cursor.execute('SELECT id, name, category, price, purchase_price, quantity, measurement_category, expiry_date FROM products')
-    rows = cursor.fetchall()
-    products = []
-    for row in rows:
-        products.append({
-            'ID': row[0],
-            'Name': row[1],
-            'Category': row[2],
-            'Price': row[3],
-            'Purchase Price': row[4],
-            'Quantity': round_quantity(row[5], row[6]),
-            'Measurement Category': row[6],
-            'Expiry Date': row[7]
-        })
-    conn.close()
-    return products
-
-def get_active_products(user_id=None):
-    products = get_products(user_id)
-    current_date = datetime.now().date()
-    active = []
-    expired = []
-    for p in products:
-        if p['Expiry Date'] == 'expired':
-            expired.append(p)
-        else:
-            try:
-                expiry = datetime.strptime(p['Expiry Date'], '%d-%m-%Y').date()
-                if expiry >= current_date:
-                    active.append(p)
-                else:
-                    expired.append(p)
-                    update_expiry(p['ID'], 'expired', user_id)
-            except:
-                active.append(p)
-    return active, expired
-
-def update_expiry(product_id, expiry, user_id=None):
-    conn = sqlite3.connect('inventory.db')
-    cursor = conn.cursor()
-    if user_id:
-        cursor.execute('UPDATE products SET expiry_date = ? WHERE id = ? AND user_id = ?', (expiry, product_id, user_id))
-    else:
-        cursor.execute('UPDATE products SET expiry_date = ? WHERE id = ?', (expiry, product_id))
-    conn.commit()
-    conn.close()
-
-def get_sales(user_id=None):
-    conn = sqlite3.connect('inventory.db')
-    cursor = conn.cursor()
-    if user_id:
-        cursor.execute('SELECT date, product, quantity, revenue, bill_id FROM sales WHERE user_id = ? ORDER BY date DESC', (user_id,))
-    else:
-        cursor.execute('SELECT date, product, quantity, revenue, bill_id FROM sales ORDER BY date DESC')
-    rows = cursor.fetchall()
-    sales = []
-    for row in rows:
-        sales.append({
-            'date': row[0],
-            'product': row[1],
-            'quantity': row[2],
-            'revenue': row[3],
-            'bill_id': row[4]
-        })
-    conn.close()
-    return sales
-
-def get_expenses(user_id=None):
-    conn = sqlite3.connect('inventory.db')
-    cursor = conn.cursor()
-    if user_id:
-        cursor.execute('SELECT date, product, quantity, cost, supplier FROM expenses WHERE user_id = ? ORDER BY date DESC', (user_id,))
-    else:
-        cursor.execute('SELECT date, product, quantity, cost, supplier FROM expenses ORDER BY date DESC')
-    rows = cursor.fetchall()
-    expenses = []
-    for row in rows:
-        expenses.append({
-            'date': row[0],
-            'product': row[1],
-            'quantity': row[2],
-            'cost': row[3],
-            'supplier': row[4]
-        })
-    conn.close()
-    return expenses
-
-def save_product(product, user_id):
-    conn = sqlite3.connect('inventory.db')
-    cursor = conn.cursor()
-    rounded_quantity = round_quantity(product['Quantity'], product['Measurement Category'])
-    purchase_price = product.get('Purchase Price', 0)  # Default to 0 if not provided
-    cursor.execute('INSERT OR REPLACE INTO products (id, user_id, name, category, price, purchase_price, quantity, measurement_category, expiry_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                   (product['ID'], user_id, product['Name'], product['Category'], product['Price'], purchase_price, rounded_quantity, product['Measurement Category'], product['Expiry Date']))
-    conn.commit()
-    conn.close()
-
-def update_quantity(product_id, qty_change, user_id):
-    conn = sqlite3.connect('inventory.db')
-    cursor = conn.cursor()
-    cursor.execute('UPDATE products SET quantity = quantity + ? WHERE id = ? AND user_id = ?', (qty_change, product_id, user_id))
-    conn.commit()
-    conn.close()
-
-def add_sale(sale, user_id):
-    conn = sqlite3.connect('inventory.db')
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO sales (user_id, date, product, quantity, revenue, bill_id) VALUES (?, ?, ?, ?, ?, ?)',
-                   (user_id, sale['date'], sale['product'], sale['quantity'], sale['revenue'], sale.get('bill_id', '')))
-    conn.commit()
-    conn.close()
-
-def add_expense(expense, user_id):
-    conn = sqlite3.connect('inventory.db')
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO expenses (user_id, date, product, quantity, cost, supplier) VALUES (?, ?, ?, ?, ?, ?)',
-                   (user_id, expense['date'], expense['product'], expense['quantity'], expense['cost'], expense.get('supplier', '')))
-    conn.commit()
-    conn.close()
-
-def delete_product_db(product_id, user_id):
-    conn = sqlite3.connect('inventory.db')
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM products WHERE id = ? AND user_id = ?', (product_id, user_id))
-    conn.commit()
-    conn.close()
-
-# User Management Functions
-def init_user_database():
-    """Initialize user database tables"""
-    conn = sqlite3.connect('inventory.db')
-    cursor = conn.cursor()
-
-    # Create users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            role TEXT NOT NULL DEFAULT 'user',
-            full_name TEXT,
-            email TEXT,
-            created_date TEXT DEFAULT CURRENT_TIMESTAMP,
-            last_login TEXT,
-            is_active INTEGER DEFAULT 1
-        )
-    ''')
-
-    # Create user_sessions table for activity tracking
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            action TEXT,
-            timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
-            details TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-
-    # Create products table with user_id
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS products (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            name TEXT NOT NULL,
-            category TEXT,
-            price REAL,
-            purchase_price REAL DEFAULT 0,
-            quantity REAL,
-            measurement_category TEXT,
-            expiry_date TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-
-    # Create sales table with user_id
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sales (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            date TEXT,
-            product TEXT,
-            quantity REAL,
-            revenue REAL,
-            bill_id TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-
-    # Create expenses table with user_id
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS expenses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            date TEXT,
-            product TEXT,
-            quantity REAL,
-            cost REAL,
-            supplier TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-
-    # Add user_id columns to existing tables if they don't exist (for migration)
-    try:
-        cursor.execute("ALTER TABLE products ADD COLUMN user_id INTEGER")
-        cursor.execute("ALTER TABLE sales ADD COLUMN user_id INTEGER")
-        cursor.execute("ALTER TABLE expenses ADD COLUMN user_id INTEGER")
-    except sqlite3.OperationalError:
-        # Columns already exist
-        pass
-
-    # Create default admin user if no users exist
-    cursor.execute('SELECT COUNT(*) FROM users')
-    if cursor.fetchone()[0] == 0:
-        # Create default admin user
-        admin_password = "admin123"
-        admin_hash = bcrypt.hashpw(admin_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        cursor.execute('''
-            INSERT INTO users (username, password_hash, role, full_name, email)
-            VALUES (?, ?, ?, ?, ?)
-        ''', ('admin', admin_hash, 'admin', 'System Administrator', 'admin@inventory.com'))
-
-        # Get admin user ID and assign existing data to admin if any exists
-        cursor.execute('SELECT id FROM users WHERE username = ?', ('admin',))
-        admin_id = cursor.fetchone()[0]
-
-        # Assign existing products to admin user
-        cursor.execute('UPDATE products SET user_id = ? WHERE user_id IS NULL', (admin_id,))
-        cursor.execute('UPDATE sales SET user_id = ? WHERE user_id IS NULL', (admin_id,))
-        cursor.execute('UPDATE expenses SET user_id = ? WHERE user_id IS NULL', (admin_id,))
-
-    conn.commit()
-    conn.close()
-
-def authenticate_user(username, password):
-    """Authenticate user credentials"""
-    conn = sqlite3.connect('inventory.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, password_hash, role, full_name FROM users WHERE username = ? AND is_active = 1', (username,))
-    user = cursor.fetchone()
-    conn.close()
-
-    if user and bcrypt.checkpw(password.encode('utf-8'), user[1].encode('utf-8')):
-        return {
-            'id': user[0],
-            'username': username,
-            'role': user[2],
-            'full_name': user[3]
-        }
-    return None
-
-def add_user(username, password, role, full_name, email):
-    """Add a new user"""
-    conn = sqlite3.connect('inventory.db')
-    cursor = conn.cursor()
-
-    try:
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        cursor.execute('''
-            INSERT INTO users (username, password_hash, role, full_name, email)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (username, password_hash, role, full_name, email))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
-    finally:
-        conn.close()
-
-def get_users():
-    """Get all users"""
-    conn = sqlite3.connect('inventory.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, username, role, full_name, email, created_date, last_login, is_active FROM users')
-    rows = cursor.fetchall()
-    conn.close()
-
-    users = []
-    for row in rows:
-        users.append({
-            'id': row[0],
-            'username': row[1],
-            'role': row[2],
-            'full_name': row[3],
-            'email': row[4],
-            'created_date': row[5],
-            'last_login': row[6],
-            'is_active': row[7]
-        })
-    return users
-
-def log_user_action(user_id, action, details=""):
-    """Log user activity"""
-    conn = sqlite3.connect('inventory.db')
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO user_sessions (user_id, action, details) VALUES (?, ?, ?)',
-                   (user_id, action, details))
-    conn.commit()
-    conn.close()
-
-def update_last_login(user_id):
-    """Update user's last login time"""
-    conn = sqlite3.connect('inventory.db')
-    cursor = conn.cursor()
-    cursor.execute('UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?', (user_id,))
-    conn.commit()
-    conn.close()
+# Data layer
+import database
+from database import (
+    DEFAULT_REORDER_POINT, get_inventory_alerts, get_low_stock_products,
+    save_product, update_price, update_reorder_point, update_quantity, add_expense,
+    record_sale, record_purchase, get_receipt, get_recent_receipts, get_sale_anomalies, delete_product_db, init_user_database, authenticate_user, add_user, get_users,
+    log_user_action, update_last_login, get_user_activity, get_data_version
+)
+from analytics_engine import (
+    analytics_backend, profit_over_time, profit_by_product, category_turnover,
+    abc_classification, kpi_summary, inventory_levels, inventory_aging, weekly_kpis, sales_rows, has_expenses
+)
+from columnar_snapshot import load_snapshot
+from forecasting import forecast_daily_revenue
+from reports import report_path
+from inventory_overview import (
+    AT_RISK_BUCKETS, status_split, active_category_counts, category_measurement_matrix
+)
+from reorder_engine import (
+    LOOKBACK_DAYS as REORDER_LOOKBACK_DAYS, LEAD_TIME_DAYS as REORDER_LEAD_TIME_DAYS,
+    SERVICE_LEVEL as REORDER_SERVICE_LEVEL, get_recommendations, recompute_recommendations, apply_reorder_points
+)
+from frame_loaders import load_products_frame, split_active_expired
+from rolling_stats import WINDOWS as ROLLING_WINDOWS, rolling_series, window_stats, week_over_week
+from figure_cache import cached_figure
+from expiry_job import start_background_scheduler, last_run
+from analytics_replica import current_replica, refresh_replica, start_background_refresher
+import page_memory
 
 # Enhanced Chart Functions
-def create_revenue_trend_chart(df_sales):
-    """Create an interactive revenue trend chart"""
-    fig = px.line(df_sales, x='date', y='revenue',
+def create_revenue_trend_chart(rolling):
+    """Create an interactive revenue trend chart with moving averages"""
+    fig = px.line(rolling, x='date', y='revenue',
                   title='Revenue Trend Over Time',
                   labels={'revenue': 'Revenue (₹)', 'date': 'Date'})
-    fig.update_traces(mode='lines+markers', line_color='#1f77b4')
+    fig.update_traces(mode='lines+markers', line_color='#1f77b4', name='Daily', showlegend=True)
+    for window, color in zip(ROLLING_WINDOWS, ['#ff7f0e', '#2ca02c', '#d62728']):
+        fig.add_trace(go.Scatter(x=rolling['date'], y=rolling[f'ma_{window}'], mode='lines',
+                                 name=f'{window}-day average', line=dict(color=color, width=2)))
     fig.update_layout(hovermode='x unified')
     return fig
 
-def create_category_pie_chart(products):
-    """Create an interactive pie chart for product categories"""
-    df = pd.DataFrame(products)
-    category_counts = df['Category'].value_counts().reset_index()
-    category_counts.columns = ['Category', 'Count']
+def create_status_count_chart(status_data):
+    """Create a bar chart of product counts by status"""
+    fig = px.bar(status_data, x='Status', y='Count',
+                 title='Products by Status',
+                 color='Status',
+                 color_discrete_map={'Active': '#4CAF50', 'Expired': '#F44336'})
+    fig.update_layout(showlegend=False)
+    return fig
+
+def create_status_quantity_pie_chart(status_data):
+    """Create a pie chart of quantity by status"""
+    fig = px.pie(status_data, values='Quantity', names='Status',
+                 title='Quantity Distribution by Status',
+                 color='Status',
+                 color_discrete_map={'Active': '#4CAF50', 'Expired': '#F44336'})
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    return fig
 
+def create_category_bar_chart(category_counts):
+    """Create a bar chart of active products per category"""
+    fig = px.bar(category_counts, x='Category', y='Count',
+                 title='Products by Category',
+                 color='Count',
+                 color_continuous_scale='Blues')
+    fig.update_layout(xaxis_tickangle=-45)
+    return fig
+
+def create_category_pie_chart(category_counts):
+    """Create an interactive pie chart for product categories"""
     fig = px.pie(category_counts, values='Count', names='Category',
                  title='Product Distribution by Category',
                  color_discrete_sequence=px.colors.qualitative.Set3)
     fig.update_traces(textposition='inside', textinfo='percent+label')
     return fig
 
-def create_inventory_heatmap(products):
+def create_inventory_heatmap(quantity_matrix):
     """Create a heatmap showing inventory levels"""
-    df = pd.DataFrame(products)
-    pivot_table = df.pivot_table(values='Quantity', index='Category', columns='Measurement Category', aggfunc='sum', fill_value=0)
-
-    fig = px.imshow(pivot_table,
+    fig = px.imshow(quantity_matrix,
                     title='Inventory Heatmap by Category and Measurement',
                     labels=dict(x="Measurement Category", y="Category", color="Quantity"),
                     color_continuous_scale='RdYlGn')
     return fig
 
+def create_top_products_chart(product_sales):
+    """Create a bar chart of the top products by revenue"""
+    fig = px.bar(product_sales, x='product', y='revenue',
+                 title='Top Products by Revenue',
+                 color='revenue',
+                 color_continuous_scale='Viridis')
+    fig.update_layout(xaxis_tickangle=-45)
+    return fig
+
+def create_revenue_share_chart(product_sales):
+    """Create a pie chart of revenue share"""
+    fig = px.pie(product_sales, values='revenue', names='product',
+                 title='Revenue Share (Top 5 Products)')
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    return fig
+
+def create_quantity_sold_chart(quantity_sales):
+    """Create a bar chart of products by quantity sold"""
+    fig = px.bar(quantity_sales, x='product', y='quantity',
+                 title='Products by Quantity Sold',
+                 color='quantity',
+                 color_continuous_scale='Blues')
+    fig.update_layout(xaxis_tickangle=-45)
+    return fig
+
 def create_forecast_chart(historical_data, forecast_data, title):
     """Create an interactive forecast chart"""
     fig = go.Figure()
@@ -436,8 +174,26 @@ def export_to_csv(user_id):
         writer.writerow({k: p_copy.get(k, "") for k in writer.fieldnames})
     return csv_data.getvalue()
 
-# Initialize user database
-init_user_database()
+# Schema setup and migrations run once per server process, not on every rerun
+@st.cache_resource
+def database_schema(db_path):
+    init_user_database()
+
+database_schema(database.DB_PATH)
+
+# One expiry/low-stock scheduler per server process, shared by all sessions
+@st.cache_resource
+def expiry_scheduler():
+    return start_background_scheduler()
+
+expiry_scheduler()
+
+# One analytics replica refresher per server process, shared by all sessions
+@st.cache_resource
+def analytics_replica_refresher():
+    return start_background_refresher()
+
+analytics_replica_refresher()
 
 # Authentication
 if 'authenticated' not in st.session_state:
@@ -501,9 +257,16 @@ if not st.session_state.authenticated:
 
 # Load user-specific data after authentication
 user_id = st.session_state.user['id']
-active_products, expired_products = get_active_products(user_id)
-sales = get_sales(user_id)
-expenses = get_expenses(user_id)
+
+# Reloaded only when a write bumps the user's data version (or the day changes expiry status)
+@st.cache_data(max_entries=32, show_spinner=False)
+def cached_products(db_path, user_id, version, today):
+    products_df = load_products_frame(user_id)
+    return (products_df, *split_active_expired(products_df))
+
+data_version = get_data_version(user_id)
+products_df, active_products, expired_products = cached_products(
+    database.DB_PATH, user_id, data_version, datetime.now().strftime('%Y-%m-%d'))
 
 # Streamlit App
 st.set_page_config(
@@ -625,6 +388,8 @@ full_menu = [
     "🔍 Search Product",
     "📊 View Sales Report",
     "💸 View Expenses",
+    "🧾 Bill Lookup",
+    "🔁 Reorder Recommendations",
     "📈 Advanced Analytics",
     "📥 Export to CSV"
 ]
@@ -635,13 +400,31 @@ if st.session_state.user['role'] == 'admin':
 
 menu = st.sidebar.selectbox("Select Operation", full_menu, key="main_menu")
 
+# Global time window; reports and aggregates only read sales and expenses inside it
+st.sidebar.markdown("### 📅 Date Range")
+DATE_RANGE_PRESETS = {"Last 30 days": 30, "Last 90 days": 90, "Last 12 months": 365, "All time": None, "Custom": None}
+date_range = st.sidebar.selectbox("Show data for", list(DATE_RANGE_PRESETS), index=1, key="date_range")
+today = datetime.now().date()
+if date_range == "Custom":
+    custom_range = st.sidebar.date_input("From / To", value=(today - timedelta(days=89), today), key="custom_date_range")
+    since_date, until_date = (custom_range[0], custom_range[-1]) if custom_range else (None, None)
+elif DATE_RANGE_PRESETS[date_range]:
+    since_date, until_date = today - timedelta(days=DATE_RANGE_PRESETS[date_range] - 1), today
+else:
+    since_date, until_date = None, None
+since = since_date.strftime('%Y-%m-%d') if since_date else None
+until = until_date.strftime('%Y-%m-%d') if until_date else None
+
+# Opt-in tracemalloc profile of each page run, see page_memory.py
+page_memory.start_page(menu)
+
 if menu == "📦 View Inventory":
     st.header("📦 Inventory Overview Dashboard")
 
-    total_active = len(active_products)
-    total_expired = len(expired_products)
-    total_active_qty = sum(p.get("Quantity", 0) for p in active_products)
-    total_expired_qty = sum(p.get("Quantity", 0) for p in expired_products)
+    # Overview charts come from cached GROUP BY aggregates, not the product list
+    status_data = status_split(user_id)
+    total_active, total_expired = status_data['Count']
+    total_active_qty, total_expired_qty = status_data['Quantity']
 
     # Color-coded metrics
     col1, col2, col3, col4 = st.columns(4)
@@ -655,90 +438,85 @@ if menu == "📦 View Inventory":
         st.metric("Expired Quantity", f"{total_expired_qty:,.1f}", delta=f"{total_expired_qty:.0f}")
 
     # Inventory Status Overview
-    if active_products or expired_products:
+    if total_active or total_expired:
         st.subheader("📊 Inventory Status")
 
-        # Create status data
-        status_data = pd.DataFrame({
-            'Status': ['Active', 'Expired'],
-            'Count': [total_active, total_expired],
-            'Quantity': [total_active_qty, total_expired_qty]
-        })
-
         col1, col2 = st.columns(2)
 
         with col1:
             # Enhanced bar chart for status count
-            fig_count = px.bar(status_data, x='Status', y='Count',
-                             title='Products by Status',
-                             color='Status',
-                             color_discrete_map={'Active': '#4CAF50', 'Expired': '#F44336'})
-            fig_count.update_layout(showlegend=False)
+            fig_count = cached_figure('status_count', user_id, data_version,
+                                      lambda: create_status_count_chart(status_data), params=(today,))
             st.plotly_chart(fig_count, width="stretch")
 
         with col2:
             # Interactive pie chart for quantity distribution
-            fig_pie = px.pie(status_data, values='Quantity', names='Status',
-                           title='Quantity Distribution by Status',
-                           color='Status',
-                           color_discrete_map={'Active': '#4CAF50', 'Expired': '#F44336'})
-            fig_pie.update_traces(textposition='inside', textinfo='percent+label')
+            fig_pie = cached_figure('status_quantity_pie', user_id, data_version,
+                                    lambda: create_status_quantity_pie_chart(status_data), params=(today,))
             st.plotly_chart(fig_pie, width="stretch")
 
     # Category Distribution
-    if active_products:
+    if total_active:
         st.subheader("🏷️ Product Categories")
-        df_active = pd.DataFrame(active_products)
-        category_counts = df_active['Category'].value_counts().reset_index()
-        category_counts.columns = ['Category', 'Count']
+        category_counts = active_category_counts(user_id)
 
         # Enhanced category distribution with multiple chart types
         col1, col2 = st.columns(2)
 
         with col1:
-            fig_bar = px.bar(category_counts, x='Category', y='Count',
-                           title='Products by Category',
-                           color='Count',
-                           color_continuous_scale='Blues')
-            fig_bar.update_layout(xaxis_tickangle=-45)
+            fig_bar = cached_figure('category_bar', user_id, data_version,
+                                    lambda: create_category_bar_chart(category_counts), params=(today,))
             st.plotly_chart(fig_bar, use_container_width=True)
 
         with col2:
-            fig_pie_cat = create_category_pie_chart(active_products)
+            fig_pie_cat = cached_figure('category_pie', user_id, data_version,
+                                        lambda: create_category_pie_chart(category_counts), params=(today,))
             st.plotly_chart(fig_pie_cat, use_container_width=True)
 
         # Inventory heatmap
         st.subheader("🔥 Inventory Heatmap")
-        fig_heatmap = create_inventory_heatmap(active_products + expired_products)
+        fig_heatmap = cached_figure('inventory_heatmap', user_id, data_version,
+                                    lambda: create_inventory_heatmap(category_measurement_matrix(user_id)), params=(today,))
         st.plotly_chart(fig_heatmap, use_container_width=True)
 
-    if active_products:
+    df_active = products_df[products_df['Status'] == 'Active'].drop(columns='Status')
+    df_expired = products_df[products_df['Status'] == 'Expired'].drop(columns='Status')
+    if not df_active.empty:
         st.subheader("✅ Active Inventory Details")
-        df_active = pd.DataFrame(active_products)
-
-        # Color-code the dataframe based on quantity
-        def color_quantity(val):
-            if val < 5:
-                return 'background-color: #FF6B6B'  # Red for low stock
-            elif val < 20:
-                return 'background-color: #FFE66D'  # Yellow for medium
+
+        # Color-code the dataframe based on quantity against each product's reorder point
+        def color_quantity(row):
+            if row['Quantity'] < row['Reorder Point']:
+                color = 'background-color: #FF6B6B'  # Red for low stock
+            elif row['Quantity'] < 4 * row['Reorder Point']:
+                color = 'background-color: #FFE66D'  # Yellow for medium
             else:
-                return 'background-color: #4ECDC4'  # Green for good stock
+                color = 'background-color: #4ECDC4'  # Green for good stock
+            return [color if col == 'Quantity' else '' for col in row.index]
 
-        styled_df = df_active.style.applymap(color_quantity, subset=['Quantity'])
+        styled_df = df_active.style.apply(color_quantity, axis=1)
         st.dataframe(styled_df, use_container_width=True)
 
-    if expired_products:
+    if not df_expired.empty:
         st.subheader("❌ Expired Inventory Details")
-        df_expired = pd.DataFrame(expired_products)
-        st.dataframe(df_expired.style.applymap(lambda x: 'background-color: #FF6B6B', subset=['Expiry Date']), use_container_width=True)
-
-    # Enhanced Low Stock Alert with colors
-    low_stock = [p for p in active_products if p.get("Quantity", 0) < 5]
+        st.dataframe(df_expired.style.map(lambda x: 'background-color: #FF6B6B', subset=['Expiry Date']), use_container_width=True)
+
+    # Near-expiry list precomputed by the scheduled expiry job
+    job_run = last_run()
+    if job_run:
+        st.caption(f"Alerts last refreshed {job_run[0]}")
+    near_expiry = get_inventory_alerts(user_id, 'near_expiry')
+    if near_expiry:
+        st.warning(f"⏰ **Expiring within 30 days:** {len(near_expiry)} product(s)")
+        st.dataframe(pd.DataFrame(near_expiry)[['ID', 'Name', 'Category', 'Quantity', 'Expiry Day', 'Days Left']],
+                     use_container_width=True, hide_index=True)
+
+    low_stock = get_low_stock_products(user_id)
     if low_stock:
-        st.error("🚨 **CRITICAL: Low Stock Alert** (Quantity < 5)")
-        for p in low_stock:
-            st.write(f"🔴 **{p['Name']}** (ID: {p['ID']}, Quantity: {p['Quantity']}) - **REPLENISH IMMEDIATELY**")
+        df_low = pd.DataFrame(low_stock)
+        out_of_stock = int((df_low['Quantity'] <= 0).sum())
+        st.error(f"🚨 **CRITICAL: Low Stock Alert** - {len(df_low)} product(s) below reorder point, {out_of_stock} out of stock")
+        st.dataframe(df_low, use_container_width=True, hide_index=True)
     else:
         st.success("✅ All products have sufficient stock levels!")
 
@@ -758,6 +536,7 @@ elif menu == "➕ Add Product & Purchase":
             selling_price = st.number_input("Selling Price per Unit (INR)", min_value=0.0, step=0.01)
             quantity = st.number_input("Initial Quantity Purchased", min_value=0.01, step=0.01)
             expiry_input = st.text_input("Expiry Date (DD-MM-YYYY)", placeholder="DD-MM-YYYY")
+            reorder_point = st.number_input("Reorder Point", min_value=0.0, step=1.0, value=float(DEFAULT_REORDER_POINT))
 
         # Calculate total cost
         total_cost = purchase_price * quantity
@@ -780,236 +559,268 @@ elif menu == "➕ Add Product & Purchase":
                         "Quantity": int(quantity) if measurements in ['Units', 'Packets'] else round(quantity, 3),
                         "Measurement Category": measurements,
                         "Expiry Date": expiry_input,
-                        "Purchase Price": purchase_price  # Store purchase price for profit calculations
+                        "Purchase Price": purchase_price,  # Store purchase price for profit calculations
+                        "Reorder Point": reorder_point
                     }
 
-                    # Add product to inventory
-                    active_products.append(data)
-                    save_product(data, user_id)
-
-                    # Record the initial purchase as an expense
-                    expense = {
-                        "date": datetime.now().strftime("%d-%m-%Y"),
-                        "product": name.title(),
-                        "quantity": quantity,
-                        "cost": total_cost,
-                        "supplier": f"Supplier-{random.randint(1, 10)}"
-                    }
-                    expenses.append(expense)
-                    add_expense(expense, user_id)
+                    # Add product to inventory; the id may belong to another store
+                    if not save_product(data, user_id):
+                        st.error("Product ID already exists.")
+                    else:
+                        active_products.append(data)
+
+                        # Record the initial purchase as an expense
+                        expense = {
+                            "date": datetime.now().strftime("%d-%m-%Y"),
+                            "product": name.title(),
+                            "quantity": quantity,
+                            "cost": total_cost,
+                            "supplier": f"Supplier-{random.randint(1, 10)}"
+                        }
+                        add_expense(expense, user_id)
 
-                    st.success(f"✅ Product '{name.title()}' added successfully!")
-                    st.success(f"✅ Initial purchase of {quantity} {measurements} recorded (Cost: INR {total_cost:.2f})")
-                    st.rerun()
+                        st.success(f"✅ Product '{name.title()}' added successfully!")
+                        st.success(f"✅ Initial purchase of {quantity} {measurements} recorded (Cost: INR {total_cost:.2f})")
+                        st.rerun()
             except ValueError:
                 st.error("Invalid date format. Please enter expiry date in DD-MM-YYYY format.")
 
 elif menu == "💰 Sell Product":
     st.header("Sell Product")
-    product_names = [p["Name"] for p in active_products]
-    if product_names:
-        selected_name = st.selectbox("Select Product", product_names)
-        product = next(p for p in active_products if p["Name"] == selected_name)
-        st.write(f"Available Quantity: {product['Quantity']} {product['Measurement Category']}")
-        st.write(f"Price: INR {product['Price']} per {product['Measurement Category']}")
-        qty = st.number_input("Quantity to Sell", min_value=0.01, step=0.01)
-        if qty > 0:
-            total = qty * product["Price"]
-            st.write("### Bill Receipt")
-            st.write(f"**Product:** {product['Name']}")
-            st.write(f"**Quantity:** {qty} {product['Measurement Category']}")
-            st.write(f"**Price per unit:** INR {product['Price']}")
-            st.write(f"**Total:** INR {total}")
-            if st.button("Confirm Sale"):
-                if qty > product["Quantity"]:
-                    st.error("Insufficient stock.")
-                else:
-                    product["Quantity"] -= qty
+    if 'last_bill' in st.session_state:
+        last_bill = st.session_state.pop('last_bill')
+        st.success(f"Sale completed! Bill {last_bill} can be reprinted from 🧾 Bill Lookup.")
+        for anomaly in get_sale_anomalies(user_id, bill_id=last_bill):
+            st.warning(f"⚠️ Unusual sale: {anomaly['Quantity']:g} × {anomaly['Product']} for ₹{anomaly['Revenue']:,.2f}, "
+                       f"typically {anomaly['Expected Quantity']:g} for ₹{anomaly['Expected Revenue']:,.2f}. "
+                       "Check the quantity entered.")
+
+    # Picking a product or typing a quantity reruns only this form
+    @st.fragment
+    def sell_product_form():
+        product_names = [p["Name"] for p in active_products]
+        if product_names:
+            selected_name = st.selectbox("Select Product", product_names)
+            product = next(p for p in active_products if p["Name"] == selected_name)
+            st.write(f"Available Quantity: {product['Quantity']} {product['Measurement Category']}")
+            st.write(f"Price: INR {product['Price']} per {product['Measurement Category']}")
+            qty = st.number_input("Quantity to Sell", min_value=0.01, step=0.01)
+            if qty > 0:
+                total = qty * product["Price"]
+                st.write("### Bill Receipt")
+                st.write(f"**Product:** {product['Name']}")
+                st.write(f"**Quantity:** {qty} {product['Measurement Category']}")
+                st.write(f"**Price per unit:** INR {product['Price']}")
+                st.write(f"**Total:** INR {total}")
+                if st.button("Confirm Sale"):
                     sale = {
                         "date": datetime.now().strftime("%d-%m-%Y"),
                         "product": product["Name"],
                         "quantity": qty,
-                        "revenue": total,
-                        "bill_id": f"BILL-{random.randint(1000, 9999)}"
+                        "revenue": total
                     }
-                    sales.append(sale)
-                    update_quantity(product['ID'], -qty, user_id)
-                    add_sale(sale, user_id)
-                    st.success("Sale completed!")
-                    st.rerun()
-    else:
-        st.write("No active products available.")
+                    # Stock is checked against the database row, not this page's copy
+                    bill_id = record_sale(product['ID'], sale, user_id)
+                    if not bill_id:
+                        st.error("Insufficient stock.")
+                    else:
+                        product["Quantity"] -= qty
+                        # Shown after the rerun below, which would clear a message shown now
+                        st.session_state.last_bill = bill_id
+                        st.rerun()
+        else:
+            st.write("No active products available.")
+
+    sell_product_form()
 
 elif menu == "🛒 Purchase Stock":
     st.header("Purchase Stock")
-    product_names = [p["Name"] for p in active_products + expired_products]
-    if product_names:
-        selected_name = st.selectbox("Select Product to Restock", product_names)
-        product = next((p for p in active_products + expired_products if p["Name"] == selected_name), None)
-        qty = st.number_input("Quantity Purchased", min_value=0.01, step=0.01)
-        cost = st.number_input("Total Cost (INR)", min_value=0.0, step=0.01)
-        if st.button("Confirm Purchase"):
-            product["Quantity"] += qty
-            expense = {
-                "date": datetime.now().strftime("%d-%m-%Y"),
-                "product": product["Name"],
-                "quantity": qty,
-                "cost": cost,
-                "supplier": f"Supplier-{random.randint(1, 10)}"
-            }
-            expenses.append(expense)
-            update_quantity(product['ID'], qty, user_id)
-            add_expense(expense, user_id)
-            st.success("Purchase recorded!")
-            st.rerun()
-    else:
-        st.write("No products available.")
+
+    # Restock inputs rerun as a fragment; a recorded purchase reruns the app
+    @st.fragment
+    def purchase_stock_form():
+        # Stock bought for an expired product would be written off by the next expiry job run
+        if expired_products:
+            st.caption(f"{len(expired_products)} expired product(s) cannot be restocked.")
+        product_names = [p["Name"] for p in active_products]
+        if product_names:
+            selected_name = st.selectbox("Select Product to Restock", product_names)
+            product = next((p for p in active_products if p["Name"] == selected_name), None)
+            qty = st.number_input("Quantity Purchased", min_value=0.01, step=0.01)
+            cost = st.number_input("Total Cost (INR)", min_value=0.0, step=0.01)
+            if st.button("Confirm Purchase"):
+                expense = {
+                    "date": datetime.now().strftime("%d-%m-%Y"),
+                    "product": product["Name"],
+                    "quantity": qty,
+                    "cost": cost,
+                    "supplier": f"Supplier-{random.randint(1, 10)}"
+                }
+                if record_purchase(product['ID'], expense, user_id):
+                    product["Quantity"] += qty
+                    st.success("Purchase recorded!")
+                    st.rerun()
+                else:
+                    st.error("Product no longer exists.")
+        else:
+            st.write("No products available.")
+
+    purchase_stock_form()
 
 elif menu == "🔄 Update Stock":
     st.header("Update Inventory Stock")
-    product_input = st.text_input("Enter Product ID or Name")
-    if product_input:
-        if product_input.isdigit():
-            product = next((p for p in active_products if p["ID"] == int(product_input)), None)
-        else:
-            matching = [p for p in active_products if p["Name"] == product_input.title()]
-            if len(matching) == 1:
-                product = matching[0]
-            elif len(matching) > 1:
-                selected_id = st.selectbox("Select Product ID", [p["ID"] for p in matching])
-                product = next(p for p in matching if p["ID"] == selected_id)
+
+    # Lookup and quantity edits stay inside this fragment until stock changes
+    @st.fragment
+    def update_stock_form():
+        product_input = st.text_input("Enter Product ID or Name")
+        if product_input:
+            if product_input.isdigit():
+                product = next((p for p in active_products if p["ID"] == int(product_input)), None)
             else:
-                product = None
-        
-        if product:
-            st.write(f"Updating: {product['Name']} (Current Quantity: {product['Quantity']})")
-            action = st.selectbox("Action", ["Sell", "Add"])
-            qty = st.number_input("Quantity", min_value=1, step=1)
-            if st.button("Update Stock"):
-                if action == "Sell":
-                    if qty > product["Quantity"]:
-                        st.error("Cannot sell more than available.")
-                    else:
-                        product["Quantity"] -= qty
+                matching = [p for p in active_products if p["Name"] == product_input.title()]
+                if len(matching) == 1:
+                    product = matching[0]
+                elif len(matching) > 1:
+                    selected_id = st.selectbox("Select Product ID", [p["ID"] for p in matching])
+                    product = next(p for p in matching if p["ID"] == selected_id)
+                else:
+                    product = None
+
+            if product:
+                st.write(f"Updating: {product['Name']} (Current Quantity: {product['Quantity']})")
+                action = st.selectbox("Action", ["Sell", "Add"])
+                qty = st.number_input("Quantity", min_value=1, step=1)
+                if st.button("Update Stock"):
+                    if action == "Sell":
                         sale = {
                             "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                             "product": product["Name"],
                             "quantity": qty,
                             "revenue": qty * product["Price"]
                         }
-                        sales.append(sale)
-                        update_quantity(product['ID'], -qty, user_id)
-                        add_sale(sale, user_id)
+                        bill_id = record_sale(product['ID'], sale, user_id)
+                        if not bill_id:
+                            st.error("Cannot sell more than available.")
+                        else:
+                            product["Quantity"] -= qty
+                            st.success(f"Stock updated! Bill {bill_id}")
+                            st.rerun()
+                    else:
+                        product["Quantity"] += qty
+                        update_quantity(product['ID'], qty, user_id)
                         st.success("Stock updated!")
                         st.rerun()
-                else:
-                    product["Quantity"] += qty
-                    update_quantity(product['ID'], qty, user_id)
-                    st.success("Stock updated!")
+
+                reorder_point = st.number_input("Reorder Point", min_value=0.0, step=1.0, value=float(product['Reorder Point']))
+                if st.button("Save Reorder Point"):
+                    update_reorder_point(product['ID'], reorder_point, user_id)
+                    st.success(f"Reorder point set to {reorder_point:g}.")
                     st.rerun()
-        else:
-            st.error("Product not found.")
+            else:
+                st.error("Product not found.")
+
+    update_stock_form()
 
 elif menu == "💲 Update Price":
     st.header("Update Product Price")
-    product_input = st.text_input("Enter Product ID or Name")
-    if product_input:
-        if product_input.isdigit():
-            product = next((p for p in active_products if p["ID"] == int(product_input)), None)
-        else:
-            matching = [p for p in active_products if p["Name"] == product_input.title()]
-            if len(matching) == 1:
-                product = matching[0]
-            elif len(matching) > 1:
-                selected_id = st.selectbox("Select Product ID", [p["ID"] for p in matching])
-                product = next(p for p in matching if p["ID"] == selected_id)
+
+    # Only this form reruns while a product is looked up
+    @st.fragment
+    def update_price_form():
+        product_input = st.text_input("Enter Product ID or Name")
+        if product_input:
+            if product_input.isdigit():
+                product = next((p for p in active_products if p["ID"] == int(product_input)), None)
             else:
-                product = None
-        
-        if product:
-            new_price = st.number_input("New Price (INR)", min_value=0.01, step=0.01)
-            if st.button("Update Price"):
-                product["Price"] = new_price
-                save_product(product, user_id)
-                st.success("Price updated!")
-                st.rerun()
-        else:
-            st.error("Product not found.")
+                matching = [p for p in active_products if p["Name"] == product_input.title()]
+                if len(matching) == 1:
+                    product = matching[0]
+                elif len(matching) > 1:
+                    selected_id = st.selectbox("Select Product ID", [p["ID"] for p in matching])
+                    product = next(p for p in matching if p["ID"] == selected_id)
+                else:
+                    product = None
+
+            if product:
+                new_price = st.number_input("New Price (INR)", min_value=0.01, step=0.01)
+                if st.button("Update Price"):
+                    product["Price"] = new_price
+                    update_price(product['ID'], new_price, user_id)
+                    st.success("Price updated!")
+                    st.rerun()
+            else:
+                st.error("Product not found.")
+
+    update_price_form()
 
 elif menu == "🗑️ Remove Product":
     st.header("Remove Product")
-    product_input = st.text_input("Enter Product ID or Name")
-    if product_input:
-        if product_input.isdigit():
-            product = next((p for p in active_products if p["ID"] == int(product_input)), None)
-        else:
-            matching = [p for p in active_products if p["Name"] == product_input.title()]
-            if len(matching) == 1:
-                product = matching[0]
-            elif len(matching) > 1:
-                selected_id = st.selectbox("Select Product ID", [p["ID"] for p in matching])
-                product = next(p for p in matching if p["ID"] == selected_id)
+
+    # Looking a product up reruns just this fragment
+    @st.fragment
+    def remove_product_form():
+        product_input = st.text_input("Enter Product ID or Name")
+        if product_input:
+            if product_input.isdigit():
+                product = next((p for p in active_products if p["ID"] == int(product_input)), None)
             else:
-                product = None
-        
-        if product:
-            if st.button("Remove Product"):
-                active_products.remove(product)
-                delete_product_db(product['ID'], user_id)
-                st.success("Product removed!")
-                st.rerun()
-        else:
-            st.error("Product not found.")
+                matching = [p for p in active_products if p["Name"] == product_input.title()]
+                if len(matching) == 1:
+                    product = matching[0]
+                elif len(matching) > 1:
+                    selected_id = st.selectbox("Select Product ID", [p["ID"] for p in matching])
+                    product = next(p for p in matching if p["ID"] == selected_id)
+                else:
+                    product = None
+
+            if product:
+                if st.button("Remove Product"):
+                    active_products.remove(product)
+                    delete_product_db(product['ID'], user_id)
+                    st.success("Product removed!")
+                    st.rerun()
+            else:
+                st.error("Product not found.")
+
+    remove_product_form()
 
 elif menu == "🔍 Search Product":
     st.header("Search Product")
-    search_name = st.text_input("Enter Product Name")
-    if search_name:
-        all_products = active_products + expired_products
-        found = [p for p in all_products if p['Name'] == search_name.title()]
-        if found:
-            df = pd.DataFrame(found)
-            st.dataframe(df)
-        else:
-            st.error("Product not found.")
 
-elif menu == "📊 View Sales Report":
-    st.header("📊 Sales Analytics Dashboard")
-
-    if sales:
-        df_sales = pd.DataFrame(sales)
+    # Searching reruns only the results below
+    @st.fragment
+    def search_product_form():
+        search_name = st.text_input("Enter Product Name")
+        if search_name:
+            all_products = active_products + expired_products
+            found = [p for p in all_products if p['Name'] == search_name.title()]
+            if found:
+                df = pd.DataFrame(found)
+                st.dataframe(df)
+            else:
+                st.error("Product not found.")
 
-        # Convert date strings to datetime for better plotting
-        df_sales['date'] = pd.to_datetime(df_sales['date'], format='%d-%m-%Y', errors='coerce')
-
-        # Summary metrics with colors
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            total_sales = len(sales)
-            st.metric("Total Transactions", f"{total_sales:,}", delta=f"+{total_sales}")
-        with col2:
-            total_revenue = sum(s["revenue"] for s in sales)
-            st.metric("Total Revenue", f"₹{total_revenue:,.2f}", delta=f"+₹{total_revenue:,.0f}")
-        with col3:
-            avg_sale = total_revenue / total_sales if total_sales > 0 else 0
-            st.metric("Average Sale", f"₹{avg_sale:.2f}")
+    search_product_form()
 
 elif menu == "📊 View Sales Report":
     st.header("📊 Sales Analytics Dashboard")
 
-    if sales:
-        df_sales = pd.DataFrame(sales)
+    # Memory-map only the columns this page needs from the columnar snapshot
+    df_sales = load_snapshot(user_id, 'sales', columns=['day', 'product', 'quantity', 'revenue', 'bill_id'], since=since, until=until)
 
-        # Convert date strings to datetime for better plotting
-        df_sales['date'] = pd.to_datetime(df_sales['date'], format='%d-%m-%Y', errors='coerce')
+    if not df_sales.empty:
+        # Convert ISO days to datetime for better plotting
+        df_sales.insert(0, 'date', pd.to_datetime(df_sales.pop('day'), errors='coerce'))
+        df_sales = df_sales.sort_values('date', ascending=False, ignore_index=True)
 
         # Summary metrics with colors
         col1, col2, col3 = st.columns(3)
         with col1:
-            total_sales = len(sales)
+            total_sales = len(df_sales)
             st.metric("Total Transactions", f"{total_sales:,}", delta=f"+{total_sales}")
         with col2:
-            total_revenue = sum(s["revenue"] for s in sales)
+            total_revenue = df_sales['revenue'].sum()
             st.metric("Total Revenue", f"₹{total_revenue:,.2f}", delta=f"+₹{total_revenue:,.0f}")
         with col3:
             avg_sale = total_revenue / total_sales if total_sales > 0 else 0
@@ -1017,10 +828,25 @@ elif menu == "📊 View Sales Report":
 
         # Enhanced Revenue Over Time
         st.subheader("💰 Revenue Trend")
-        daily_revenue = df_sales.groupby(df_sales['date'].dt.date)['revenue'].sum().reset_index()
-        daily_revenue.columns = ['Date', 'Revenue']
+        # Moving averages and volatility come from the running daily sums, not from df_sales
+        rolling = rolling_series(user_id, since, until)
+        reference_day = until_date or today
+        recent = window_stats(user_id, reference_day, 7)
+        monthly = window_stats(user_id, reference_day, 30)
+        weekly_change = week_over_week(user_id, reference_day)
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("7-Day Avg Revenue", f"₹{recent['mean']:,.2f}")
+        with col2:
+            st.metric("30-Day Avg Revenue", f"₹{monthly['mean']:,.2f}")
+        with col3:
+            st.metric("30-Day Volatility (σ)", f"₹{monthly['std']:,.2f}")
+        with col4:
+            st.metric("Week over Week", f"₹{weekly_change['current']:,.2f}",
+                      delta=None if weekly_change['change_pct'] is None else f"{weekly_change['change_pct']:+.1f}%")
 
-        fig_revenue = create_revenue_trend_chart(daily_revenue)
+        fig_revenue = cached_figure('revenue_trend', user_id, data_version,
+                                    lambda: create_revenue_trend_chart(rolling), params=(since, until))
         st.plotly_chart(fig_revenue, use_container_width=True)
 
         # Top Selling Products with enhanced visualization
@@ -1031,18 +857,14 @@ elif menu == "📊 View Sales Report":
         col1, col2 = st.columns(2)
 
         with col1:
-            fig_top_products = px.bar(product_sales, x='product', y='revenue',
-                                    title='Top Products by Revenue',
-                                    color='revenue',
-                                    color_continuous_scale='Viridis')
-            fig_top_products.update_layout(xaxis_tickangle=-45)
+            fig_top_products = cached_figure('top_products', user_id, data_version,
+                                             lambda: create_top_products_chart(product_sales), params=(since, until))
             st.plotly_chart(fig_top_products, use_container_width=True)
 
         with col2:
             # Revenue distribution pie chart
-            fig_revenue_pie = px.pie(product_sales.head(5), values='revenue', names='product',
-                                   title='Revenue Share (Top 5 Products)')
-            fig_revenue_pie.update_traces(textposition='inside', textinfo='percent+label')
+            fig_revenue_pie = cached_figure('revenue_share', user_id, data_version,
+                                            lambda: create_revenue_share_chart(product_sales.head(5)), params=(since, until))
             st.plotly_chart(fig_revenue_pie, use_container_width=True)
 
         # Sales Distribution Analysis
@@ -1053,11 +875,8 @@ elif menu == "📊 View Sales Report":
             quantity_sales = df_sales.groupby('product')['quantity'].sum().reset_index()
             quantity_sales = quantity_sales.sort_values('quantity', ascending=False).head(8)
 
-            fig_quantity = px.bar(quantity_sales, x='product', y='quantity',
-                                title='Products by Quantity Sold',
-                                color='quantity',
-                                color_continuous_scale='Blues')
-            fig_quantity.update_layout(xaxis_tickangle=-45)
+            fig_quantity = cached_figure('quantity_sold', user_id, data_version,
+                                         lambda: create_quantity_sold_chart(quantity_sales), params=(since, until))
             st.plotly_chart(fig_quantity, use_container_width=True)
 
         with col2:
@@ -1065,9 +884,11 @@ elif menu == "📊 View Sales Report":
             # Group by date and count transactions
             daily_transactions = df_sales.groupby(df_sales['date'].dt.date).size().reset_index(name='transactions')
 
-            fig_transactions = px.area(daily_transactions, x='date', y='transactions',
-                                     title='Daily Transaction Frequency',
-                                     color_discrete_sequence=['#FF6B6B'])
+            fig_transactions = cached_figure('transaction_frequency', user_id, data_version,
+                                             lambda: px.area(daily_transactions, x='date', y='transactions',
+                                                             title='Daily Transaction Frequency',
+                                                             color_discrete_sequence=['#FF6B6B']),
+                                             params=(since, until))
             st.plotly_chart(fig_transactions, use_container_width=True)
 
         # Sales correlation analysis
@@ -1076,36 +897,47 @@ elif menu == "📊 View Sales Report":
             # Create correlation matrix for quantity vs revenue
             corr_data = df_sales[['quantity', 'revenue']].corr()
 
-            fig_corr = px.imshow(corr_data,
-                               title='Correlation Matrix: Quantity vs Revenue',
-                               color_continuous_scale='RdBu',
-                               zmin=-1, zmax=1)
+            fig_corr = cached_figure('sales_correlation', user_id, data_version,
+                                     lambda: px.imshow(corr_data,
+                                                       title='Correlation Matrix: Quantity vs Revenue',
+                                                       color_continuous_scale='RdBu',
+                                                       zmin=-1, zmax=1),
+                                     params=(since, until))
             st.plotly_chart(fig_corr, use_container_width=True)
 
+        # Sales flagged as they were recorded, see database._observe_sale
+        anomalies = get_sale_anomalies(user_id)
+        if anomalies:
+            st.subheader("🚨 Unusual Sales")
+            st.caption("Sales far above the product's usual quantity or revenue, newest first.")
+            st.dataframe(pd.DataFrame(anomalies), use_container_width=True, hide_index=True)
+
         # Detailed Data Table with enhanced styling
         st.subheader("📋 Detailed Sales Data")
         styled_df = df_sales.style.highlight_max(axis=0, subset=['revenue', 'quantity'])
         st.dataframe(styled_df, use_container_width=True)
 
     else:
-        st.warning("📭 No sales data available. Start selling products to see analytics!")
+        st.warning("📭 No sales data in the selected date range. Widen the range or start selling products to see analytics!")
 
 elif menu == "💸 View Expenses":
     st.header("💸 Expense Analytics Dashboard")
 
-    if expenses:
-        df_expenses = pd.DataFrame(expenses)
+    # Memory-map only the columns this page needs from the columnar snapshot
+    df_expenses = load_snapshot(user_id, 'expenses', columns=['day', 'product', 'quantity', 'cost', 'supplier'], since=since, until=until)
 
-        # Convert date strings to datetime
-        df_expenses['date'] = pd.to_datetime(df_expenses['date'], format='%d-%m-%Y', errors='coerce')
+    if not df_expenses.empty:
+        # Convert ISO days to datetime
+        df_expenses.insert(0, 'date', pd.to_datetime(df_expenses.pop('day'), errors='coerce'))
+        df_expenses = df_expenses.sort_values('date', ascending=False, ignore_index=True)
 
         # Summary metrics
         col1, col2, col3 = st.columns(3)
         with col1:
-            total_expenses = len(expenses)
+            total_expenses = len(df_expenses)
             st.metric("Total Purchases", f"{total_expenses:,}", delta=f"+{total_expenses}")
         with col2:
-            total_cost = sum(e["cost"] for e in expenses)
+            total_cost = df_expenses['cost'].sum()
             st.metric("Total Expenses", f"₹{total_cost:,.2f}", delta=f"+₹{total_cost:,.0f}")
         with col3:
             avg_cost = total_cost / total_expenses if total_expenses > 0 else 0
@@ -1149,352 +981,258 @@ elif menu == "💸 View Expenses":
         st.dataframe(df_expenses.style.highlight_max(axis=0), use_container_width=True)
 
     else:
-        st.info("💰 No expense data available. Start purchasing stock to see analytics!")
+        st.info("💰 No expense data in the selected date range. Widen the range or start purchasing stock to see analytics!")
 
-elif menu == "� Advanced Analytics":
+elif menu == "📈 Advanced Analytics":
     st.header("📈 Advanced Analytics Dashboard")
+    # Reports read the periodically refreshed replica, not the live database
+    replica_col, refresh_col = st.columns([4, 1])
+    if refresh_col.button("🔄 Refresh data", key="refresh_analytics_replica"):
+        refresh_replica()
+    _, replica_as_of = current_replica()
+    replica_age_minutes = int((datetime.now().timestamp() - replica_as_of) // 60)
+    replica_col.caption(f"Analytics engine: {'DuckDB' if analytics_backend() == 'duckdb' else 'pandas'} · "
+                        f"data as of {datetime.fromtimestamp(replica_as_of).strftime('%d-%m-%Y %H:%M:%S')} "
+                        f"({'under a minute' if replica_age_minutes < 1 else f'{replica_age_minutes} min'} old)")
+
+    # Offer the nightly report when one has been generated with reports.py
+    prebuilt_report = report_path(user_id, 'html')
+    if os.path.exists(prebuilt_report):
+        generated_at = datetime.fromtimestamp(os.path.getmtime(prebuilt_report)).strftime('%d-%m-%Y %H:%M')
+        with open(prebuilt_report, encoding='utf-8') as f:
+            st.download_button(f"📄 Download prebuilt report ({generated_at})", f.read(),
+                               os.path.basename(prebuilt_report), "text/html")
+
+    # Switching analyses reruns only this section
+    @st.fragment
+    def advanced_analytics_view():
+        # Prepare data for advanced analysis from the same replica as the analyses
+        df_sales = sales_rows(user_id, since, until)
+        if not df_sales.empty and has_expenses(user_id, since, until):
+            # Convert dates
+            df_sales['date'] = pd.to_datetime(df_sales.pop('day'), errors='coerce')
+
+            # One analysis at a time: st.tabs would compute all five on every visit
+            analysis = st.radio("Analysis", ["💰 Profit Analysis", "📊 Inventory Turnover", "🔮 Forecasting", "📈 ABC Analysis", "📋 KPIs & Metrics"],
+                                horizontal=True, key="analytics_tab", label_visibility="collapsed")
+
+            if analysis == "💰 Profit Analysis":
+                st.subheader("💰 Profit & Loss Analysis")
+
+                # Calculate profit/loss over time
+                profit_df = profit_over_time(user_id, since, until)
 
-    # Import additional libraries for advanced analysis
-    import numpy as np
-    from sklearn.linear_model import LinearRegression
-    from sklearn.metrics import r2_score
-    import warnings
-    warnings.filterwarnings('ignore')
-
-    # Prepare data for advanced analysis
-    if sales and expenses:
-        df_sales = pd.DataFrame(sales)
-        df_expenses = pd.DataFrame(expenses)
-        df_products = pd.DataFrame(active_products + expired_products)
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    total_revenue = profit_df['revenue'].sum()
+                    st.metric("Total Revenue", f"₹{total_revenue:,.2f}")
+                with col2:
+                    total_cost = profit_df['cost'].sum()
+                    st.metric("Total Cost", f"₹{total_cost:,.2f}")
+                with col3:
+                    total_profit = profit_df['profit'].sum()
+                    st.metric("Net Profit", f"₹{total_profit:,.2f}", delta=f"{total_profit:.0f}")
 
-        # Convert dates
-        df_sales['date'] = pd.to_datetime(df_sales['date'], format='%d-%m-%Y', errors='coerce')
-        df_expenses['date'] = pd.to_datetime(df_expenses['date'], format='%d-%m-%Y', errors='coerce')
+                # Profit trend chart
+                st.subheader("Profit Trend Over Time")
+                st.line_chart(profit_df.set_index('date')[['revenue', 'cost', 'profit']], use_container_width=True)
 
-        # Create tabs for different analysis types
-        tab1, tab2, tab3, tab4, tab5 = st.tabs(["💰 Profit Analysis", "📊 Inventory Turnover", "🔮 Forecasting", "📈 ABC Analysis", "📋 KPIs & Metrics"])
+                # Cumulative profit chart
+                st.subheader("Cumulative Profit")
+                st.area_chart(profit_df.set_index('date')['cumulative_profit'], use_container_width=True)
 
-        with tab1:
-            st.subheader("💰 Profit & Loss Analysis")
+                # Profit margin analysis
+                st.subheader("Profit Margin by Product")
+                profit_margin_df = profit_by_product(user_id, since, until)
 
-            # Calculate profit/loss over time
-            sales_by_date = df_sales.groupby(df_sales['date'].dt.date)['revenue'].sum().reset_index()
-            sales_by_date.columns = ['date', 'revenue']
+                st.dataframe(profit_margin_df.style.highlight_max(axis=0, subset=['profit', 'margin']), use_container_width=True)
 
-            expenses_by_date = df_expenses.groupby(df_expenses['date'].dt.date)['cost'].sum().reset_index()
-            expenses_by_date.columns = ['date', 'cost']
+            elif analysis == "📊 Inventory Turnover":
+                st.subheader("📊 Inventory Turnover Analysis")
 
-            # Merge sales and expenses
-            profit_df = pd.merge(sales_by_date, expenses_by_date, on='date', how='outer').fillna(0)
-            profit_df['profit'] = profit_df['revenue'] - profit_df['cost']
-            profit_df['cumulative_profit'] = profit_df['profit'].cumsum()
+                # Units sold over the units on hand, averaged over the same days from the stock ledger
+                total_sales_qty = df_sales['quantity'].sum()
+                avg_inventory = inventory_levels(user_id, since, until)['avg_inventory'].sum()
 
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                total_revenue = profit_df['revenue'].sum()
-                st.metric("Total Revenue", f"₹{total_revenue:,.2f}")
-            with col2:
-                total_cost = profit_df['cost'].sum()
-                st.metric("Total Cost", f"₹{total_cost:,.2f}")
-            with col3:
-                total_profit = profit_df['profit'].sum()
-                st.metric("Net Profit", f"₹{total_profit:,.2f}", delta=f"{total_profit:.0f}")
-
-            # Profit trend chart
-            st.subheader("Profit Trend Over Time")
-            st.line_chart(profit_df.set_index('date')[['revenue', 'cost', 'profit']], use_container_width=True)
-
-            # Cumulative profit chart
-            st.subheader("Cumulative Profit")
-            st.area_chart(profit_df.set_index('date')['cumulative_profit'], use_container_width=True)
-
-            # Profit margin analysis
-            st.subheader("Profit Margin by Product")
-            product_profit = df_sales.groupby('product')['revenue'].sum().reset_index()
-            product_cost = df_expenses.groupby('product')['cost'].sum().reset_index()
-
-            profit_margin_df = pd.merge(product_profit, product_cost, on='product', how='outer').fillna(0)
-            profit_margin_df['profit'] = profit_margin_df['revenue'] - profit_margin_df['cost']
-            profit_margin_df['margin'] = (profit_margin_df['profit'] / profit_margin_df['revenue'] * 100).round(2)
-            profit_margin_df = profit_margin_df.sort_values('profit', ascending=False)
-
-            st.dataframe(profit_margin_df.style.highlight_max(axis=0, subset=['profit', 'margin']), use_container_width=True)
-
-        with tab2:
-            st.subheader("📊 Inventory Turnover Analysis")
-
-            # Calculate inventory turnover
-            total_sales_qty = df_sales['quantity'].sum()
-            avg_inventory = df_products['Quantity'].mean()
-
-            if avg_inventory > 0:
-                turnover_ratio = total_sales_qty / avg_inventory
-                st.metric("Inventory Turnover Ratio", f"{turnover_ratio:.2f}")
-
-                # Turnover by product category
-                st.subheader("Turnover by Category")
-                category_turnover = df_sales.merge(df_products[['Name', 'Category']], left_on='product', right_on='Name', how='left')
-                category_turnover = category_turnover.groupby('Category').agg({
-                    'quantity': 'sum',
-                    'revenue': 'sum'
-                }).reset_index()
-
-                # Calculate average inventory by category
-                category_inventory = df_products.groupby('Category')['Quantity'].mean().reset_index()
-                category_analysis = pd.merge(category_turnover, category_inventory, on='Category', how='left')
-                category_analysis['turnover_ratio'] = category_analysis['quantity'] / category_analysis['Quantity']
-                category_analysis = category_analysis.sort_values('turnover_ratio', ascending=False)
-
-                st.dataframe(category_analysis.style.highlight_max(axis=0), use_container_width=True)
-
-                # Inventory aging analysis
-                st.subheader("Inventory Aging Analysis")
-                current_date = pd.Timestamp.now()
-                df_products_copy = df_products.copy()
-                df_products_copy['Expiry Date'] = pd.to_datetime(df_products_copy['Expiry Date'], format='%d-%m-%Y', errors='coerce')
-                df_products_copy['days_to_expiry'] = (df_products_copy['Expiry Date'] - current_date).dt.days
-
-                # Categorize inventory age
-                conditions = [
-                    (df_products_copy['days_to_expiry'] < 0),
-                    (df_products_copy['days_to_expiry'] <= 30),
-                    (df_products_copy['days_to_expiry'] <= 90),
-                    (df_products_copy['days_to_expiry'] > 90)
-                ]
-                choices = ['Expired', 'Critical (≤30 days)', 'Warning (≤90 days)', 'Good (>90 days)']
-                df_products_copy['age_category'] = np.select(conditions, choices, default='Unknown')
-
-                age_distribution = df_products_copy['age_category'].value_counts()
-                st.bar_chart(age_distribution, use_container_width=True)
-
-        with tab3:
-            st.subheader("🔮 Advanced Sales Forecasting")
-
-            if len(df_sales) > 14:  # Need more data points for robust forecasting
-                # Prepare data for advanced forecasting
-                daily_sales = df_sales.groupby(df_sales['date'].dt.date)['revenue'].sum().reset_index()
-                daily_sales.columns = ['date', 'revenue']
-                daily_sales = daily_sales.sort_values('date')
-
-                # Add time-based features
-                daily_sales['day_of_week'] = daily_sales['date'].dt.dayofweek
-                daily_sales['month'] = daily_sales['date'].dt.month
-                daily_sales['day_of_month'] = daily_sales['date'].dt.day
-                daily_sales['day'] = range(len(daily_sales))
-
-                # Prepare features for ML model
-                features = ['day', 'day_of_week', 'month', 'day_of_month']
-                X = daily_sales[features]
-                y = daily_sales['revenue']
-
-                # Split data for training and testing
-                if len(daily_sales) > 20:
-                    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-                    # Train Random Forest model
-                    rf_model = RandomForestRegressor(n_estimators=100, random_state=42)
-                    rf_model.fit(X_train, y_train)
-
-                    # Evaluate model
-                    rf_predictions = rf_model.predict(X_test)
-                    rf_r2 = r2_score(y_test, rf_predictions)
-                    rf_mae = mean_absolute_error(y_test, rf_predictions)
-
-                    # Also train Linear Regression for comparison
-                    lr_model = LinearRegression()
-                    lr_model.fit(X_train, y_train)
-                    lr_predictions = lr_model.predict(X_test)
-                    lr_r2 = r2_score(y_test, lr_predictions)
-                    lr_mae = mean_absolute_error(y_test, lr_predictions)
-
-                    # Display model comparison
+                if avg_inventory > 0:
+                    turnover_ratio = total_sales_qty / avg_inventory
                     col1, col2 = st.columns(2)
+                    col1.metric("Inventory Turnover Ratio", f"{turnover_ratio:.2f}")
+                    col2.metric("Average Units on Hand", f"{avg_inventory:,.1f}")
+
+                    # Turnover by product category
+                    st.subheader("Turnover by Category")
+                    category_analysis = category_turnover(user_id, since, until)
+
+                    st.dataframe(category_analysis.style.highlight_max(axis=0), use_container_width=True)
+
+                    # Inventory aging analysis
+                    st.subheader("Inventory Aging Analysis")
+                    # Bucketed and valued in one SQL aggregate over the replica
+                    aging = inventory_aging(user_id)
+                    age_distribution = aging.groupby('Bucket', observed=True)['Products'].sum()
+                    st.bar_chart(age_distribution, use_container_width=True)
+
+                    value_at_risk = aging.loc[aging['Bucket'].isin(AT_RISK_BUCKETS), 'Stock Value'].sum()
+                    st.metric("Stock Value at Risk (expired or ≤30 days)", f"₹{value_at_risk:,.2f}")
+                    value_matrix = aging.pivot_table(values='Stock Value', index='Category', columns='Bucket',
+                                                     aggfunc='sum', fill_value=0, observed=True)
+                    st.dataframe(value_matrix.style.format("₹{:,.2f}"), use_container_width=True)
+
+            elif analysis == "🔮 Forecasting":
+                st.subheader("🔮 Advanced Sales Forecasting")
+
+                if len(df_sales) > 14:  # Need more data points for robust forecasting
+                    # Fit the models on daily revenue and forecast the next 14 days (cached until the data changes)
+                    forecast = forecast_daily_revenue(user_id, since, until, horizon=14)
+                    daily_sales = forecast['history']
+                    forecast_df = forecast['forecast']
+                    # Figures below are keyed on the replica copy the forecast came from, not the live data version
+                    predictions = forecast_df['predicted_revenue'].to_numpy()
+                    model_name = forecast['model_name']
+
+                    # Display model comparison from the rolling-origin backtest
+                    if forecast['metrics']:
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.metric("Random Forest MAE", f"₹{forecast['metrics']['rf_mae']:.2f}")
+                            st.metric("Random Forest MAPE", f"{forecast['metrics']['rf_mape']:.1f}%")
+                        with col2:
+                            st.metric("Linear Regression MAE", f"₹{forecast['metrics']['lr_mae']:.2f}")
+                            st.metric("Linear Regression MAPE", f"{forecast['metrics']['lr_mape']:.1f}%")
+
+                        per_horizon = forecast['backtest']['per_horizon']
+                        fig_horizon = cached_figure('backtest_mape', user_id, forecast['as_of'], lambda: px.line(
+                            per_horizon, x='horizon', y='mape', color='model', markers=True,
+                            title=f"Backtest MAPE by Days Ahead ({forecast['backtest']['summary']['folds'].iloc[0]} folds)",
+                            labels={'horizon': 'Days Ahead', 'mape': 'MAPE (%)', 'model': 'Model'}), params=(since, until, today))
+                        st.plotly_chart(fig_horizon, use_container_width=True)
+
+                    st.info(f"🎯 Using {model_name} model for forecasting")
+
+                    fig_forecast = cached_figure('sales_forecast', user_id, forecast['as_of'],
+                                                 lambda: create_forecast_chart(daily_sales, forecast_df, f'14-Day Sales Forecast ({model_name})'),
+                                                 params=(since, until, today))
+                    st.plotly_chart(fig_forecast, use_container_width=True)
+
+                    # Forecast summary
+                    col1, col2, col3 = st.columns(3)
                     with col1:
-                        st.metric("Random Forest R²", f"{rf_r2:.3f}")
-                        st.metric("Random Forest MAE", f"₹{rf_mae:.2f}")
+                        avg_predicted = predictions.mean()
+                        st.metric("Avg Daily Forecast", f"₹{avg_predicted:.2f}")
                     with col2:
-                        st.metric("Linear Regression R²", f"{lr_r2:.3f}")
-                        st.metric("Linear Regression MAE", f"₹{lr_mae:.2f}")
+                        total_forecast = predictions.sum()
+                        st.metric("14-Day Total Forecast", f"₹{total_forecast:.2f}")
+                    with col3:
+                        trend = "📈 Upward" if predictions[-1] > predictions[0] else "📉 Downward"
+                        st.metric("Trend Direction", trend)
+
+                    # Forecast breakdown by day of week
+                    st.subheader("📅 Forecast by Day of Week")
+                    forecast_with_days = forecast_df.copy()
+                    forecast_with_days['day_name'] = forecast_with_days['date'].dt.day_name()
+
+                    day_forecast = forecast_with_days.groupby('day_name')['predicted_revenue'].mean().reset_index()
+                    day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+                    day_forecast['day_name'] = pd.Categorical(day_forecast['day_name'], categories=day_order, ordered=True)
+                    day_forecast = day_forecast.sort_values('day_name')
+
+                    fig_days = cached_figure('forecast_by_weekday', user_id, forecast['as_of'],
+                                             lambda: px.bar(day_forecast, x='day_name', y='predicted_revenue',
+                                                            title='Average Forecast by Day of Week',
+                                                            color='predicted_revenue',
+                                                            color_continuous_scale='Greens'),
+                                             params=(since, until, today))
+                    st.plotly_chart(fig_days, use_container_width=True)
 
-                    # Use the better model for forecasting
-                    best_model = rf_model if rf_r2 > lr_r2 else lr_model
-                    model_name = "Random Forest" if rf_r2 > lr_r2 else "Linear Regression"
                 else:
-                    # Use Linear Regression if insufficient data
-                    best_model = LinearRegression()
-                    best_model.fit(X, y)
-                    model_name = "Linear Regression"
-                    rf_r2 = r2_score(y, best_model.predict(X))
-
-                st.info(f"🎯 Using {model_name} model for forecasting")
+                    st.warning("Need at least 14 days of sales data for advanced forecasting. Current data: {} days".format(len(df_sales.groupby(df_sales['date'].dt.date))))
 
-                # Forecast next 14 days
-                last_date = daily_sales['date'].max()
-                future_dates = pd.date_range(start=last_date + timedelta(days=1), periods=14)
+            elif analysis == "📈 ABC Analysis":
+                st.subheader("📈 ABC Analysis (Pareto Principle)")
 
-                future_features = pd.DataFrame({
-                    'day': range(len(daily_sales), len(daily_sales) + 14),
-                    'day_of_week': [d.weekday() for d in future_dates],
-                    'month': [d.month for d in future_dates],
-                    'day_of_month': [d.day for d in future_dates]
-                })
+                # ABC Analysis for products by revenue
+                product_revenue = abc_classification(user_id, since, until)
 
-                predictions = best_model.predict(future_features)
+                # Display ABC analysis
+                col1, col2 = st.columns(2)
 
-                # Create forecast chart
-                forecast_df = pd.DataFrame({
-                    'date': future_dates,
-                    'predicted_revenue': predictions
-                })
-
-                fig_forecast = create_forecast_chart(daily_sales, forecast_df, f'14-Day Sales Forecast ({model_name})')
-                st.plotly_chart(fig_forecast, use_container_width=True)
-
-                # Forecast summary
-                col1, col2, col3 = st.columns(3)
                 with col1:
-                    avg_predicted = predictions.mean()
-                    st.metric("Avg Daily Forecast", f"₹{avg_predicted:.2f}")
-                with col2:
-                    total_forecast = predictions.sum()
-                    st.metric("14-Day Total Forecast", f"₹{total_forecast:.2f}")
-                with col3:
-                    trend = "📈 Upward" if predictions[-1] > predictions[0] else "📉 Downward"
-                    st.metric("Trend Direction", trend)
+                    st.subheader("Product Classification")
+                    abc_counts = product_revenue['abc_class'].value_counts()
+                    st.bar_chart(abc_counts, use_container_width=True)
 
-                # Forecast breakdown by day of week
-                st.subheader("📅 Forecast by Day of Week")
-                forecast_with_days = forecast_df.copy()
-                forecast_with_days['day_name'] = forecast_with_days['date'].dt.day_name()
-
-                day_forecast = forecast_with_days.groupby('day_name')['predicted_revenue'].mean().reset_index()
-                day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-                day_forecast['day_name'] = pd.Categorical(day_forecast['day_name'], categories=day_order, ordered=True)
-                day_forecast = day_forecast.sort_values('day_name')
-
-                fig_days = px.bar(day_forecast, x='day_name', y='predicted_revenue',
-                                title='Average Forecast by Day of Week',
-                                color='predicted_revenue',
-                                color_continuous_scale='Greens')
-                st.plotly_chart(fig_days, use_container_width=True)
-
-            else:
-                st.warning("Need at least 14 days of sales data for advanced forecasting. Current data: {} days".format(len(df_sales.groupby(df_sales['date'].dt.date))))
-
-        with tab4:
-            st.subheader("📈 ABC Analysis (Pareto Principle)")
-
-            # ABC Analysis for products by revenue
-            product_revenue = df_sales.groupby('product')['revenue'].sum().reset_index()
-            product_revenue = product_revenue.sort_values('revenue', ascending=False)
-            product_revenue['cumulative_revenue'] = product_revenue['revenue'].cumsum()
-            product_revenue['cumulative_percentage'] = (product_revenue['cumulative_revenue'] / product_revenue['revenue'].sum() * 100)
-
-            # Classify products
-            conditions = [
-                (product_revenue['cumulative_percentage'] <= 80),
-                (product_revenue['cumulative_percentage'] <= 95),
-                (product_revenue['cumulative_percentage'] > 95)
-            ]
-            choices = ['A (High Value)', 'B (Medium Value)', 'C (Low Value)']
-            product_revenue['abc_class'] = np.select(conditions, choices)
-
-            # Display ABC analysis
-            col1, col2 = st.columns(2)
-
-            with col1:
-                st.subheader("Product Classification")
-                abc_counts = product_revenue['abc_class'].value_counts()
-                st.bar_chart(abc_counts, use_container_width=True)
-
-            with col2:
-                st.subheader("Revenue Distribution")
-                st.dataframe(product_revenue[['product', 'revenue', 'cumulative_percentage', 'abc_class']].style.highlight_max(axis=0), use_container_width=True)
-
-            # ABC insights
-            a_products = product_revenue[product_revenue['abc_class'] == 'A (High Value)']
-            a_revenue_pct = (a_products['revenue'].sum() / product_revenue['revenue'].sum() * 100)
-
-            st.success(f"🎯 **A-Class Products** ({len(a_products)} products) generate **{a_revenue_pct:.1f}%** of total revenue")
-            st.info("💡 **Recommendation:** Focus inventory management efforts on A-class products")
-
-        with tab5:
-            st.subheader("📋 Key Performance Indicators (KPIs)")
-
-            # Calculate various KPIs
-            kpi_data = {}
+                with col2:
+                    st.subheader("Revenue Distribution")
+                    st.dataframe(product_revenue[['product', 'revenue', 'cumulative_percentage', 'abc_class']].style.highlight_max(axis=0), use_container_width=True)
 
-            # Financial KPIs
-            total_revenue = df_sales['revenue'].sum()
-            total_cost = df_expenses['cost'].sum()
-            gross_profit = total_revenue - total_cost
-            profit_margin = (gross_profit / total_revenue * 100) if total_revenue > 0 else 0
+                # ABC insights
+                a_products = product_revenue[product_revenue['abc_class'] == 'A (High Value)']
+                a_revenue_pct = (a_products['revenue'].sum() / product_revenue['revenue'].sum() * 100)
 
-            kpi_data['Total Revenue'] = f"₹{total_revenue:,.2f}"
-            kpi_data['Total Cost'] = f"₹{total_cost:,.2f}"
-            kpi_data['Gross Profit'] = f"₹{gross_profit:,.2f}"
-            kpi_data['Profit Margin'] = f"{profit_margin:.2f}%"
+                st.success(f"🎯 **A-Class Products** ({len(a_products)} products) generate **{a_revenue_pct:.1f}%** of total revenue")
+                st.info("💡 **Recommendation:** Focus inventory management efforts on A-class products")
 
-            # Inventory KPIs
-            total_products = len(df_products)
-            active_products_count = len(active_products)
-            inventory_accuracy = (active_products_count / total_products * 100) if total_products > 0 else 0
+            elif analysis == "📋 KPIs & Metrics":
+                st.subheader("📋 Key Performance Indicators (KPIs)")
 
-            kpi_data['Total Products'] = total_products
-            kpi_data['Active Products'] = active_products_count
-            kpi_data['Inventory Accuracy'] = f"{inventory_accuracy:.1f}%"
+                # Calculate various KPIs with aggregate queries
+                kpis = kpi_summary(user_id, since, until)
+                kpi_data = {}
 
-            # Sales KPIs
-            total_transactions = len(df_sales)
-            avg_transaction_value = total_revenue / total_transactions if total_transactions > 0 else 0
-            unique_products_sold = df_sales['product'].nunique()
+                # Financial KPIs
+                kpi_data['Total Revenue'] = f"₹{kpis['total_revenue']:,.2f}"
+                kpi_data['Total Cost'] = f"₹{kpis['total_cost']:,.2f}"
+                kpi_data['Gross Profit'] = f"₹{kpis['gross_profit']:,.2f}"
+                kpi_data['Profit Margin'] = f"{kpis['profit_margin']:.2f}%"
 
-            kpi_data['Total Transactions'] = total_transactions
-            kpi_data['Avg Transaction Value'] = f"₹{avg_transaction_value:.2f}"
-            kpi_data['Products Sold'] = unique_products_sold
+                # Inventory KPIs
+                kpi_data['Total Products'] = kpis['total_products']
+                kpi_data['Active Products'] = kpis['active_products']
+                kpi_data['Inventory Accuracy'] = f"{kpis['inventory_accuracy']:.1f}%"
 
-            # Efficiency KPIs
-            total_sales_qty = df_sales['quantity'].sum()
-            avg_inventory_level = df_products['Quantity'].mean()
-            inventory_turnover = total_sales_qty / avg_inventory_level if avg_inventory_level > 0 else 0
+                # Sales KPIs
+                kpi_data['Total Transactions'] = kpis['total_transactions']
+                kpi_data['Avg Transaction Value'] = f"₹{kpis['avg_transaction_value']:.2f}"
+                kpi_data['Products Sold'] = kpis['products_sold']
 
-            kpi_data['Inventory Turnover'] = f"{inventory_turnover:.2f}"
-            kpi_data['Avg Inventory Level'] = f"{avg_inventory_level:.2f}"
+                # Efficiency KPIs
+                kpi_data['Inventory Turnover'] = f"{kpis['inventory_turnover']:.2f}"
+                kpi_data['Avg Inventory Level'] = f"{kpis['avg_inventory_level']:.2f}"
 
-            # Display KPIs in a nice format
-            col1, col2, col3 = st.columns(3)
+                # Display KPIs in a nice format
+                col1, col2, col3 = st.columns(3)
 
-            with col1:
-                st.subheader("💰 Financial KPIs")
-                st.metric("Revenue", kpi_data['Total Revenue'])
-                st.metric("Profit Margin", kpi_data['Profit Margin'])
-                st.metric("Avg Transaction", kpi_data['Avg Transaction Value'])
+                with col1:
+                    st.subheader("💰 Financial KPIs")
+                    st.metric("Revenue", kpi_data['Total Revenue'])
+                    st.metric("Profit Margin", kpi_data['Profit Margin'])
+                    st.metric("Avg Transaction", kpi_data['Avg Transaction Value'])
 
-            with col2:
-                st.subheader("📦 Inventory KPIs")
-                st.metric("Active Products", kpi_data['Active Products'])
-                st.metric("Inventory Turnover", kpi_data['Inventory Turnover'])
-                st.metric("Inventory Accuracy", kpi_data['Inventory Accuracy'])
+                with col2:
+                    st.subheader("📦 Inventory KPIs")
+                    st.metric("Active Products", kpi_data['Active Products'])
+                    st.metric("Inventory Turnover", kpi_data['Inventory Turnover'])
+                    st.metric("Inventory Accuracy", kpi_data['Inventory Accuracy'])
 
-            with col3:
-                st.subheader("📊 Sales KPIs")
-                st.metric("Total Transactions", kpi_data['Total Transactions'])
-                st.metric("Products Sold", kpi_data['Products Sold'])
-                st.metric("Avg Inventory Level", kpi_data['Avg Inventory Level'])
+                with col3:
+                    st.subheader("📊 Sales KPIs")
+                    st.metric("Total Transactions", kpi_data['Total Transactions'])
+                    st.metric("Products Sold", kpi_data['Products Sold'])
+                    st.metric("Avg Inventory Level", kpi_data['Avg Inventory Level'])
 
-            # KPI Trends (if enough historical data)
-            if len(df_sales) > 10:
-                st.subheader("📈 KPI Trends")
+                # KPI Trends (if enough historical data)
+                if kpis['total_transactions'] > 10:
+                    st.subheader("📈 KPI Trends")
 
-                # Calculate weekly KPIs
-                df_sales_copy = df_sales.copy()
-                df_sales_copy['week'] = df_sales_copy['date'].dt.isocalendar().week
-                weekly_revenue = df_sales_copy.groupby('week')['revenue'].sum()
+                    # Weekly KPIs bucketed in SQL on the indexed sale day
+                    weekly = weekly_kpis(user_id, since, until)
+                    st.line_chart(weekly.set_index('week_start')[['revenue', 'cost', 'profit']], use_container_width=True)
 
-                st.line_chart(weekly_revenue, use_container_width=True)
+        else:
+            st.warning("📊 Advanced analytics require both sales and expense data. Start recording transactions to unlock these features!")
 
-    else:
-        st.warning("📊 Advanced analytics require both sales and expense data. Start recording transactions to unlock these features!")
+    advanced_analytics_view()
 
 elif menu == "👥 User Management":
     st.header("👥 User Management")
@@ -1537,17 +1275,7 @@ elif menu == "👥 User Management":
 
     with tab3:
         st.subheader("User Activity Log")
-        conn = sqlite3.connect('inventory.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT u.username, us.action, us.details, us.timestamp
-            FROM user_sessions us
-            JOIN users u ON us.user_id = u.id
-            ORDER BY us.timestamp DESC
-            LIMIT 100
-        ''')
-        activities = cursor.fetchall()
-        conn.close()
+        activities = get_user_activity(limit=100)
 
         if activities:
             df_activities = pd.DataFrame(activities, columns=['User', 'Action', 'Details', 'Timestamp'])
@@ -1556,7 +1284,91 @@ elif menu == "👥 User Management":
         else:
             st.info("No user activities recorded yet.")
 
+elif menu == "🧾 Bill Lookup":
+    st.header("🧾 Bill Lookup")
+
+    # Looking bills up reruns only this section
+    @st.fragment
+    def bill_lookup_view():
+        bill_input = st.text_input("Enter Bill ID or Bill Number", placeholder="BILL-1-00000042 or 42")
+        if bill_input:
+            receipt = get_receipt(user_id, bill_input.strip())
+            if receipt:
+                st.subheader(f"Bill {receipt['Bill ID']}")
+                st.write(f"**Issued:** {receipt['Issued At']}")
+                if receipt['Till Reference']:
+                    st.write(f"**Till reference:** {receipt['Till Reference']}")
+                st.dataframe(pd.DataFrame(receipt['Items']), use_container_width=True, hide_index=True)
+                st.write(f"**Total:** INR {receipt['Total']:.2f}")
+
+                lines = [f"Bill: {receipt['Bill ID']}", f"Issued: {receipt['Issued At']}", ""]
+                lines += [f"{item['Product']} x {item['Quantity']:g} @ INR {item['Unit Price']:.2f} = INR {item['Amount']:.2f}"
+                          for item in receipt['Items']]
+                lines += ["", f"Total: INR {receipt['Total']:.2f}"]
+                st.download_button("🖨️ Reprint Receipt", "\n".join(lines), f"{receipt['Bill ID']}.txt", "text/plain")
+            else:
+                st.error("Bill not found.")
+
+        st.subheader("Recent Bills")
+        recent = get_recent_receipts(user_id)
+        if recent:
+            st.dataframe(pd.DataFrame(recent), use_container_width=True, hide_index=True)
+        else:
+            st.info("No bills issued yet.")
+
+    bill_lookup_view()
+
+elif menu == "🔁 Reorder Recommendations":
+    st.header("🔁 Reorder Recommendations")
+    st.caption(f"Demand over the last {REORDER_LOOKBACK_DAYS} days, {REORDER_LEAD_TIME_DAYS}-day lead time, "
+               f"{REORDER_SERVICE_LEVEL:.0%} service level")
+
+    # Recomputing or filtering reruns only the recommendations section
+    @st.fragment
+    def reorder_recommendations_view():
+        recommendations = get_recommendations(user_id)
+        if st.button("🔄 Recompute Recommendations") or recommendations.empty:
+            with st.spinner("Computing reorder points..."):
+                recompute_recommendations(user_id)
+            recommendations = get_recommendations(user_id)
+
+        if recommendations.empty:
+            st.info("📭 No products to analyse yet.")
+        else:
+            to_order = recommendations[recommendations['suggested_order'] > 0]
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Products Analysed", f"{len(recommendations):,}")
+            with col2:
+                st.metric("Need Reordering", f"{len(to_order):,}")
+            with col3:
+                st.metric("Order Value (INR)", f"{(to_order['suggested_order'] * to_order['unit_cost']).sum():,.2f}")
+            st.caption(f"Last computed {recommendations['computed_at'].iloc[0]}")
+
+            display = recommendations.drop(columns='computed_at').rename(columns={
+                'product_id': 'ID', 'name': 'Name', 'category': 'Category', 'quantity': 'Quantity',
+                'avg_daily_demand': 'Avg Daily Demand', 'demand_std': 'Demand Std Dev',
+                'safety_stock': 'Safety Stock', 'reorder_point': 'Reorder Point', 'eoq': 'EOQ',
+                'suggested_order': 'Suggested Order', 'unit_cost': 'Unit Cost'
+            })
+            only_to_order = st.checkbox("Show only products that need an order", value=True)
+            st.dataframe(display[display['Suggested Order'] > 0] if only_to_order else display,
+                         use_container_width=True, hide_index=True)
+
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button("📥 Download Recommendations CSV", display.to_csv(index=False),
+                                   "reorder_recommendations.csv", "text/csv")
+            with col2:
+                if st.button("✅ Use as Low-Stock Reorder Points"):
+                    updated = apply_reorder_points(user_id)
+                    st.success(f"Reorder points updated for {updated:,} products.")
+
+    reorder_recommendations_view()
+
 elif menu == "📥 Export to CSV":
     st.header("Export Inventory to CSV")
     csv_content = export_to_csv(user_id)
-    st.download_button("Download CSV", csv_content, "inventory.csv", "text/csv")
\ No newline at end of file
+    st.download_button("Download CSV", csv_content, "inventory.csv", "text/csv")
+
+page_memory.end_page()
@@ -0,0 +1,99 @@
+# Rolling-origin backtesting for the sales forecasting models
+# Every candidate model is refit on each TimeSeriesSplit fold and forecasts the
+# next `horizon` days, so errors are measured only on data after the training
+# window. Folds x models run in parallel with joblib, and MAE/MAPE are reported
+# per forecast horizon (1..horizon days ahead).
+#
+# Usage: python backtesting.py --days 730 --jobs 1 2 4   (wall-time scaling benchmark)
+import argparse
+import os
+import time
+from itertools import product
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.model_selection import TimeSeriesSplit
+
+DEFAULT_SPLITS = 5
+
+# Each fold fits single-threaded; the parallelism is across folds and models
+CANDIDATE_MODELS = {
+    'Random Forest': lambda n_jobs=1: RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs),
+    'Linear Regression': lambda n_jobs=1: LinearRegression(),
+}
+
+def _fit_and_score(model_name, X, y, train_index, test_index):
+    model = CANDIDATE_MODELS[model_name]()
+    model.fit(X.iloc[train_index], y.iloc[train_index])
+    actual = y.iloc[test_index].to_numpy()
+    predicted = model.predict(X.iloc[test_index])
+    return model_name, actual, predicted
+
+def backtest(daily_sales, features, horizon=14, n_splits=DEFAULT_SPLITS, n_jobs=-1):
+    """Rolling-origin MAE/MAPE per model and horizon; daily_sales must be sorted and gap-free"""
+    n_splits = min(n_splits, (len(daily_sales) - 1) // horizon - 1)
+    if n_splits < 2:
+        return None
+    X = daily_sales[features]
+    y = daily_sales['revenue']
+    folds = list(TimeSeriesSplit(n_splits=n_splits, test_size=horizon).split(X))
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_and_score)(model_name, X, y, train_index, test_index)
+        for model_name, (train_index, test_index) in product(CANDIDATE_MODELS, folds)
+    )
+
+    rows = []
+    for model_name, actual, predicted in results:
+        for step, (a, p) in enumerate(zip(actual, predicted), start=1):
+            rows.append((model_name, step, abs(a - p), abs(a - p) / abs(a) * 100 if a else np.nan))
+    errors = pd.DataFrame(rows, columns=['model', 'horizon', 'abs_error', 'ape'])
+    per_horizon = (errors.groupby(['model', 'horizon'])
+                   .agg(mae=('abs_error', 'mean'), mape=('ape', 'mean'))
+                   .reset_index())
+    summary = (errors.groupby('model')
+               .agg(mae=('abs_error', 'mean'), mape=('ape', 'mean'))
+               .reset_index())
+    summary['folds'] = n_splits
+
+    # Rank on MAPE, falling back to MAE when there are no non-zero actuals
+    metric = 'mape' if summary['mape'].notna().all() else 'mae'
+    best_model = summary.sort_values(metric).iloc[0]['model']
+    return {'per_horizon': per_horizon, 'summary': summary, 'best_model': best_model, 'selected_on': metric}
+
+def _synthetic_daily_sales(days, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=pd.Timestamp.today().normalize(), periods=days)
+    weekly = 1 + 0.3 * np.sin(2 * np.pi * dates.dayofweek.to_numpy() / 7)
+    revenue = (1000 + np.arange(days) * 0.5) * weekly + rng.normal(0, 80, days)
+    return pd.DataFrame({'date': dates, 'revenue': revenue.clip(min=0)})
+
+def run_benchmark(days=730, jobs=(1, 2, 4), horizon=14, n_splits=DEFAULT_SPLITS):
+    """Wall time of one backtest on a synthetic series for each n_jobs value"""
+    from forecasting import FORECAST_FEATURES, add_time_features
+
+    daily_sales = add_time_features(_synthetic_daily_sales(days))
+    timings = {}
+    for n_jobs in jobs:
+        started = time.perf_counter()
+        backtest(daily_sales, FORECAST_FEATURES, horizon, n_splits, n_jobs)
+        timings[n_jobs] = time.perf_counter() - started
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description='Time a backtest of the forecasting models across core counts')
+    parser.add_argument('--days', type=int, default=730, help='length of the synthetic daily series')
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4], help='n_jobs values to compare')
+    parser.add_argument('--splits', type=int, default=DEFAULT_SPLITS)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPU(s), {args.days} days, {args.splits} folds x {len(CANDIDATE_MODELS)} models")
+    timings = run_benchmark(args.days, args.jobs, n_splits=args.splits)
+    baseline = timings[args.jobs[0]]
+    for n_jobs, seconds in timings.items():
+        print(f"n_jobs={n_jobs}: {seconds:.2f}s ({baseline / seconds:.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# Benchmark of the streaming sale anomaly detector
+# Replays the same synthetic till stream, with a few fat-fingered quantities
+# (x1000) mixed in, through add_sale with detection off and on. Reports the
+# per-sale cost of both, the detector's share of it, and how many typos were
+# flagged against false alarms on ordinary sales.
+#
+# Usage: python benchmark_anomalies.py --sales 20000 --products 200
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+import database
+
+BENCHMARK_USER_ID = 1
+
+def synthetic_sales(count, products, typo_rate, seed=0):
+    """(sale, is_typo) pairs; each product sells around its own typical quantity"""
+    rnd = random.Random(seed)
+    catalogue = [(f'Product {i}', rnd.choice([1, 2, 5, 10, 25]), round(rnd.uniform(5, 100), 2)) for i in range(1, products + 1)]
+    date = datetime.now().strftime('%d-%m-%Y')
+    for _ in range(count):
+        name, typical, price = rnd.choice(catalogue)
+        quantity = rnd.randint(1, 2 * typical)
+        typo = rnd.random() < typo_rate
+        if typo:
+            quantity *= 1000
+        yield {'date': date, 'product': name, 'quantity': quantity, 'revenue': round(quantity * price, 2)}, typo
+
+def _fresh_database(directory, name):
+    database.DB_PATH = os.path.join(directory, name)
+    database.init_user_database()
+
+def _with_detection(detect, run):
+    database.detect_anomalies = detect
+    try:
+        return run()
+    finally:
+        database.detect_anomalies = True
+
+def replay_committed(sales, detect, directory):
+    """Per-sale seconds through add_sale (a transaction and commit each), and the bill ids of the typos"""
+    _fresh_database(directory, f"committed-{'on' if detect else 'off'}.db")
+    typo_bills = set()
+    def run():
+        for sale, typo in sales:
+            bill_id = database.add_sale(sale, BENCHMARK_USER_ID)
+            if typo:
+                typo_bills.add(bill_id)
+    started = time.perf_counter()
+    _with_detection(detect, run)
+    return (time.perf_counter() - started) / len(sales), typo_bills
+
+def replay_batched(sales, detect, directory, attempt):
+    """Per-sale seconds with every sale in one transaction, so the detector's cost is not hidden behind fsync"""
+    _fresh_database(directory, f"batched-{'on' if detect else 'off'}-{attempt}.db")
+    def work(cursor):
+        for sale, _ in sales:
+            database._insert_sale(cursor, sale, BENCHMARK_USER_ID)
+    started = time.perf_counter()
+    _with_detection(detect, lambda: database.write_transaction(work))
+    return (time.perf_counter() - started) / len(sales)
+
+def run_benchmark(sales=20_000, products=200, typo_rate=0.002, repeats=3):
+    """Replay the stream with detection off and on, returning per-sale microseconds and detection counts"""
+    stream = list(synthetic_sales(sales, products, typo_rate))
+    directory = tempfile.mkdtemp(prefix='inventory-anomalies-')
+    committed = {detect: replay_committed(stream, detect, directory) for detect in (False, True)}
+    typo_bills = committed[True][1]
+    flagged = {row['Bill ID'] for row in database.get_sale_anomalies(BENCHMARK_USER_ID, limit=sales)}
+    # Alternate off and on and keep the best run of each, as machine noise exceeds the detector's cost
+    batched = {False: [], True: []}
+    for attempt in range(repeats):
+        for detect in (False, True):
+            batched[detect].append(replay_batched(stream, detect, directory, attempt))
+    return {
+        'sales': sales,
+        'committed_us': {detect: seconds * 1e6 for detect, (seconds, _) in committed.items()},
+        'batched_us': {detect: min(timings) * 1e6 for detect, timings in batched.items()},
+        'typos': len(typo_bills),
+        'typos_flagged': len(typo_bills & flagged),
+        'false_alarms': len(flagged - typo_bills),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the per-sale overhead and hit rate of the anomaly detector')
+    parser.add_argument('--sales', type=int, default=20_000, help='sales to replay')
+    parser.add_argument('--products', type=int, default=200, help='distinct products in the stream')
+    parser.add_argument('--typo-rate', type=float, default=0.002, help='share of sales with a x1000 quantity')
+    parser.add_argument('--repeats', type=int, default=3, help='batched replays per mode (best is reported)')
+    args = parser.parse_args()
+
+    summary = run_benchmark(args.sales, args.products, args.typo_rate, args.repeats)
+    print(f"{summary['sales']:,} sales over {args.products} products")
+    for label, key in (('add_sale, commit per sale', 'committed_us'), ('one transaction', 'batched_us')):
+        off, on = summary[key][False], summary[key][True]
+        print(f"{label:<26} off {off:7.1f} us  on {on:7.1f} us  detector {on - off:+6.1f} us/sale ({(on - off) / off * 100:+.1f}%)")
+    print(f"typos flagged {summary['typos_flagged']}/{summary['typos']}, "
+          f"false alarms {summary['false_alarms']} ({summary['false_alarms'] / summary['sales'] * 100:.2f}% of sales)")
+
+if __name__ == '__main__':
+    main()
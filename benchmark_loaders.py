@@ -0,0 +1,123 @@
+# Benchmark of the typed DataFrame loaders against the list-of-dicts path
+# Seeds a throwaway database with N products and N sales, then compares
+# get_active_products/get_sales + pd.DataFrame(...) with frame_loaders on load
+# time, peak allocation while loading and the memory held by the result.
+#
+# Usage: python benchmark_loaders.py --rows 1000000
+import argparse
+import gc
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import database
+from frame_loaders import load_products_frame, load_sales_frame
+
+BENCHMARK_USER_ID = 1
+CATEGORIES = ['Food', 'Household', 'Clothing', 'Electronics', 'Stationery', 'Toys']
+MEASUREMENTS = ['Units', 'Kilograms', 'Liters', 'Packets']
+
+def seed_database(db_path, rows, seed=0):
+    """Create a database with `rows` products and `rows` sales for one user"""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    database.DB_PATH = db_path
+    database.init_user_database()
+    rnd = random.Random(seed)
+    today = datetime.now()
+    product_names = [f'Product {i}' for i in range(1, min(rows, 5000) + 1)]
+
+    def products():
+        for product_id in range(1, rows + 1):
+            expiry = today + timedelta(days=rnd.randint(-60, 365))
+            yield (product_id, BENCHMARK_USER_ID, f'Product {product_id}', rnd.choice(CATEGORIES),
+                   rnd.uniform(5, 100), rnd.uniform(1, 50), rnd.uniform(0, 500), rnd.choice(MEASUREMENTS),
+                   expiry.strftime('%d-%m-%Y'), expiry.strftime('%Y-%m-%d'))
+
+    def sales():
+        # Appended in date order, as a till would write them
+        for offset in sorted((rnd.randint(0, 730) for _ in range(rows)), reverse=True):
+            day = today - timedelta(days=offset)
+            quantity = rnd.randint(1, 10)
+            yield (BENCHMARK_USER_ID, day.strftime('%d-%m-%Y'), day.strftime('%Y-%m-%d'),
+                   rnd.choice(product_names), quantity, quantity * 12.5, f'BILL-{rnd.randint(1, rows // 3 + 1)}')
+
+    conn = database.get_connection()
+    conn.executemany('''INSERT INTO products (id, user_id, name, category, price, purchase_price, quantity,
+                                              measurement_category, expiry_date, expiry_day)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', products())
+    conn.executemany('INSERT INTO sales (user_id, date, day, product, quantity, revenue, bill_id) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                     sales())
+    conn.commit()
+    conn.close()
+
+def legacy_products():
+    active, expired = database.get_active_products(BENCHMARK_USER_ID)
+    return pd.DataFrame(active + expired)
+
+def legacy_sales():
+    return pd.DataFrame(database.get_sales(BENCHMARK_USER_ID))
+
+def measure(loader, repeats):
+    """Best wall time over `repeats`, then peak traced allocation and result size"""
+    timings = []
+    for _ in range(repeats):
+        gc.collect()
+        started = time.perf_counter()
+        loader()
+        timings.append(time.perf_counter() - started)
+    gc.collect()
+    tracemalloc.start()
+    df = loader()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'seconds': min(timings),
+        'peak_mb': peak / 2**20,
+        'result_mb': df.memory_usage(deep=True).sum() / 2**20,
+        'rows': len(df),
+    }
+
+def run_benchmark(rows=1_000_000, repeats=3, db_path=None):
+    """Seed, measure both paths for products and sales, and return a summary dict"""
+    db_path = db_path or os.path.join(tempfile.mkdtemp(prefix='inventory-bench-'), 'inventory.db')
+    seed_database(db_path, rows)
+    cases = {
+        'products': (legacy_products, lambda: load_products_frame(BENCHMARK_USER_ID)),
+        'sales': (legacy_sales, lambda: load_sales_frame(BENCHMARK_USER_ID)),
+    }
+    summary = {'db_path': db_path, 'rows': rows}
+    for name, (legacy, typed) in cases.items():
+        summary[name] = {'list_of_dicts': measure(legacy, repeats), 'typed_frame': measure(typed, repeats)}
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare list-of-dicts and typed DataFrame loading')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='products and sales to seed')
+    parser.add_argument('--repeats', type=int, default=3, help='timed runs per loader (best is reported)')
+    parser.add_argument('--db', help='database file to create (default: a temporary file)')
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON')
+    args = parser.parse_args()
+
+    summary = run_benchmark(args.rows, args.repeats, args.db)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"{args.rows:,} rows per table")
+    for name in ('products', 'sales'):
+        old, new = summary[name]['list_of_dicts'], summary[name]['typed_frame']
+        print(f"{name}:")
+        print(f"  list of dicts: {old['seconds']:.2f}s  peak {old['peak_mb']:.0f} MB  result {old['result_mb']:.0f} MB")
+        print(f"  typed frame:   {new['seconds']:.2f}s  peak {new['peak_mb']:.0f} MB  result {new['result_mb']:.0f} MB")
+        print(f"  speedup {old['seconds'] / new['seconds']:.1f}x, result {old['result_mb'] / new['result_mb']:.1f}x smaller")
+
+if __name__ == '__main__':
+    main()
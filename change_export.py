@@ -0,0 +1,104 @@
+# Delta export of products, sales and expenses from the change log
+# Triggers record every insert, update and delete on the three tables in
+# change_log with a monotonic sequence number. A client keeps the last seq it
+# applied as its watermark and pulls only what came after it, so a sync costs
+# in proportion to the changes, not the size of the store. Changes are read in
+# keyset-paged chunks up to the newest seq at the start of the sync, so memory
+# stays bounded and a sync ends even while tills keep selling.
+#
+# Usage: python change_export.py --user-id 1 --watermark-file erp.watermark > changes.ndjson
+#        python change_export.py --user-id 1 --since 41250 --chunk-size 5000
+#        python change_export.py --user-id 1 --prune-through 41250
+import argparse
+import json
+import os
+import sys
+
+from database import get_connection, init_user_database, write_transaction
+
+DEFAULT_CHUNK_SIZE = 1000
+
+def latest_seq(user_id):
+    """Sequence number of the user's newest change, 0 before the first one"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT MAX(seq) FROM change_log WHERE user_id = ?', (user_id,))
+    seq = cursor.fetchone()[0]
+    conn.close()
+    return seq or 0
+
+def _change(row):
+    return {'seq': row[0], 'table': row[1], 'op': row[2], 'id': row[3], 'row': json.loads(row[4]), 'changed_at': row[5]}
+
+def get_changes(user_id, since_seq=0, limit=DEFAULT_CHUNK_SIZE, until_seq=None):
+    """Up to `limit` changes after since_seq (and at most until_seq), oldest first"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT seq, table_name, op, row_id, row, changed_at FROM change_log
+        WHERE user_id = ? AND seq > ?{' AND seq <= ?' if until_seq is not None else ''}
+        ORDER BY seq LIMIT ?
+    ''', (user_id, since_seq, until_seq, limit) if until_seq is not None else (user_id, since_seq, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return [_change(row) for row in rows]
+
+def iter_change_chunks(user_id, since_seq=0, chunk_size=DEFAULT_CHUNK_SIZE, until_seq=None):
+    """Lists of changes after since_seq up to until_seq (default: the newest seq now), chunk_size at a time"""
+    until_seq = latest_seq(user_id) if until_seq is None else until_seq
+    while since_seq < until_seq:
+        chunk = get_changes(user_id, since_seq, chunk_size, until_seq)
+        if not chunk:
+            break
+        yield chunk
+        since_seq = chunk[-1]['seq']
+
+def prune_changes(user_id, through_seq):
+    """Delete the user's changes up to through_seq, once every client has synced past it"""
+    def work(cursor):
+        cursor.execute('DELETE FROM change_log WHERE user_id = ? AND seq <= ?', (user_id, through_seq))
+        return cursor.rowcount
+    return write_transaction(work)
+
+def _read_watermark(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return int(f.read().strip() or 0)
+
+def _write_watermark(path, seq):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(f'{seq}\n')
+    os.replace(tmp_path, path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Export product, sale and expense changes since a watermark as NDJSON')
+    parser.add_argument('--user-id', type=int, required=True, help='store to export')
+    start = parser.add_mutually_exclusive_group()
+    start.add_argument('--since', type=int, help='last seq already applied by the client (default 0)')
+    start.add_argument('--watermark-file', help='read the last applied seq from this file and store the new one after the export')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='changes read per query')
+    parser.add_argument('--prune-through', type=int, help='delete changes up to this seq instead of exporting')
+    args = parser.parse_args()
+
+    init_user_database()
+    if args.prune_through is not None:
+        print(f"Deleted {prune_changes(args.user_id, args.prune_through)} change(s)", file=sys.stderr)
+        return
+
+    since_seq = _read_watermark(args.watermark_file) if args.watermark_file else (args.since or 0)
+    until_seq = latest_seq(args.user_id)
+    exported = 0
+    for chunk in iter_change_chunks(args.user_id, since_seq, args.chunk_size, until_seq):
+        sys.stdout.write(''.join(json.dumps(change) + '\n' for change in chunk))
+        exported += len(chunk)
+    sys.stdout.flush()
+    watermark = max(since_seq, until_seq)
+    # The watermark only moves once every change up to it has been written out
+    if args.watermark_file:
+        _write_watermark(args.watermark_file, watermark)
+    print(f"Exported {exported} change(s) after seq {since_seq}; watermark {watermark}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
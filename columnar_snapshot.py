@@ -0,0 +1,146 @@
+# Columnar Parquet snapshot of sales and expenses
+# Rows are appended to Parquet files partitioned by user and month, extended
+# from a rowid watermark after new writes, so analytics pages can memory-map
+# just the columns and months they need instead of rebuilding dicts per row.
+# Refreshes hold a lock file per user and table, so app workers and batch jobs
+# in other processes never extend the same partitions from the same watermark.
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import database
+from database import get_connection, get_data_version
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Sales and expenses are append-only in the app, so a rowid watermark is enough
+# to extend the snapshot without rewriting existing files
+SNAPSHOT_SCHEMAS = {
+    'sales': pa.schema([
+        ('id', pa.int64()),
+        ('day', pa.string()),
+        ('date', pa.string()),
+        ('product', pa.string()),
+        ('quantity', pa.float64()),
+        ('revenue', pa.float64()),
+        ('bill_id', pa.string()),
+    ]),
+    'expenses': pa.schema([
+        ('id', pa.int64()),
+        ('day', pa.string()),
+        ('date', pa.string()),
+        ('product', pa.string()),
+        ('quantity', pa.float64()),
+        ('cost', pa.float64()),
+        ('supplier', pa.string()),
+    ]),
+}
+
+_refresh_lock = threading.Lock()
+
+def snapshot_root():
+    """Snapshot directory, next to the database unless INVENTORY_SNAPSHOT_DIR is set"""
+    return os.environ.get('INVENTORY_SNAPSHOT_DIR') or os.path.join(os.path.dirname(database.DB_PATH), 'snapshots')
+
+def _user_dir(table, user_id):
+    return os.path.join(snapshot_root(), table, f'user_id={user_id}')
+
+@contextmanager
+def _refresh_file_lock(table, user_id):
+    """Exclusive lock on the user's snapshot directory, held across processes"""
+    os.makedirs(_user_dir(table, user_id), exist_ok=True)
+    with open(os.path.join(_user_dir(table, user_id), '_refresh.lock'), 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _read_watermark(table, user_id):
+    path = os.path.join(_user_dir(table, user_id), '_watermark.json')
+    if not os.path.exists(path):
+        return {'rowid': 0, 'version': None}
+    with open(path) as f:
+        return json.load(f)
+
+def _write_watermark(table, user_id, watermark):
+    path = os.path.join(_user_dir(table, user_id), '_watermark.json')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(watermark, f)
+    os.replace(tmp_path, path)
+
+def refresh_snapshot(user_id, table):
+    """Append rows written since the watermark to the user's month partitions"""
+    schema = SNAPSHOT_SCHEMAS[table]
+    version = get_data_version(user_id)
+    with _refresh_lock, _refresh_file_lock(table, user_id):
+        watermark = _read_watermark(table, user_id)
+        if watermark['version'] == version:
+            return 0
+
+        conn = get_connection()
+        df = pd.read_sql_query(f'SELECT {", ".join(schema.names)} FROM {table} WHERE id > ? AND user_id = ? ORDER BY id',
+                               conn, params=(watermark['rowid'], user_id))
+        conn.close()
+
+        if not df.empty:
+            months = df['day'].str[:7].fillna('unknown')
+            for month, part in df.groupby(months):
+                month_dir = os.path.join(_user_dir(table, user_id), f'month={month}')
+                os.makedirs(month_dir, exist_ok=True)
+                path = os.path.join(month_dir, f"part-{part['id'].iloc[0]:012d}-{part['id'].iloc[-1]:012d}.parquet")
+                pq.write_table(pa.Table.from_pandas(part, schema=schema, preserve_index=False), path + '.tmp')
+                os.replace(path + '.tmp', path)
+            watermark['rowid'] = int(df['id'].iloc[-1])
+
+        watermark['version'] = version
+        _write_watermark(table, user_id, watermark)
+        return len(df)
+
+def snapshot_partitions(user_id, table, since_month=None, until_month=None):
+    """Parquet files for the user's months within [since_month, until_month] (YYYY-MM)"""
+    base = _user_dir(table, user_id)
+    if not os.path.isdir(base):
+        return []
+    paths = []
+    for entry in sorted(os.listdir(base)):
+        if not entry.startswith('month='):
+            continue
+        month = entry[len('month='):]
+        if month != 'unknown' and ((since_month and month < since_month) or (until_month and month > until_month)):
+            continue
+        month_dir = os.path.join(base, entry)
+        paths.extend(os.path.join(month_dir, f) for f in sorted(os.listdir(month_dir)) if f.endswith('.parquet'))
+    return paths
+
+def load_snapshot(user_id, table, columns=None, since=None, until=None):
+    """Refresh, then memory-map the requested columns for days in [since, until] (YYYY-MM-DD)"""
+    refresh_snapshot(user_id, table)
+    schema = SNAPSHOT_SCHEMAS[table]
+    columns = list(columns) if columns else schema.names
+    # Month partitions are pruned first, then rows are filtered on the day column
+    filters = [('day', '>=', since)] if since else []
+    filters += [('day', '<=', until)] if until else []
+    tables = [pq.read_table(path, columns=columns, memory_map=True, filters=filters or None)
+              for path in snapshot_partitions(user_id, table, since and since[:7], until and until[:7])]
+    if not tables:
+        return pd.DataFrame({name: pd.Series(dtype=schema.field(name).type.to_pandas_dtype()) for name in columns})
+    return pa.concat_tables(tables).to_pandas()
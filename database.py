@@ -0,0 +1,1120 @@
+# Database layer for the Smart Inventory Dashboard
+import math
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime
+
+import bcrypt
+
+DB_PATH = os.environ.get('INVENTORY_DB_PATH', 'inventory.db')
+
+# Several app replicas share one database file: wait for locks instead of
+# failing, and retry write transactions that still time out
+BUSY_TIMEOUT_SECONDS = 5.0
+WRITE_RETRIES = 5
+RETRY_BASE_DELAY_SECONDS = 0.05
+
+# Stock level below which a product is flagged, unless set per product
+DEFAULT_REORDER_POINT = 5
+
+# Bill ids are allocated per store (user) from bill_sequences, e.g. BILL-1-00000042
+BILL_ID_FORMAT = 'BILL-{user_id}-{number:08d}'
+
+# Streaming sale anomaly detection: every sale is scored against its product's
+# exponentially weighted mean and variance of quantity and revenue. Once a
+# product has ANOMALY_WARMUP_SALES behind it, a sale more than
+# ANOMALY_Z_THRESHOLD deviations above either mean is written to sale_anomalies.
+detect_anomalies = True
+ANOMALY_ALPHA = 0.05
+ANOMALY_Z_THRESHOLD = 4.0
+ANOMALY_WARMUP_SALES = 5
+# Deviation floor as a fraction of the mean, so steady sellers do not flag small changes
+ANOMALY_MIN_STD_FRACTION = 0.5
+
+# Every change to a product's stock is appended to stock_movements with one of
+# these kinds, in the same transaction as the products.quantity update. Full
+# per-product snapshots are derived from the ledger every
+# STOCK_SNAPSHOT_INTERVAL_DAYS, so stock on any day is a snapshot plus the
+# movements after it.
+STOCK_MOVEMENT_KINDS = ('sale', 'purchase', 'adjustment', 'expiry_writeoff')
+STOCK_SNAPSHOT_INTERVAL_DAYS = 7
+
+# Columns of each table recorded in change_log, for downstream systems pulling deltas
+CHANGE_LOG_COLUMNS = {
+    'products': ('id', 'name', 'category', 'price', 'purchase_price', 'quantity', 'measurement_category',
+                 'expiry_date', 'expiry_day', 'status', 'reorder_point'),
+    'sales': ('id', 'date', 'day', 'product', 'quantity', 'revenue', 'bill_id'),
+    'expenses': ('id', 'date', 'day', 'product', 'quantity', 'cost', 'supplier'),
+}
+
+# Optional callback receiving the seconds each write waited for the lock
+lock_wait_observer = None
+# Optional callback receiving every SQL statement run on a new connection
+statement_observer = None
+
+def get_connection():
+    """Open a connection to the inventory database"""
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_SECONDS)
+    if statement_observer:
+        conn.set_trace_callback(statement_observer)
+    return conn
+
+def _is_lock_error(error):
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+def write_transaction(work):
+    """Run work(cursor) in a BEGIN IMMEDIATE transaction, retrying with jitter while locked"""
+    wait_started = time.perf_counter()
+    for attempt in range(WRITE_RETRIES + 1):
+        conn = get_connection()
+        conn.isolation_level = None
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            if lock_wait_observer:
+                lock_wait_observer(time.perf_counter() - wait_started)
+            result = work(conn.cursor())
+            conn.execute('COMMIT')
+            return result
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            if not _is_lock_error(e) or attempt == WRITE_RETRIES:
+                raise
+            time.sleep(random.uniform(0, RETRY_BASE_DELAY_SECONDS * 2 ** attempt))
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+def round_quantity(quantity, measurement_category):
+    """Round quantity based on measurement category"""
+    if measurement_category in ['Units', 'Packets']:
+        return round(quantity, 0)
+    else:  # Kilograms, Liters
+        return round(quantity, 3)
+
+def to_iso_day(date_str):
+    """Convert a stored sale/expense date (DD-MM-YYYY or YYYY-MM-DD ...) to YYYY-MM-DD"""
+    try:
+        return datetime.strptime(date_str, '%d-%m-%Y').strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        return date_str[:10] if date_str else None
+
+def to_iso_expiry(expiry_str):
+    """Convert a DD-MM-YYYY expiry date to a sortable YYYY-MM-DD, or None if it isn't one"""
+    try:
+        return datetime.strptime(expiry_str, '%d-%m-%Y').strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+# SQL equivalent of to_iso_day, used to backfill and bucket existing rows
+ISO_DAY_SQL = ("CASE WHEN {col} GLOB '[0-9][0-9]-[0-9][0-9]-[0-9][0-9][0-9][0-9]*' "
+               "THEN substr({col}, 7, 4) || '-' || substr({col}, 4, 2) || '-' || substr({col}, 1, 2) "
+               "ELSE substr({col}, 1, 10) END")
+
+def day_range_clause(since=None, until=None, column='day'):
+    """' AND ...' condition and parameters limiting an ISO day column to [since, until]"""
+    clause, params = '', []
+    if since:
+        clause += f' AND {column} >= ?'
+        params.append(since)
+    if until:
+        clause += f' AND {column} <= ?'
+        params.append(until)
+    return clause, params
+
+def get_data_version(user_id):
+    """Return the change counter for a user's products, sales and expenses"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT version FROM data_versions WHERE user_id = ?', (user_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+# Database functions
+def get_products(user_id=None):
+    conn = get_connection()
+    cursor = conn.cursor()
+    if user_id:
+        cursor.execute('SELECT id, name, category, price, purchase_price, quantity, measurement_category, expiry_date, reorder_point FROM products WHERE user_id = ?', (user_id,))
+    else:
+        cursor.execute('SELECT id, name, category, price, purchase_price, quantity, measurement_category, expiry_date, reorder_point FROM products')
+    rows = cursor.fetchall()
+    products = []
+    for row in rows:
+        products.append({
+            'ID': row[0],
+            'Name': row[1],
+            'Category': row[2],
+            'Price': row[3],
+            'Purchase Price': row[4],
+            'Quantity': round_quantity(row[5], row[6]),
+            'Measurement Category': row[6],
+            'Expiry Date': row[7],
+            'Reorder Point': row[8]
+        })
+    conn.close()
+    return products
+
+def get_active_products(user_id=None):
+    """Split products into active and expired without writing; expiry_job.py persists the status"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    # Also treat not-yet-swept past dates as expired so pages are right between job runs
+    query = '''SELECT id FROM products
+               WHERE (status = 'expired' OR expiry_day < ?)''' + (' AND user_id = ?' if user_id else '')
+    cursor.execute(query, (datetime.now().strftime('%Y-%m-%d'), user_id) if user_id else (datetime.now().strftime('%Y-%m-%d'),))
+    expired_ids = {row[0] for row in cursor.fetchall()}
+    conn.close()
+
+    active = []
+    expired = []
+    for p in get_products(user_id):
+        (expired if p['ID'] in expired_ids else active).append(p)
+    return active, expired
+
+# Same predicate as idx_products_low_stock, so SQLite answers it from the partial index
+LOW_STOCK_WHERE = "status = 'active' AND quantity < reorder_point"
+
+def get_low_stock_products(user_id):
+    """Active products below their reorder point, largest shortfall first"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT id, name, category, quantity, reorder_point, measurement_category
+        FROM products WHERE user_id = ? AND {LOW_STOCK_WHERE}
+        ORDER BY reorder_point - quantity DESC
+    ''', (user_id,))
+    rows = cursor.fetchall()
+    conn.close()
+    return [{
+        'ID': row[0],
+        'Name': row[1],
+        'Category': row[2],
+        'Quantity': round_quantity(row[3], row[5]),
+        'Reorder Point': row[4],
+        'Shortfall': round_quantity(row[4] - row[3], row[5]),
+        'Measurement Category': row[5]
+    } for row in rows]
+
+def get_inventory_alerts(user_id, kind):
+    """Precomputed near_expiry or low_stock list for a user, as written by the expiry job"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT product_id, name, category, quantity, measurement_category, expiry_day, days_left, computed_at
+        FROM inventory_alerts WHERE user_id = ? AND kind = ?
+        ORDER BY days_left, quantity
+    ''', (user_id, kind))
+    rows = cursor.fetchall()
+    conn.close()
+    return [{
+        'ID': row[0],
+        'Name': row[1],
+        'Category': row[2],
+        'Quantity': row[3],
+        'Measurement Category': row[4],
+        'Expiry Day': row[5],
+        'Days Left': row[6],
+        'Computed At': row[7]
+    } for row in rows]
+
+def get_sales(user_id=None, since=None, until=None):
+    conn = get_connection()
+    cursor = conn.cursor()
+    day_clause, day_params = day_range_clause(since, until)
+    if user_id:
+        cursor.execute(f'SELECT date, product, quantity, revenue, bill_id FROM sales WHERE user_id = ?{day_clause} ORDER BY day DESC', (user_id, *day_params))
+    else:
+        cursor.execute(f'SELECT date, product, quantity, revenue, bill_id FROM sales WHERE 1 = 1{day_clause} ORDER BY day DESC', day_params)
+    rows = cursor.fetchall()
+    sales = []
+    for row in rows:
+        sales.append({
+            'date': row[0],
+            'product': row[1],
+            'quantity': row[2],
+            'revenue': row[3],
+            'bill_id': row[4]
+        })
+    conn.close()
+    return sales
+
+def get_expenses(user_id=None, since=None, until=None):
+    conn = get_connection()
+    cursor = conn.cursor()
+    day_clause, day_params = day_range_clause(since, until)
+    if user_id:
+        cursor.execute(f'SELECT date, product, quantity, cost, supplier FROM expenses WHERE user_id = ?{day_clause} ORDER BY day DESC', (user_id, *day_params))
+    else:
+        cursor.execute(f'SELECT date, product, quantity, cost, supplier FROM expenses WHERE 1 = 1{day_clause} ORDER BY day DESC', day_params)
+    rows = cursor.fetchall()
+    expenses = []
+    for row in rows:
+        expenses.append({
+            'date': row[0],
+            'product': row[1],
+            'quantity': row[2],
+            'cost': row[3],
+            'supplier': row[4]
+        })
+    conn.close()
+    return expenses
+
+def save_product(product, user_id):
+    """Insert a product with its opening stock, or update an existing one's details but not its stock.
+    Returns False if the id belongs to another store."""
+    rounded_quantity = round_quantity(product['Quantity'], product['Measurement Category'])
+    purchase_price = product.get('Purchase Price', 0)  # Default to 0 if not provided
+    reorder_point = product.get('Reorder Point', DEFAULT_REORDER_POINT)
+    expiry_day = to_iso_expiry(product['Expiry Date'])
+    status = 'expired' if expiry_day and expiry_day < datetime.now().strftime('%Y-%m-%d') else 'active'
+
+    def work(cursor):
+        cursor.execute('SELECT user_id FROM products WHERE id = ?', (product['ID'],))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute(
+                'INSERT INTO products (id, user_id, name, category, price, purchase_price, quantity, measurement_category, expiry_date, expiry_day, status, reorder_point) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (product['ID'], user_id, product['Name'], product['Category'], product['Price'], purchase_price, rounded_quantity, product['Measurement Category'], product['Expiry Date'], expiry_day, status, reorder_point))
+            if rounded_quantity:
+                _record_movement(cursor, user_id, product['ID'], 'purchase', rounded_quantity, 'opening stock')
+            return True
+        if row[0] != user_id:
+            return False
+        # Stock only changes through movements, so a stale form cannot overwrite it; a new
+        # expiry day ends the product's expiry, and with it the count of stock written off
+        cursor.execute(
+            "UPDATE products SET name = ?, category = ?, price = ?, purchase_price = ?, measurement_category = ?, expiry_date = ?, expiry_day = ?, status = ?, reorder_point = ?, written_off_quantity = CASE WHEN ? = 'active' THEN 0 ELSE written_off_quantity END WHERE id = ?",
+            (product['Name'], product['Category'], product['Price'], purchase_price, product['Measurement Category'], product['Expiry Date'], expiry_day, status, reorder_point, status, product['ID']))
+        return True
+    return write_transaction(work)
+
+def update_price(product_id, price, user_id):
+    """Change only the selling price, leaving the live quantity untouched"""
+    write_transaction(lambda cursor: cursor.execute(
+        'UPDATE products SET price = ? WHERE id = ? AND user_id = ?', (price, product_id, user_id)))
+
+def update_reorder_point(product_id, reorder_point, user_id):
+    """Change the stock level below which a product shows up as low stock"""
+    write_transaction(lambda cursor: cursor.execute(
+        'UPDATE products SET reorder_point = ? WHERE id = ? AND user_id = ?', (reorder_point, product_id, user_id)))
+
+def _apply_quantity_change(cursor, product_id, qty_change, user_id):
+    # Conditional update: a decrement only applies while enough stock remains
+    cursor.execute('UPDATE products SET quantity = quantity + ? WHERE id = ? AND user_id = ? AND quantity + ? >= 0',
+                   (qty_change, product_id, user_id, qty_change))
+    return cursor.rowcount == 1
+
+def _record_movement(cursor, user_id, product_id, kind, quantity, reference=None):
+    """Append a signed stock change to the ledger, inside the transaction that applied it"""
+    now = datetime.now()
+    cursor.execute('INSERT INTO stock_movements (user_id, product_id, kind, quantity, day, moved_at, reference) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                   (user_id, product_id, kind, quantity, now.strftime('%Y-%m-%d'), now.isoformat(timespec='seconds'), reference))
+
+def _next_bill(cursor, user_id):
+    # Runs inside the sale's write transaction, so numbers are gapless and never reused
+    cursor.execute('''INSERT INTO bill_sequences (user_id, last_number) VALUES (?, 1)
+                      ON CONFLICT (user_id) DO UPDATE SET last_number = last_number + 1''', (user_id,))
+    cursor.execute('SELECT last_number FROM bill_sequences WHERE user_id = ?', (user_id,))
+    number = cursor.fetchone()[0]
+    return number, BILL_ID_FORMAT.format(user_id=user_id, number=number)
+
+def _anomaly_scale(mean, variance):
+    return max(math.sqrt(variance), ANOMALY_MIN_STD_FRACTION * abs(mean), 1.0)
+
+def _ewma_update(mean, variance, value, alpha):
+    difference = value - mean
+    increment = alpha * difference
+    return mean + increment, (1 - alpha) * (variance + difference * increment)
+
+def _observe_sale(cursor, user_id, sale, bill_id, day):
+    """Score a sale against its product's running statistics, record it if anomalous, then fold it in"""
+    quantity, revenue = float(sale['quantity']), float(sale['revenue'])
+    cursor.execute('''SELECT sales, quantity_mean, quantity_var, revenue_mean, revenue_var
+                      FROM sale_stats WHERE user_id = ? AND product = ?''', (user_id, sale['product']))
+    row = cursor.fetchone()
+    if row is None:
+        cursor.execute('INSERT INTO sale_stats VALUES (?, ?, 1, ?, 0, ?, 0)', (user_id, sale['product'], quantity, revenue))
+        return False
+
+    count, quantity_mean, quantity_var, revenue_mean, revenue_var = row
+    quantity_scale = _anomaly_scale(quantity_mean, quantity_var)
+    revenue_scale = _anomaly_scale(revenue_mean, revenue_var)
+    score = max((quantity - quantity_mean) / quantity_scale, (revenue - revenue_mean) / revenue_scale)
+    flagged = count >= ANOMALY_WARMUP_SALES and score > ANOMALY_Z_THRESHOLD
+    if flagged:
+        cursor.execute('''INSERT INTO sale_anomalies (user_id, bill_id, product, day, quantity, revenue,
+                                                      expected_quantity, expected_revenue, score, detected_at)
+                          VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                       (user_id, bill_id, sale['product'], day, quantity, revenue, quantity_mean, revenue_mean,
+                        score, datetime.now().isoformat(timespec='seconds')))
+    if count >= ANOMALY_WARMUP_SALES:
+        # Fold values in clipped at the threshold, so one typo cannot drag the baseline with it
+        quantity = min(quantity, quantity_mean + ANOMALY_Z_THRESHOLD * quantity_scale)
+        revenue = min(revenue, revenue_mean + ANOMALY_Z_THRESHOLD * revenue_scale)
+    # Plain running mean and variance until the warm-up is over
+    alpha = max(ANOMALY_ALPHA, 1 / (count + 1))
+    quantity_mean, quantity_var = _ewma_update(quantity_mean, quantity_var, quantity, alpha)
+    revenue_mean, revenue_var = _ewma_update(revenue_mean, revenue_var, revenue, alpha)
+    cursor.execute('''UPDATE sale_stats SET sales = sales + 1, quantity_mean = ?, quantity_var = ?, revenue_mean = ?, revenue_var = ?
+                      WHERE user_id = ? AND product = ?''',
+                   (quantity_mean, quantity_var, revenue_mean, revenue_var, user_id, sale['product']))
+    return flagged
+
+def _insert_sale(cursor, sale, user_id, product_id=None):
+    """Insert a sale with a newly allocated bill and its receipt; returns the bill id"""
+    number, bill_id = _next_bill(cursor, user_id)
+    day = to_iso_day(sale['date'])
+    cursor.execute('INSERT INTO sales (user_id, date, day, product, quantity, revenue, bill_id) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                   (user_id, sale['date'], day, sale['product'], sale['quantity'], sale['revenue'], bill_id))
+    cursor.execute('INSERT INTO receipts (bill_id, user_id, bill_number, issued_at, day, total, external_ref) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                   (bill_id, user_id, number, datetime.now().isoformat(timespec='seconds'), day, sale['revenue'], sale.get('external_ref')))
+    cursor.execute('INSERT INTO receipt_items (bill_id, line_no, product_id, product, quantity, unit_price, amount) VALUES (?, 1, ?, ?, ?, ?, ?)',
+                   (bill_id, product_id, sale['product'], sale['quantity'],
+                    sale['revenue'] / sale['quantity'] if sale['quantity'] else 0, sale['revenue']))
+    if detect_anomalies:
+        _observe_sale(cursor, user_id, sale, bill_id, day)
+    return bill_id
+
+def _insert_expense(cursor, expense, user_id):
+    cursor.execute('INSERT INTO expenses (user_id, date, day, product, quantity, cost, supplier) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                   (user_id, expense['date'], to_iso_day(expense['date']), expense['product'], expense['quantity'], expense['cost'], expense.get('supplier', '')))
+
+def update_quantity(product_id, qty_change, user_id, kind='adjustment', reference=None):
+    """Adjust stock and record the movement; returns False if a decrement would take it below zero"""
+    def work(cursor):
+        if not _apply_quantity_change(cursor, product_id, qty_change, user_id):
+            return False
+        _record_movement(cursor, user_id, product_id, kind, qty_change, reference)
+        return True
+    return write_transaction(work)
+
+def add_sale(sale, user_id):
+    return write_transaction(lambda cursor: _insert_sale(cursor, sale, user_id))
+
+def add_expense(expense, user_id):
+    write_transaction(lambda cursor: _insert_expense(cursor, expense, user_id))
+
+def apply_sale(cursor, product_id, sale, user_id):
+    """Decrement stock and insert the sale within the caller's transaction; returns its bill id or False"""
+    if not _apply_quantity_change(cursor, product_id, -sale['quantity'], user_id):
+        return False
+    bill_id = _insert_sale(cursor, sale, user_id, product_id)
+    _record_movement(cursor, user_id, product_id, 'sale', -sale['quantity'], bill_id)
+    return bill_id
+
+def apply_purchase(cursor, product_id, expense, user_id):
+    """Increment stock and insert the expense within the caller's transaction"""
+    if not _apply_quantity_change(cursor, product_id, expense['quantity'], user_id):
+        return False
+    _insert_expense(cursor, expense, user_id)
+    _record_movement(cursor, user_id, product_id, 'purchase', expense['quantity'], expense.get('supplier'))
+    return True
+
+def record_sale(product_id, sale, user_id):
+    """Decrement stock and record the sale atomically; returns the bill id, or False on insufficient stock"""
+    return write_transaction(lambda cursor: apply_sale(cursor, product_id, sale, user_id))
+
+def record_purchase(product_id, expense, user_id):
+    """Increment stock and record the purchase expense atomically"""
+    return write_transaction(lambda cursor: apply_purchase(cursor, product_id, expense, user_id))
+
+def get_receipt(user_id, bill):
+    """A bill and its line items by bill id or bill number, or None if the store never issued it"""
+    bill_id = BILL_ID_FORMAT.format(user_id=user_id, number=int(bill)) if str(bill).isdigit() else str(bill).strip().upper()
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT bill_id, issued_at, total, external_ref FROM receipts WHERE bill_id = ? AND user_id = ?',
+                   (bill_id, user_id))
+    receipt = cursor.fetchone()
+    if receipt:
+        cursor.execute('SELECT line_no, product, quantity, unit_price, amount FROM receipt_items WHERE bill_id = ? ORDER BY line_no',
+                       (bill_id,))
+    else:
+        # Sales recorded before receipts existed carry a random, possibly shared, bill id
+        cursor.execute('SELECT date, SUM(revenue) FROM sales WHERE user_id = ? AND bill_id = ?', (user_id, bill_id))
+        legacy = cursor.fetchone()
+        if legacy[0] is None:
+            conn.close()
+            return None
+        receipt = (bill_id, legacy[0], legacy[1], None)
+        cursor.execute('''SELECT ROW_NUMBER() OVER (ORDER BY id), product, quantity,
+                                 CASE WHEN quantity THEN revenue / quantity ELSE 0 END, revenue
+                          FROM sales WHERE user_id = ? AND bill_id = ?''', (user_id, bill_id))
+    items = cursor.fetchall()
+    conn.close()
+    return {
+        'Bill ID': receipt[0],
+        'Issued At': receipt[1],
+        'Total': receipt[2],
+        'Till Reference': receipt[3],
+        'Items': [{
+            'Line': row[0],
+            'Product': row[1],
+            'Quantity': row[2],
+            'Unit Price': row[3],
+            'Amount': row[4]
+        } for row in items]
+    }
+
+def get_sale_anomalies(user_id, bill_id=None, limit=50):
+    """Sales flagged by the anomaly detector, newest first, optionally for one bill"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT bill_id, product, day, quantity, revenue, expected_quantity, expected_revenue, score, detected_at
+        FROM sale_anomalies WHERE user_id = ? {'AND bill_id = ?' if bill_id else ''}
+        ORDER BY id DESC LIMIT ?
+    ''', (user_id, bill_id, limit) if bill_id else (user_id, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return [{
+        'Bill ID': row[0],
+        'Product': row[1],
+        'Day': row[2],
+        'Quantity': row[3],
+        'Revenue': row[4],
+        'Expected Quantity': round(row[5], 2),
+        'Expected Revenue': round(row[6], 2),
+        'Score': round(row[7], 1),
+        'Detected At': row[8]
+    } for row in rows]
+
+def get_recent_receipts(user_id, limit=20):
+    """The store's latest bills, newest first"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''SELECT bill_id, issued_at, total, external_ref FROM receipts
+                      WHERE user_id = ? ORDER BY bill_number DESC LIMIT ?''', (user_id, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return [{
+        'Bill ID': row[0],
+        'Issued At': row[1],
+        'Total': row[2],
+        'Till Reference': row[3]
+    } for row in rows]
+
+def delete_product_db(product_id, user_id):
+    """Delete a product, writing its remaining stock off the ledger (as expired if past its expiry day)"""
+    def work(cursor):
+        cursor.execute('SELECT quantity, status, expiry_day FROM products WHERE id = ? AND user_id = ?', (product_id, user_id))
+        row = cursor.fetchone()
+        if row and row[0]:
+            expired = row[1] == 'expired' or (row[2] is not None and row[2] < datetime.now().strftime('%Y-%m-%d'))
+            _record_movement(cursor, user_id, product_id, 'expiry_writeoff' if expired else 'adjustment', -row[0], 'product removed')
+        cursor.execute('DELETE FROM products WHERE id = ? AND user_id = ?', (product_id, user_id))
+    write_transaction(work)
+
+def write_off_expired_stock(cursor, today):
+    """Write off the remaining stock of expired products (including restocks after they expired) as
+    expiry_writeoff movements, moving it from quantity to written_off_quantity so expired stock keeps
+    its value in the aging report. Returns (products written off, their stock value at purchase price)."""
+    cursor.execute('''
+        SELECT user_id, id, quantity, COALESCE(purchase_price, 0) FROM products
+        WHERE (status = 'expired' OR (status = 'active' AND expiry_day < ?)) AND quantity > 0 AND user_id IS NOT NULL
+    ''', (today,))
+    expired_stock = cursor.fetchall()
+    for user_id, product_id, quantity, _ in expired_stock:
+        _record_movement(cursor, user_id, product_id, 'expiry_writeoff', -quantity, 'expired')
+    cursor.executemany('UPDATE products SET written_off_quantity = written_off_quantity + quantity, quantity = 0 WHERE id = ?',
+                       ((product_id,) for _, product_id, _, _ in expired_stock))
+    return len(expired_stock), sum(quantity * purchase_price for *_, quantity, purchase_price in expired_stock)
+
+# Ledger balance per product: the latest snapshot plus the movements after it
+LEDGER_BALANCE_SQL = """
+    WITH run AS (SELECT day, last_movement_id FROM stock_snapshot_runs ORDER BY day DESC LIMIT 1)
+    SELECT user_id, product_id, SUM(quantity) AS quantity FROM (
+        SELECT user_id, product_id, quantity FROM stock_snapshots WHERE day = (SELECT day FROM run)
+        UNION ALL
+        SELECT user_id, product_id, quantity FROM stock_movements
+        WHERE id > COALESCE((SELECT last_movement_id FROM run), 0)
+    ) GROUP BY user_id, product_id
+"""
+
+def snapshot_stock(cursor, day, min_interval_days=0):
+    """Store every product's ledger balance as the snapshot for `day`, from the previous snapshot and the
+    movements since. Returns the rows written, or None if the last snapshot is under min_interval_days old."""
+    # The balance covers every recorded movement, so a snapshot dated before any of them would count those
+    # twice in query_stock_at; movements are appended as they happen, so the last one carries the latest day
+    cursor.execute('SELECT id, day FROM stock_movements WHERE id = (SELECT MAX(id) FROM stock_movements)')
+    last_movement_id, latest_day = cursor.fetchone() or (0, None)
+    if latest_day is not None and day < latest_day:
+        raise ValueError(f'Cannot snapshot stock for {day}: movements are recorded up to {latest_day}')
+    cursor.execute('SELECT day FROM stock_snapshot_runs ORDER BY day DESC LIMIT 1')
+    previous = cursor.fetchone()
+    if previous and (datetime.strptime(day, '%Y-%m-%d') - datetime.strptime(previous[0], '%Y-%m-%d')).days < min_interval_days:
+        return None
+    balances = cursor.execute(LEDGER_BALANCE_SQL).fetchall()
+    # A rerun on the same day replaces that day's rows; products without stock are left out
+    cursor.execute('DELETE FROM stock_snapshots WHERE day = ?', (day,))
+    cursor.executemany('INSERT INTO stock_snapshots (day, user_id, product_id, quantity) VALUES (?, ?, ?, ?)',
+                       ((day, user_id, product_id, quantity) for user_id, product_id, quantity in balances if abs(quantity) > 1e-9))
+    cursor.execute('INSERT OR REPLACE INTO stock_snapshot_runs (day, last_movement_id) VALUES (?, ?)', (day, last_movement_id))
+    return sum(1 for *_, quantity in balances if abs(quantity) > 1e-9)
+
+def reconcile_stock_ledger(cursor):
+    """Record an adjustment wherever products.quantity differs from the ledger balance, e.g. stock loaded before
+    the ledger existed or written by bulk SQL; returns the number of adjustments"""
+    cursor.execute(f"""
+        WITH balance AS ({LEDGER_BALANCE_SQL})
+        SELECT p.user_id, p.id, COALESCE(p.quantity, 0) - COALESCE(b.quantity, 0)
+        FROM products AS p LEFT JOIN balance AS b ON b.user_id = p.user_id AND b.product_id = p.id
+        WHERE p.user_id IS NOT NULL
+        UNION ALL
+        SELECT b.user_id, b.product_id, -b.quantity
+        FROM balance AS b WHERE NOT EXISTS (SELECT 1 FROM products AS p WHERE p.id = b.product_id AND p.user_id = b.user_id)
+    """)
+    drift = [row for row in cursor.fetchall() if abs(row[2]) > 1e-9]
+    for user_id, product_id, quantity in drift:
+        _record_movement(cursor, user_id, product_id, 'adjustment', quantity, 'reconciliation')
+    return len(drift)
+
+# User Management Functions
+# Store-wide rows of sales_daily use this product key
+ALL_PRODUCTS = ''
+
+def rebuild_sales_daily(cursor, user_id=None):
+    """Recompute sales_daily (daily totals and running sums) from the sales table"""
+    user_clause = 'user_id = :user_id' if user_id else '1 = 1'
+    cursor.execute(f'DELETE FROM sales_daily WHERE {user_clause}', {'user_id': user_id})
+    cursor.execute(f'''
+        WITH daily AS (
+            SELECT user_id, product, day, SUM(COALESCE(revenue, 0)) AS revenue,
+                   SUM(COALESCE(quantity, 0)) AS quantity, COUNT(*) AS transactions
+            FROM sales WHERE {user_clause} AND user_id IS NOT NULL AND day IS NOT NULL AND product IS NOT NULL
+            GROUP BY user_id, product, day
+            UNION ALL
+            SELECT user_id, :all_products, day, SUM(COALESCE(revenue, 0)),
+                   SUM(COALESCE(quantity, 0)), COUNT(*)
+            FROM sales WHERE {user_clause} AND user_id IS NOT NULL AND day IS NOT NULL
+            GROUP BY user_id, day
+        )
+        INSERT INTO sales_daily (user_id, product, day, revenue, quantity, transactions,
+                                 cum_revenue, cum_revenue_sq, cum_quantity, cum_transactions)
+        SELECT user_id, product, day, revenue, quantity, transactions,
+               SUM(revenue) OVER running, SUM(revenue * revenue) OVER running,
+               SUM(quantity) OVER running, SUM(transactions) OVER running
+        FROM daily
+        WINDOW running AS (PARTITION BY user_id, product ORDER BY day ROWS UNBOUNDED PRECEDING)
+    ''', {'user_id': user_id, 'all_products': ALL_PRODUCTS})
+
+def add_column_if_missing(cursor, table, column, declaration):
+    """Add a column to an existing table unless it is already there"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+def init_user_database():
+    """Initialize user database tables"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    # WAL lets readers run alongside the single writer; the setting persists in the file
+    cursor.execute('PRAGMA journal_mode=WAL')
+
+    # Create users table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'user',
+            full_name TEXT,
+            email TEXT,
+            created_date TEXT DEFAULT CURRENT_TIMESTAMP,
+            last_login TEXT,
+            is_active INTEGER DEFAULT 1
+        )
+    ''')
+
+    # Create user_sessions table for activity tracking
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            action TEXT,
+            timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+            details TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Create products table with user_id
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            category TEXT,
+            price REAL,
+            purchase_price REAL DEFAULT 0,
+            quantity REAL,
+            measurement_category TEXT,
+            expiry_date TEXT,
+            expiry_day TEXT,
+            status TEXT NOT NULL DEFAULT 'active',
+            reorder_point REAL NOT NULL DEFAULT 5,
+            written_off_quantity REAL NOT NULL DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Create sales table with user_id
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            date TEXT,
+            day TEXT,
+            product TEXT,
+            quantity REAL,
+            revenue REAL,
+            bill_id TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Create expenses table with user_id
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            date TEXT,
+            day TEXT,
+            product TEXT,
+            quantity REAL,
+            cost REAL,
+            supplier TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Add columns introduced after the first release to existing tables (for migration)
+    add_column_if_missing(cursor, 'products', 'user_id', 'INTEGER')
+    add_column_if_missing(cursor, 'products', 'purchase_price', 'REAL DEFAULT 0')
+    add_column_if_missing(cursor, 'products', 'expiry_day', 'TEXT')
+    add_column_if_missing(cursor, 'products', 'status', "TEXT NOT NULL DEFAULT 'active'")
+    add_column_if_missing(cursor, 'products', 'reorder_point', f'REAL NOT NULL DEFAULT {DEFAULT_REORDER_POINT}')
+    add_column_if_missing(cursor, 'products', 'written_off_quantity', 'REAL NOT NULL DEFAULT 0')
+    add_column_if_missing(cursor, 'sales', 'user_id', 'INTEGER')
+    add_column_if_missing(cursor, 'sales', 'day', 'TEXT')
+    add_column_if_missing(cursor, 'expenses', 'user_id', 'INTEGER')
+    add_column_if_missing(cursor, 'expenses', 'day', 'TEXT')
+
+    # Backfill sortable ISO days for rows written before the day column existed
+    cursor.execute(f"UPDATE sales SET day = {ISO_DAY_SQL.format(col='date')} WHERE day IS NULL")
+    cursor.execute(f"UPDATE expenses SET day = {ISO_DAY_SQL.format(col='date')} WHERE day IS NULL")
+
+    # Older releases overwrote expiry_date with an 'expired' sentinel; move that into status
+    cursor.execute("UPDATE products SET status = 'expired' WHERE expiry_date = 'expired' AND status != 'expired'")
+    cursor.execute('''
+        UPDATE products SET expiry_day = substr(expiry_date, 7, 4) || '-' || substr(expiry_date, 4, 2) || '-' || substr(expiry_date, 1, 2)
+        WHERE expiry_day IS NULL AND expiry_date GLOB '[0-9][0-9]-[0-9][0-9]-[0-9][0-9][0-9][0-9]'
+    ''')
+
+    # Indexes for per-user date-range aggregates
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_user ON products (user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_status_expiry ON products (status, expiry_day)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_user_expiry ON products (user_id, status, expiry_day)')
+    # Partial expression index holding only the rows under their reorder point, ordered by shortfall
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_products_low_stock ON products (user_id, (reorder_point - quantity)) WHERE {LOW_STOCK_WHERE}')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sales_user_day ON sales (user_id, day)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_expenses_user_day ON expenses (user_id, day)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sales_user_bill ON sales (user_id, bill_id)')
+    # The activity log reads the latest actions, newest first
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_sessions_timestamp ON user_sessions (timestamp)')
+
+    # Per-store bill numbering and the receipts behind each bill id
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bill_sequences (
+            user_id INTEGER PRIMARY KEY,
+            last_number INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS receipts (
+            bill_id TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            bill_number INTEGER NOT NULL,
+            issued_at TEXT NOT NULL,
+            day TEXT,
+            total REAL NOT NULL,
+            external_ref TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS receipt_items (
+            bill_id TEXT NOT NULL,
+            line_no INTEGER NOT NULL,
+            product_id INTEGER,
+            product TEXT,
+            quantity REAL,
+            unit_price REAL,
+            amount REAL,
+            PRIMARY KEY (bill_id, line_no)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_receipts_bill_id ON receipts (bill_id)')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_receipts_user_number ON receipts (user_id, bill_number)')
+
+    # Per-product EWMA statistics and the sales they flagged, see _observe_sale
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sale_stats (
+            user_id INTEGER NOT NULL,
+            product TEXT NOT NULL,
+            sales INTEGER NOT NULL,
+            quantity_mean REAL NOT NULL,
+            quantity_var REAL NOT NULL,
+            revenue_mean REAL NOT NULL,
+            revenue_var REAL NOT NULL,
+            PRIMARY KEY (user_id, product)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sale_anomalies (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            bill_id TEXT,
+            product TEXT,
+            day TEXT,
+            quantity REAL,
+            revenue REAL,
+            expected_quantity REAL,
+            expected_revenue REAL,
+            score REAL,
+            detected_at TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sale_anomalies_user ON sale_anomalies (user_id, bill_id)')
+
+    # Near-expiry and low-stock lists precomputed by expiry_job.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_alerts (
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            product_id INTEGER NOT NULL,
+            name TEXT,
+            category TEXT,
+            quantity REAL,
+            measurement_category TEXT,
+            expiry_day TEXT,
+            days_left INTEGER,
+            computed_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, kind, product_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS job_runs (
+            job TEXT PRIMARY KEY,
+            last_run TEXT NOT NULL,
+            details TEXT
+        )
+    ''')
+
+    # Per-product demand statistics written by reorder_engine.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reorder_recommendations (
+            user_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            name TEXT,
+            category TEXT,
+            quantity REAL,
+            avg_daily_demand REAL,
+            demand_std REAL,
+            safety_stock REAL,
+            reorder_point REAL,
+            eoq REAL,
+            suggested_order REAL,
+            unit_cost REAL,
+            computed_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, product_id)
+        )
+    ''')
+
+    # Results of POS ingestion items, so retried requests are not applied twice
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ingest_keys (
+            user_id INTEGER NOT NULL,
+            idempotency_key TEXT NOT NULL,
+            result TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, idempotency_key)
+        )
+    ''')
+
+    # Per-user change counter, bumped by triggers so caches can key on it
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for table in ('products', 'sales', 'expenses'):
+        for event, ref in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version
+                AFTER {event} ON {table}
+                WHEN {ref}.user_id IS NOT NULL
+                BEGIN
+                    INSERT INTO data_versions (user_id, version) VALUES ({ref}.user_id, 1)
+                    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+                END
+            ''')
+
+    # Change data capture: one row per insert, update or delete on the exported
+    # tables, numbered by an AUTOINCREMENT sequence that is never reused. With a
+    # single writer, sequence order is commit order, so a client that stored
+    # the last seq it read can ask for everything after it.
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'change_log'")
+    change_log_is_new = cursor.fetchone() is None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            table_name TEXT NOT NULL,
+            op TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            row TEXT NOT NULL,
+            changed_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_change_log_user_seq ON change_log (user_id, seq)')
+    for table, columns in CHANGE_LOG_COLUMNS.items():
+        for event, ref in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            row_json = ', '.join(f"'{column}', {ref}.{column}" for column in columns)
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_change_log
+                AFTER {event} ON {table}
+                WHEN {ref}.user_id IS NOT NULL
+                BEGIN
+                    INSERT INTO change_log (user_id, table_name, op, row_id, row)
+                    VALUES ({ref}.user_id, '{table}', '{event.lower()}', {ref}.id, json_object({row_json}));
+                END
+            ''')
+    # Existing rows enter the log once as inserts, so a first sync from seq 0 is a full copy
+    if change_log_is_new:
+        for table, columns in CHANGE_LOG_COLUMNS.items():
+            row_json = ', '.join(f"'{column}', {column}" for column in columns)
+            cursor.execute(f'''
+                INSERT INTO change_log (user_id, table_name, op, row_id, row)
+                SELECT user_id, '{table}', 'insert', id, json_object({row_json})
+                FROM {table} WHERE user_id IS NOT NULL ORDER BY id
+            ''')
+
+    # Append-only stock ledger and the periodic snapshots derived from it
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stock_movements'")
+    stock_ledger_is_new = cursor.fetchone() is None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_movements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            day TEXT NOT NULL,
+            moved_at TEXT NOT NULL,
+            reference TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_movements_user_day ON stock_movements (user_id, day)')
+    for event in ('UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_stock_movements_no_{event.lower()}
+            BEFORE {event} ON stock_movements
+            BEGIN
+                SELECT RAISE(ABORT, 'stock_movements is append-only');
+            END
+        ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_snapshots (
+            day TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity REAL NOT NULL,
+            PRIMARY KEY (day, user_id, product_id)
+        ) WITHOUT ROWID
+    ''')
+    # Each snapshot covers the movements up to last_movement_id
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_snapshot_runs (
+            day TEXT PRIMARY KEY,
+            last_movement_id INTEGER NOT NULL
+        )
+    ''')
+
+    # Daily sales per user and product (ALL_PRODUCTS for the store) with running
+    # sums up to each day, so any window total is a difference of two rows.
+    # Appending to the latest day touches one row per key; a backdated sale also
+    # shifts the running sums of the later days.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sales_daily (
+            user_id INTEGER NOT NULL,
+            product TEXT NOT NULL,
+            day TEXT NOT NULL,
+            revenue REAL NOT NULL,
+            quantity REAL NOT NULL,
+            transactions INTEGER NOT NULL,
+            cum_revenue REAL NOT NULL,
+            cum_revenue_sq REAL NOT NULL,
+            cum_quantity REAL NOT NULL,
+            cum_transactions INTEGER NOT NULL,
+            PRIMARY KEY (user_id, product, day)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sales_insert_daily
+        AFTER INSERT ON sales
+        WHEN NEW.user_id IS NOT NULL AND NEW.day IS NOT NULL
+        BEGIN
+            -- A new day starts from the running sums of the day before it
+            INSERT OR IGNORE INTO sales_daily
+            SELECT NEW.user_id, keys.product, NEW.day, 0, 0, 0,
+                   COALESCE(prev.cum_revenue, 0), COALESCE(prev.cum_revenue_sq, 0),
+                   COALESCE(prev.cum_quantity, 0), COALESCE(prev.cum_transactions, 0)
+            FROM (SELECT '{ALL_PRODUCTS}' AS product UNION ALL SELECT NEW.product WHERE NEW.product IS NOT NULL) AS keys
+            LEFT JOIN sales_daily AS prev ON prev.user_id = NEW.user_id AND prev.product = keys.product
+                AND prev.day = (SELECT MAX(day) FROM sales_daily
+                                WHERE user_id = NEW.user_id AND product = keys.product AND day < NEW.day);
+            -- Later days shift by the change in this day's total and its square
+            UPDATE sales_daily SET
+                cum_revenue = cum_revenue + COALESCE(NEW.revenue, 0),
+                cum_revenue_sq = cum_revenue_sq + (
+                    SELECT (2 * this.revenue + COALESCE(NEW.revenue, 0)) * COALESCE(NEW.revenue, 0)
+                    FROM sales_daily AS this
+                    WHERE this.user_id = NEW.user_id AND this.product = sales_daily.product AND this.day = NEW.day),
+                cum_quantity = cum_quantity + COALESCE(NEW.quantity, 0),
+                cum_transactions = cum_transactions + 1
+            WHERE user_id = NEW.user_id AND product IN ('{ALL_PRODUCTS}', NEW.product) AND day > NEW.day;
+            UPDATE sales_daily SET
+                cum_revenue_sq = cum_revenue_sq + (2 * revenue + COALESCE(NEW.revenue, 0)) * COALESCE(NEW.revenue, 0),
+                cum_revenue = cum_revenue + COALESCE(NEW.revenue, 0),
+                cum_quantity = cum_quantity + COALESCE(NEW.quantity, 0),
+                cum_transactions = cum_transactions + 1,
+                revenue = revenue + COALESCE(NEW.revenue, 0),
+                quantity = quantity + COALESCE(NEW.quantity, 0),
+                transactions = transactions + 1
+            WHERE user_id = NEW.user_id AND product IN ('{ALL_PRODUCTS}', NEW.product) AND day = NEW.day;
+        END
+    ''')
+
+    # Create default admin user if no users exist
+    cursor.execute('SELECT COUNT(*) FROM users')
+    if cursor.fetchone()[0] == 0:
+        # Create default admin user
+        admin_password = "admin123"
+        admin_hash = bcrypt.hashpw(admin_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        cursor.execute('''
+            INSERT INTO users (username, password_hash, role, full_name, email)
+            VALUES (?, ?, ?, ?, ?)
+        ''', ('admin', admin_hash, 'admin', 'System Administrator', 'admin@inventory.com'))
+
+        # Get admin user ID and assign existing data to admin if any exists
+        cursor.execute('SELECT id FROM users WHERE username = ?', ('admin',))
+        admin_id = cursor.fetchone()[0]
+
+        # Assign existing products to admin user
+        cursor.execute('UPDATE products SET user_id = ? WHERE user_id IS NULL', (admin_id,))
+        cursor.execute('UPDATE sales SET user_id = ? WHERE user_id IS NULL', (admin_id,))
+        cursor.execute('UPDATE expenses SET user_id = ? WHERE user_id IS NULL', (admin_id,))
+
+    # Databases from before the ledger open it with each product's current stock
+    if stock_ledger_is_new:
+        if reconcile_stock_ledger(cursor):
+            snapshot_stock(cursor, datetime.now().strftime('%Y-%m-%d'))
+
+    # Databases from before sales_daily existed fill it once from their sales
+    cursor.execute('SELECT NOT EXISTS (SELECT 1 FROM sales_daily) AND EXISTS (SELECT 1 FROM sales WHERE user_id IS NOT NULL AND day IS NOT NULL)')
+    if cursor.fetchone()[0]:
+        rebuild_sales_daily(cursor)
+
+    conn.commit()
+    conn.close()
+
+def authenticate_user(username, password):
+    """Authenticate user credentials"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, password_hash, role, full_name FROM users WHERE username = ? AND is_active = 1', (username,))
+    user = cursor.fetchone()
+    conn.close()
+
+    if user and bcrypt.checkpw(password.encode('utf-8'), user[1].encode('utf-8')):
+        return {
+            'id': user[0],
+            'username': username,
+            'role': user[2],
+            'full_name': user[3]
+        }
+    return None
+
+def add_user(username, password, role, full_name, email):
+    """Add a new user"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        cursor.execute('''
+            INSERT INTO users (username, password_hash, role, full_name, email)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (username, password_hash, role, full_name, email))
+        conn.commit()
+        return True
+    except sqlite3.IntegrityError:
+        return False
+    finally:
+        conn.close()
+
+def get_users():
+    """Get all users"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, username, role, full_name, email, created_date, last_login, is_active FROM users')
+    rows = cursor.fetchall()
+    conn.close()
+
+    users = []
+    for row in rows:
+        users.append({
+            'id': row[0],
+            'username': row[1],
+            'role': row[2],
+            'full_name': row[3],
+            'email': row[4],
+            'created_date': row[5],
+            'last_login': row[6],
+            'is_active': row[7]
+        })
+    return users
+
+def log_user_action(user_id, action, details=""):
+    """Log user activity"""
+    write_transaction(lambda cursor: cursor.execute('INSERT INTO user_sessions (user_id, action, details) VALUES (?, ?, ?)',
+                                                    (user_id, action, details)))
+
+def get_user_activity(limit=100):
+    """Latest user actions with their usernames, newest first"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT u.username, us.action, us.details, us.timestamp
+        FROM user_sessions us
+        JOIN users u ON us.user_id = u.id
+        ORDER BY us.timestamp DESC
+        LIMIT ?
+    ''', (limit,))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def update_last_login(user_id):
+    """Update user's last login time"""
+    write_transaction(lambda cursor: cursor.execute('UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?', (user_id,)))
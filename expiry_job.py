@@ -0,0 +1,117 @@
+# Scheduled expiry and low-stock job for the Smart Inventory Dashboard
+# Marks products past their expiry day as expired using the (status, expiry_day)
+# index, writes their remaining stock off as expiry_writeoff movements in the
+# stock ledger, and rebuilds the near-expiry and low-stock alert lists, so page
+# renders read precomputed results instead of parsing dates or writing on every
+# view.
+# Each run also records the stock value sitting in expired and critical aging
+# buckets, from the same SQL aggregate as the Inventory Aging chart, and takes
+# the periodic stock ledger snapshot once the last one is old enough.
+#
+# Usage: python expiry_job.py --once              (e.g. from cron)
+#        python expiry_job.py --interval 900      (keep running)
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import database
+from database import (LOW_STOCK_WHERE, STOCK_SNAPSHOT_INTERVAL_DAYS, init_user_database, snapshot_stock,
+                      write_off_expired_stock, write_transaction)
+from inventory_overview import AT_RISK_BUCKETS, query_aging
+
+JOB_NAME = 'expiry_low_stock'
+DEFAULT_INTERVAL_SECONDS = 15 * 60
+NEAR_EXPIRY_DAYS = 30
+
+def run_expiry_job(today=None):
+    """Expire past-dated products and rebuild the alert lists; returns a summary dict"""
+    today = today or datetime.now().date()
+    today_iso = today.strftime('%Y-%m-%d')
+    horizon_iso = (today + timedelta(days=NEAR_EXPIRY_DAYS)).strftime('%Y-%m-%d')
+    computed_at = datetime.now().isoformat(timespec='seconds')
+
+    def work(cursor):
+        # Valued before the write-off, which moves expired stock out of quantity
+        value_at_risk = sum(row[4] for row in query_aging(cursor, today_iso) if row[0] in AT_RISK_BUCKETS)
+        written_off, written_off_value = write_off_expired_stock(cursor, today_iso)
+        # Range scan on idx_products_status_expiry instead of parsing every row
+        cursor.execute('''
+            UPDATE products SET status = 'expired'
+            WHERE status = 'active' AND expiry_day IS NOT NULL AND expiry_day < ?
+        ''', (today_iso,))
+        expired = cursor.rowcount
+
+        cursor.execute('DELETE FROM inventory_alerts')
+        cursor.execute('''
+            INSERT INTO inventory_alerts (user_id, kind, product_id, name, category, quantity,
+                                          measurement_category, expiry_day, days_left, computed_at)
+            SELECT user_id, 'near_expiry', id, name, category, quantity, measurement_category, expiry_day,
+                   CAST(julianday(expiry_day) - julianday(?) AS INTEGER), ?
+            FROM products
+            WHERE status = 'active' AND expiry_day >= ? AND expiry_day <= ? AND user_id IS NOT NULL
+        ''', (today_iso, computed_at, today_iso, horizon_iso))
+        near_expiry = cursor.rowcount
+        cursor.execute(f'''
+            INSERT INTO inventory_alerts (user_id, kind, product_id, name, category, quantity,
+                                          measurement_category, expiry_day, days_left, computed_at)
+            SELECT user_id, 'low_stock', id, name, category, quantity, measurement_category, expiry_day,
+                   CAST(julianday(expiry_day) - julianday(?) AS INTEGER), ?
+            FROM products
+            WHERE {LOW_STOCK_WHERE} AND user_id IS NOT NULL
+        ''', (today_iso, computed_at))
+        low_stock = cursor.rowcount
+
+        snapshot_rows = snapshot_stock(cursor, today_iso, STOCK_SNAPSHOT_INTERVAL_DAYS)
+        summary = {'expired': expired, 'written_off': written_off, 'written_off_value': round(written_off_value, 2),
+                   'near_expiry': near_expiry, 'low_stock': low_stock, 'value_at_risk': round(value_at_risk, 2),
+                   'stock_snapshot_rows': snapshot_rows}
+        cursor.execute('INSERT OR REPLACE INTO job_runs (job, last_run, details) VALUES (?, ?, ?)',
+                       (JOB_NAME, computed_at, json.dumps(summary)))
+        return summary
+
+    return write_transaction(work)
+
+def last_run():
+    """(last_run, details) of the most recent job run, or None if it never ran"""
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT last_run, details FROM job_runs WHERE job = ?', (JOB_NAME,))
+    row = cursor.fetchone()
+    conn.close()
+    return (row[0], json.loads(row[1])) if row else None
+
+def _run_forever(interval):
+    while True:
+        try:
+            run_expiry_job()
+        except Exception as e:
+            print(f"Expiry job failed: {e}")
+        time.sleep(interval)
+
+def start_background_scheduler(interval=DEFAULT_INTERVAL_SECONDS):
+    """Run the job now and then every `interval` seconds on a daemon thread"""
+    thread = threading.Thread(target=_run_forever, args=(interval,), name='expiry-job', daemon=True)
+    thread.start()
+    return thread
+
+def main():
+    parser = argparse.ArgumentParser(description='Expire products and precompute inventory alerts')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--once', action='store_true', help='run a single pass and exit (default)')
+    mode.add_argument('--interval', type=int, help='keep running, one pass every N seconds')
+    args = parser.parse_args()
+
+    init_user_database()
+    if args.interval:
+        print(f"Running expiry job on {database.DB_PATH} every {args.interval}s")
+        _run_forever(args.interval)
+    else:
+        summary = run_expiry_job()
+        print(f"Expired {summary['expired']}, wrote off stock of {summary['written_off']} "
+              f"(INR {summary['written_off_value']:,.2f}), near expiry {summary['near_expiry']}, "
+              f"low stock {summary['low_stock']}, value at risk INR {summary['value_at_risk']:,.2f}")
+
+if __name__ == '__main__':
+    main()
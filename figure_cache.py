@@ -0,0 +1,60 @@
+# Plotly figure cache
+# Building a figure with plotly.express (argument processing, validation,
+# templating) costs tens of milliseconds, far more than sending it. Built
+# figures are kept as objects keyed by chart id, user and data version in an
+# LRU bounded by the total size of their JSON specs, and returned as they are
+# on a hit, so a hit costs neither a parse nor a rebuild; st.plotly_chart copies
+# a figure before serialising it, so sessions can share one.
+import os
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+import database
+
+MAX_CACHE_BYTES = int(os.environ.get('INVENTORY_FIGURE_CACHE_BYTES', 64 * 2**20))
+
+_lock = threading.Lock()
+_figures = OrderedDict()  # key -> (figure, spec bytes)
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+
+def _store(key, figure, size):
+    with _lock:
+        if key in _figures:
+            _stats['bytes'] -= _figures.pop(key)[1]
+        _figures[key] = (figure, size)
+        _stats['bytes'] += size
+        while _stats['bytes'] > MAX_CACHE_BYTES:
+            _, (_, evicted_size) = _figures.popitem(last=False)
+            _stats['bytes'] -= evicted_size
+            _stats['evictions'] += 1
+
+def cached_figure(chart_id, user_id, version, build, params=()):
+    """Figure for chart_id at this data version; build() runs only on a miss. Callers must not modify it."""
+    key = (database.DB_PATH, chart_id, user_id, version, *params)
+    with _lock:
+        cached = _figures.get(key)
+        if cached is not None:
+            _figures.move_to_end(key)
+            _stats['hits'] += 1
+        else:
+            _stats['misses'] += 1
+    if cached is not None:
+        return cached[0]
+
+    figure = build()
+    size = len(pio.to_json(figure, validate=False))
+    if size <= MAX_CACHE_BYTES:
+        _store(key, figure, size)
+    return figure
+
+def cache_info():
+    """Hits, misses, evictions, entries and bytes held, like lru_cache.cache_info"""
+    with _lock:
+        return {**_stats, 'entries': len(_figures), 'max_bytes': MAX_CACHE_BYTES}
+
+def clear_cache():
+    with _lock:
+        _figures.clear()
+        _stats.update(hits=0, misses=0, evictions=0, bytes=0)
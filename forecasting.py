@@ -0,0 +1,104 @@
+# Sales forecasting for the Smart Inventory Dashboard
+# Backtests Random Forest and Linear Regression on daily revenue and forecasts
+# the next days with the model that had the lower rolling-origin error. Used by
+# the Forecasting tab, where the result is cached until the analytics replica is
+# refreshed, and the offline report generator.
+from datetime import timedelta
+from functools import lru_cache
+
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+from analytics_replica import current_replica, replica_connection
+from backtesting import CANDIDATE_MODELS, backtest
+from database import day_range_clause
+
+FORECAST_FEATURES = ['day', 'day_of_week', 'month', 'day_of_month']
+
+def load_daily_revenue(conn, user_id, since=None, until=None):
+    """Daily revenue for a user within [since, until], summed in SQL on the indexed sale day"""
+    day_clause, day_params = day_range_clause(since, until)
+    daily_sales = pd.read_sql_query(f'''
+        SELECT day AS date, SUM(revenue) AS revenue
+        FROM sales WHERE user_id = ? AND day IS NOT NULL{day_clause}
+        GROUP BY day ORDER BY day
+    ''', conn, params=(user_id, *day_params))
+    daily_sales['date'] = pd.to_datetime(daily_sales['date'], errors='coerce')
+    return daily_sales.dropna(subset=['date']).reset_index(drop=True)
+
+def fill_missing_days(daily_sales):
+    """Reindex to one row per calendar day, with zero revenue on days without sales"""
+    if daily_sales.empty:
+        return daily_sales
+    days = pd.date_range(daily_sales['date'].min(), daily_sales['date'].max(), freq='D')
+    filled = daily_sales.set_index('date')['revenue'].reindex(days, fill_value=0)
+    return filled.rename_axis('date').reset_index()
+
+def add_time_features(daily_sales):
+    """Add the calendar and trend features used by the forecasting models"""
+    daily_sales = daily_sales.sort_values('date').reset_index(drop=True)
+    daily_sales['day_of_week'] = daily_sales['date'].dt.dayofweek
+    daily_sales['month'] = daily_sales['date'].dt.month
+    daily_sales['day_of_month'] = daily_sales['date'].dt.day
+    daily_sales['day'] = range(len(daily_sales))
+    return daily_sales
+
+def forecast_sales(daily_sales, horizon=14, n_jobs=-1):
+    """Backtest the models, then fit the best one on all days and forecast `horizon` days ahead"""
+    daily_sales = add_time_features(fill_missing_days(daily_sales))
+    X = daily_sales[FORECAST_FEATURES]
+    y = daily_sales['revenue']
+
+    backtest_result = backtest(daily_sales, FORECAST_FEATURES, horizon=horizon, n_jobs=n_jobs)
+    metrics = None
+    if backtest_result:
+        model_name = backtest_result['best_model']
+        summary = backtest_result['summary'].set_index('model')
+        metrics = {
+            'rf_mae': float(summary.loc['Random Forest', 'mae']),
+            'rf_mape': float(summary.loc['Random Forest', 'mape']),
+            'lr_mae': float(summary.loc['Linear Regression', 'mae']),
+            'lr_mape': float(summary.loc['Linear Regression', 'mape']),
+        }
+        best_model = CANDIDATE_MODELS[model_name](n_jobs=n_jobs)
+    else:
+        # Use Linear Regression if there is too little history to backtest
+        model_name = "Linear Regression"
+        best_model = LinearRegression()
+    best_model.fit(X, y)
+
+    last_date = daily_sales['date'].max()
+    future_dates = pd.date_range(start=last_date + timedelta(days=1), periods=horizon)
+    future_features = pd.DataFrame({
+        'day': range(len(daily_sales), len(daily_sales) + horizon),
+        'day_of_week': future_dates.dayofweek,
+        'month': future_dates.month,
+        'day_of_month': future_dates.day
+    })
+
+    forecast_df = pd.DataFrame({
+        'date': future_dates,
+        'predicted_revenue': best_model.predict(future_features)
+    })
+    return {
+        'model_name': model_name,
+        'metrics': metrics,
+        'backtest': backtest_result,
+        'history': daily_sales,
+        'forecast': forecast_df,
+    }
+
+def forecast_daily_revenue(user_id, since=None, until=None, horizon=14):
+    """forecast_sales over the user's daily revenue within [since, until] in the analytics replica,
+    cached until the replica is refreshed; 'as_of' is the replica copy it was computed from"""
+    replica_path, as_of = current_replica()
+    forecast = _cached_forecast(replica_path, as_of, user_id, since, until, horizon)
+    forecast = {key: value.copy() if isinstance(value, pd.DataFrame) else value for key, value in forecast.items()}
+    return dict(forecast, as_of=as_of)
+
+@lru_cache(maxsize=32)
+def _cached_forecast(replica_path, as_of, user_id, since, until, horizon):
+    conn = replica_connection()
+    daily_sales = load_daily_revenue(conn, user_id, since, until)
+    conn.close()
+    return forecast_sales(daily_sales, horizon=horizon)
@@ -0,0 +1,127 @@
+# Typed DataFrame loaders for products, sales and expenses
+# Read straight from SQLite into compact columns (categoricals for repeated
+# strings, float32 for quantities) in fetchmany-sized chunks, and round
+# quantities by measurement category in one vectorised pass instead of
+# building and rounding a dict per row.
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from database import day_range_clause, get_connection
+
+CHUNK_ROWS = 100_000
+
+# Measurement categories sold in whole units; everything else keeps 3 decimals
+WHOLE_UNIT_MEASUREMENTS = ['Units', 'Packets']
+
+PRODUCT_DTYPES = {
+    'ID': 'int64',
+    'Name': 'string',  # unique per product, so a categorical would only add overhead
+    'Category': 'category',
+    'Price': 'float64',
+    'Purchase Price': 'float64',
+    'Quantity': 'float64',
+    'Measurement Category': 'category',
+    'Expiry Date': 'string',
+    'Reorder Point': 'float64',
+    'Status': 'category',
+}
+# The ISO day column stands in for the free-form legacy date; with a few hundred
+# distinct days per year it is far smaller as a categorical than as strings
+SALES_DTYPES = {
+    'day': 'category',
+    'product': 'category',
+    'quantity': 'float32',
+    'revenue': 'float64',
+    'bill_id': 'string',  # close to one value per bill, too many for a categorical
+}
+EXPENSES_DTYPES = {
+    'day': 'category',
+    'product': 'category',
+    'quantity': 'float32',
+    'cost': 'float64',
+    'supplier': 'category',
+}
+
+def round_quantities(quantity, measurement_category):
+    """Vectorised round_quantity: whole numbers for Units/Packets, 3 decimals otherwise"""
+    whole = measurement_category.isin(WHOLE_UNIT_MEASUREMENTS).to_numpy()
+    values = quantity.to_numpy()
+    return pd.Series(np.where(whole, np.round(values, 0), np.round(values, 3)).astype(values.dtype),
+                     index=quantity.index, name=quantity.name)
+
+def _column_chunk(values, dtype):
+    """One fetched column as a compact array of `dtype`"""
+    if dtype == 'category':
+        # Sorted categories keep sort_values and comparisons lexical, as for strings
+        codes, categories = pd.factorize(np.array(values, dtype=object), sort=True)
+        return pd.Categorical.from_codes(codes, categories=categories)
+    if dtype == 'string':
+        return pd.array(np.array(values, dtype=object), dtype='string')
+    return np.array(values, dtype=dtype)
+
+def _read_typed(query, params, dtypes):
+    """Read a query with fetchmany, converting each chunk column by column to its compact dtype"""
+    conn = get_connection()
+    try:
+        cursor = conn.execute(query, params)
+        parts = {name: [] for name in dtypes}
+        while True:
+            rows = cursor.fetchmany(CHUNK_ROWS)
+            if not rows:
+                break
+            for (name, dtype), values in zip(dtypes.items(), zip(*rows)):
+                parts[name].append(_column_chunk(values, dtype))
+    finally:
+        conn.close()
+
+    columns = {}
+    for name, dtype in dtypes.items():
+        if not parts[name]:
+            columns[name] = pd.Series(dtype=dtype)
+        elif dtype == 'category':
+            # Chunks carry their own category sets; merge them so the column stays categorical
+            columns[name] = union_categoricals(parts[name], sort_categories=True)
+        elif dtype == 'string':
+            columns[name] = pd.concat([pd.Series(part) for part in parts[name]], ignore_index=True)
+        else:
+            columns[name] = np.concatenate(parts[name])
+    return pd.DataFrame(columns)
+
+def load_products_frame(user_id=None):
+    """Products with a Status column (Active/Expired), matching get_active_products"""
+    df = _read_typed(f'''
+        SELECT id AS "ID", name AS "Name", category AS "Category", price AS "Price",
+               purchase_price AS "Purchase Price", quantity AS "Quantity",
+               measurement_category AS "Measurement Category", expiry_date AS "Expiry Date",
+               reorder_point AS "Reorder Point",
+               CASE WHEN status = 'expired' OR expiry_day < :today THEN 'Expired' ELSE 'Active' END AS "Status"
+        FROM products {'WHERE user_id = :user_id' if user_id else ''}
+    ''', {'today': datetime.now().strftime('%Y-%m-%d'), 'user_id': user_id}, PRODUCT_DTYPES)
+    df['Quantity'] = round_quantities(df['Quantity'], df['Measurement Category'])
+    return df
+
+def load_sales_frame(user_id=None, since=None, until=None):
+    """Sales within [since, until], newest first, as a typed DataFrame"""
+    day_clause, day_params = day_range_clause(since, until)
+    return _read_typed(f'''
+        SELECT day, product, quantity, revenue, bill_id FROM sales
+        WHERE {'user_id = ?' if user_id else '1 = 1'}{day_clause} ORDER BY day DESC
+    ''', ((user_id,) if user_id else ()) + tuple(day_params), SALES_DTYPES)
+
+def load_expenses_frame(user_id=None, since=None, until=None):
+    """Expenses within [since, until], newest first, as a typed DataFrame"""
+    day_clause, day_params = day_range_clause(since, until)
+    return _read_typed(f'''
+        SELECT day, product, quantity, cost, supplier FROM expenses
+        WHERE {'user_id = ?' if user_id else '1 = 1'}{day_clause} ORDER BY day DESC
+    ''', ((user_id,) if user_id else ()) + tuple(day_params), EXPENSES_DTYPES)
+
+def split_active_expired(products):
+    """Active and expired product records from load_products_frame, for the form pages"""
+    records = products.drop(columns='Status').astype(object)
+    records = records.where(records.notna(), None)
+    active = products['Status'] == 'Active'
+    return records[active].to_dict('records'), records[~active].to_dict('records')
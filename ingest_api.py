@@ -0,0 +1,385 @@
+# Headless POS ingestion service for the Smart Inventory Dashboard
+# Tills POST batches of sales and purchases as JSON. Requests are queued and
+# group-committed in micro-batches through the same data layer functions the
+# Streamlit app uses, so the dashboard keeps reading the same inventory.db.
+#
+# Usage: python ingest_api.py --host 127.0.0.1 --port 8502
+#
+# POST /v1/transactions   (HTTP Basic auth with a dashboard user)
+#   {"sales":     [{"product_id": 3, "quantity": 2, "idempotency_key": "till1-000123"}],
+#    "purchases": [{"product_id": 3, "quantity": 10, "cost": 95.0, "supplier": "Acme",
+#                   "idempotency_key": "till1-000124"}]}
+# GET  /v1/stats          sustained ingest throughput
+# GET  /v1/changes?since=41250&chunk_size=1000   (HTTP Basic auth)
+#   product, sale and expense changes after the client's watermark as NDJSON,
+#   streamed chunk by chunk; X-Change-Watermark is the seq to send next time
+# GET  /healthz
+import argparse
+import base64
+import hashlib
+import json
+import math
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import database
+from change_export import DEFAULT_CHUNK_SIZE, iter_change_chunks, latest_seq
+from database import apply_purchase, apply_sale, authenticate_user, init_user_database, write_transaction
+
+MAX_BATCH_ITEMS = 500
+MAX_BATCH_DELAY_SECONDS = 0.01
+MAX_REQUEST_ITEMS = 5000
+MAX_BODY_BYTES = 2 * 1024 * 1024
+MAX_CHANGES_CHUNK = 10_000
+MAX_PRODUCT_ID = 2 ** 63 - 1  # largest SQLite integer
+AUTH_CACHE_SECONDS = 300
+
+class IngestError(ValueError):
+    """Raised for malformed ingestion requests"""
+
+def _positive_number(item, field):
+    value = item.get(field)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value <= 0:
+        raise IngestError(f"'{field}' must be a positive number")
+    return value
+
+def _product_id(item):
+    value = item.get('product_id')
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 < value <= MAX_PRODUCT_ID:
+        raise IngestError(f"'product_id' must be an integer between 1 and {MAX_PRODUCT_ID}")
+    return value
+
+def _optional_text(item, field, default):
+    value = item.get(field)
+    if value is None:
+        return default
+    if not isinstance(value, str):
+        raise IngestError(f"'{field}' must be a string")
+    return value
+
+def _validate_date(item):
+    date = item.get('date') or datetime.now().strftime('%d-%m-%Y')
+    try:
+        datetime.strptime(date, '%d-%m-%Y')
+    except (TypeError, ValueError):
+        raise IngestError("'date' must use DD-MM-YYYY")
+    return date
+
+def parse_batch(payload):
+    """Validate a request body into a list of (kind, item) tuples"""
+    if not isinstance(payload, dict):
+        raise IngestError('Request body must be a JSON object')
+    items = []
+    for kind, field in (('sale', 'sales'), ('purchase', 'purchases')):
+        entries = payload.get(field, [])
+        if not isinstance(entries, list):
+            raise IngestError(f"'{field}' must be a list")
+        for entry in entries:
+            if not isinstance(entry, dict):
+                raise IngestError(f"Every entry in '{field}' must be an object")
+            item = {
+                'product_id': _product_id(entry),
+                'quantity': _positive_number(entry, 'quantity'),
+                'date': _validate_date(entry),
+                'idempotency_key': _optional_text(entry, 'idempotency_key', None),
+            }
+            if kind == 'sale':
+                item['revenue'] = entry.get('revenue')
+                if item['revenue'] is not None and (isinstance(item['revenue'], bool) or not isinstance(item['revenue'], (int, float))
+                                                    or not math.isfinite(item['revenue']) or item['revenue'] < 0):
+                    raise IngestError("'revenue' must be a non-negative number")
+                item['bill_id'] = _optional_text(entry, 'bill_id', '')
+            else:
+                item['cost'] = _positive_number(entry, 'cost')
+                item['supplier'] = _optional_text(entry, 'supplier', '')
+            items.append((kind, item))
+    if not items:
+        raise IngestError('No sales or purchases in request')
+    if len(items) > MAX_REQUEST_ITEMS:
+        raise IngestError(f'At most {MAX_REQUEST_ITEMS} items per request')
+    return items
+
+def _apply_item(cursor, user_id, kind, item):
+    """Apply one sale or purchase inside the group transaction"""
+    key = item['idempotency_key']
+    if key:
+        cursor.execute('SELECT result FROM ingest_keys WHERE user_id = ? AND idempotency_key = ?', (user_id, key))
+        row = cursor.fetchone()
+        if row:
+            original = json.loads(row[0])
+            duplicate = {'status': 'duplicate', 'original_status': original['status']}
+            if 'bill_id' in original:
+                duplicate['bill_id'] = original['bill_id']
+            return duplicate
+
+    cursor.execute('SELECT name, price FROM products WHERE id = ? AND user_id = ?', (item['product_id'], user_id))
+    product = cursor.fetchone()
+    if product is None:
+        result = {'status': 'rejected', 'reason': 'unknown product'}
+    elif kind == 'sale':
+        sale = {
+            'date': item['date'],
+            'product': product[0],
+            'quantity': item['quantity'],
+            'revenue': item['revenue'] if item['revenue'] is not None else item['quantity'] * (product[1] or 0),
+            'external_ref': item['bill_id'] or None,
+        }
+        bill_id = apply_sale(cursor, item['product_id'], sale, user_id)
+        result = {'status': 'applied', 'bill_id': bill_id} if bill_id else {'status': 'rejected', 'reason': 'insufficient stock'}
+    else:
+        expense = {
+            'date': item['date'],
+            'product': product[0],
+            'quantity': item['quantity'],
+            'cost': item['cost'],
+            'supplier': item['supplier'],
+        }
+        apply_purchase(cursor, item['product_id'], expense, user_id)
+        result = {'status': 'applied'}
+
+    if key:
+        cursor.execute('INSERT INTO ingest_keys (user_id, idempotency_key, result) VALUES (?, ?, ?)',
+                       (user_id, key, json.dumps(result)))
+    return result
+
+class GroupCommitter(threading.Thread):
+    """Single writer that commits queued requests together in micro-batches"""
+
+    def __init__(self, max_batch_items=MAX_BATCH_ITEMS, max_delay=MAX_BATCH_DELAY_SECONDS):
+        super().__init__(name='ingest-group-commit', daemon=True)
+        self.max_batch_items = max_batch_items
+        self.max_delay = max_delay
+        self.requests = queue.Queue()
+        self.stats_lock = threading.Lock()
+        self.started_at = time.time()
+        self.items_committed = 0
+        self.batches_committed = 0
+        self.recent = []  # (timestamp, items) for the last minute
+
+    def submit(self, user_id, items):
+        """Queue a parsed request; returns a Future with the per-item results"""
+        future = Future()
+        self.requests.put((user_id, items, future))
+        return future
+
+    def _collect(self):
+        batch = [self.requests.get()]
+        count = len(batch[0][1])
+        deadline = time.perf_counter() + self.max_delay
+        while count < self.max_batch_items:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            count += len(request[1])
+        return batch, count
+
+    def run(self):
+        while True:
+            batch, count = self._collect()
+
+            def work(cursor):
+                # Each request gets a savepoint, so one that fails is rolled back
+                # and reported on its own while the rest of the batch commits
+                results = []
+                for user_id, items, _ in batch:
+                    cursor.execute('SAVEPOINT ingest_request')
+                    try:
+                        results.append([_apply_item(cursor, user_id, kind, item) for kind, item in items])
+                    except sqlite3.OperationalError:
+                        raise  # locking or I/O trouble affects the whole batch
+                    except Exception as e:
+                        cursor.execute('ROLLBACK TO ingest_request')
+                        results.append(e)
+                    cursor.execute('RELEASE ingest_request')
+                return results
+
+            try:
+                results = write_transaction(work)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, items, future), item_results in zip(batch, results):
+                if isinstance(item_results, Exception):
+                    future.set_exception(item_results)
+                    continue
+                future.set_result([dict(result, idempotency_key=item['idempotency_key'], type=kind)
+                                   for (kind, item), result in zip(items, item_results)])
+            self._record(count)
+
+    def _record(self, count):
+        now = time.time()
+        with self.stats_lock:
+            self.items_committed += count
+            self.batches_committed += 1
+            self.recent.append((now, count))
+            self.recent = [(t, c) for t, c in self.recent if now - t <= 60]
+
+    def stats(self):
+        """Lifetime and last-minute ingest throughput"""
+        now = time.time()
+        with self.stats_lock:
+            recent_items = sum(c for t, c in self.recent if now - t <= 60)
+            uptime = max(now - self.started_at, 1e-9)
+            return {
+                'items_committed': self.items_committed,
+                'batches_committed': self.batches_committed,
+                'avg_items_per_batch': self.items_committed / self.batches_committed if self.batches_committed else 0.0,
+                'items_per_second_lifetime': self.items_committed / uptime,
+                'items_per_second_last_minute': recent_items / min(uptime, 60),
+                'queue_depth': self.requests.qsize(),
+            }
+
+class IngestHandler(BaseHTTPRequestHandler):
+    committer = None
+    _auth_cache = {}  # (username, password digest) -> (user, expires at)
+    _auth_lock = threading.Lock()
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authenticate(self):
+        header = self.headers.get('Authorization', '')
+        if not header.startswith('Basic '):
+            return None
+        try:
+            username, password = base64.b64decode(header[6:]).decode('utf-8').split(':', 1)
+        except (ValueError, UnicodeDecodeError):
+            return None
+        # bcrypt is deliberately slow, so remember credentials that already
+        # verified for a few minutes; a changed password or deactivated user
+        # stops working once the entry expires
+        cache_key = (username, hashlib.sha256(password.encode('utf-8')).hexdigest())
+        now = time.monotonic()
+        with self._auth_lock:
+            user, expires_at = self._auth_cache.get(cache_key, (None, 0))
+        if expires_at <= now:
+            user = authenticate_user(username, password)
+            with self._auth_lock:
+                for key in [key for key, (_, expires) in self._auth_cache.items() if expires <= now]:
+                    del self._auth_cache[key]
+                if user:
+                    self._auth_cache[cache_key] = (user, now + AUTH_CACHE_SECONDS)
+        return user
+
+    def _send_unauthorized(self):
+        self.send_response(401)
+        self.send_header('WWW-Authenticate', 'Basic realm="inventory"')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/healthz':
+            self._send_json(200, {'status': 'ok'})
+        elif url.path == '/v1/stats':
+            self._send_json(200, self.committer.stats())
+        elif url.path == '/v1/changes':
+            self._send_changes(parse_qs(url.query))
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def _send_changes(self, query):
+        user = self._authenticate()
+        if user is None:
+            self._send_unauthorized()
+            return
+        try:
+            since_seq = int(query.get('since', ['0'])[0])
+            chunk_size = int(query.get('chunk_size', [str(DEFAULT_CHUNK_SIZE)])[0])
+        except ValueError:
+            self._send_json(400, {'error': "'since' and 'chunk_size' must be integers"})
+            return
+        if since_seq < 0 or not 0 < chunk_size <= MAX_CHANGES_CHUNK:
+            self._send_json(400, {'error': f"'since' must be >= 0 and 'chunk_size' between 1 and {MAX_CHANGES_CHUNK}"})
+            return
+        until_seq = latest_seq(user['id'])
+        # HTTP/1.0 without Content-Length: the body ends when the connection closes
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('X-Change-Watermark', str(max(since_seq, until_seq)))
+        self.end_headers()
+        for chunk in iter_change_chunks(user['id'], since_seq, chunk_size, until_seq):
+            self.wfile.write(''.join(json.dumps(change) + '\n' for change in chunk).encode('utf-8'))
+
+    def do_POST(self):
+        if self.path != '/v1/transactions':
+            self._send_json(404, {'error': 'not found'})
+            return
+        user = self._authenticate()
+        if user is None:
+            self._send_unauthorized()
+            return
+        try:
+            length = int(self.headers['Content-Length'])
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Content-Length header must be an integer'})
+            return
+        if length < 0:
+            self._send_json(400, {'error': 'Content-Length header must be an integer'})
+            return
+        if length > MAX_BODY_BYTES:
+            self._send_json(413, {'error': 'request too large'})
+            return
+        try:
+            items = parse_batch(json.loads(self.rfile.read(length) or b'null'))
+        except (json.JSONDecodeError, IngestError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        try:
+            results = self.committer.submit(user['id'], items).result()
+        except sqlite3.OperationalError as e:
+            self._send_json(503, {'error': f'commit failed: {e}'})
+            return
+        except Exception as e:
+            self._send_json(500, {'error': f'request failed: {e}'})
+            return
+        self._send_json(200, {'results': results})
+
+    def log_message(self, format, *args):
+        pass  # one line per request would dominate at till volumes
+
+def serve(host='127.0.0.1', port=8502):
+    """Run the ingestion service until interrupted"""
+    init_user_database()
+    committer = GroupCommitter()
+    committer.start()
+    IngestHandler.committer = committer
+    server = ThreadingHTTPServer((host, port), IngestHandler)
+    print(f"Ingesting into {database.DB_PATH} on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(committer.stats(), indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless POS ingestion API for inventory.db')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    args = parser.parse_args()
+    serve(args.host, args.port)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# Inventory overview aggregates for the View Inventory page
+# One GROUP BY over products (category x measurement x status) feeds the status
+# split, the category counts and the heatmap matrix, cached on the user's data
+# version, so the overview costs the same whatever the catalogue size. Shelf-life
+# aging buckets with the stock value in each are another GROUP BY, shared with
+# the scheduled expiry job.
+from datetime import datetime
+from functools import lru_cache
+
+import pandas as pd
+
+import database
+from database import get_connection, get_data_version
+from kpi_engine import ACTIVE_PRODUCT_SQL
+
+# Stock the expiry job wrote off still counts as expired stock; quantity is 0 by then
+EXPIRED_QUANTITY_SQL = """
+    (quantity + CASE WHEN status = 'expired' OR expiry_day < :today THEN written_off_quantity ELSE 0 END)
+"""
+
+# Per-product rounding as in round_quantity, before summing
+ROUNDED_QUANTITY_SQL = f"""
+    CASE WHEN measurement_category IN ('Units', 'Packets') THEN ROUND({EXPIRED_QUANTITY_SQL}, 0)
+         ELSE ROUND({EXPIRED_QUANTITY_SQL}, 3) END
+"""
+
+# Shelf-life buckets in display order; the first two count as value at risk
+AGING_BUCKETS = ['Expired', 'Critical (≤30 days)', 'Warning (≤90 days)', 'Good (>90 days)', 'Unknown']
+AT_RISK_BUCKETS = AGING_BUCKETS[:2]
+
+# Days to expiry by julianday difference; expired matches get_active_products
+AGING_BUCKET_SQL = """
+    CASE WHEN status = 'expired' OR expiry_day < :today THEN 'Expired'
+         WHEN expiry_day IS NULL THEN 'Unknown'
+         WHEN julianday(expiry_day) - julianday(:today) <= 30 THEN 'Critical (≤30 days)'
+         WHEN julianday(expiry_day) - julianday(:today) <= 90 THEN 'Warning (≤90 days)'
+         ELSE 'Good (>90 days)' END
+"""
+
+def query_aging(cursor, today, user_id=None):
+    """(bucket, category, products, quantity, stock value) rows for one user or all users"""
+    cursor.execute(f'''
+        SELECT {AGING_BUCKET_SQL} AS bucket, COALESCE(category, '') AS category, COUNT(*),
+               COALESCE(SUM({EXPIRED_QUANTITY_SQL}), 0), COALESCE(SUM({EXPIRED_QUANTITY_SQL} * COALESCE(purchase_price, 0)), 0)
+        FROM products WHERE {'user_id = :user_id' if user_id else 'user_id IS NOT NULL'}
+        GROUP BY bucket, category
+    ''', {'today': today, 'user_id': user_id})
+    return cursor.fetchall()
+
+def _inventory_groups(user_id):
+    today = datetime.now().strftime('%Y-%m-%d')
+    return _cached_inventory_groups(database.DB_PATH, user_id, get_data_version(user_id), today)
+
+@lru_cache(maxsize=128)
+def _cached_inventory_groups(db_path, user_id, version, today):
+    conn = get_connection()
+    groups = pd.read_sql_query(f'''
+        SELECT category, measurement_category, {ACTIVE_PRODUCT_SQL} AS active,
+               COUNT(*) AS count, COALESCE(SUM({ROUNDED_QUANTITY_SQL}), 0) AS quantity
+        FROM products WHERE user_id = :user_id
+        GROUP BY category, measurement_category, active
+    ''', conn, params={'user_id': user_id, 'today': today})
+    conn.close()
+    return groups
+
+def status_split(user_id):
+    """Product count and quantity for Active and Expired products"""
+    groups = _inventory_groups(user_id)
+    totals = groups.groupby('active')[['count', 'quantity']].sum()
+    return pd.DataFrame({
+        'Status': ['Active', 'Expired'],
+        'Count': [int(totals['count'].get(1, 0)), int(totals['count'].get(0, 0))],
+        'Quantity': [float(totals['quantity'].get(1, 0)), float(totals['quantity'].get(0, 0))],
+    })
+
+def active_category_counts(user_id):
+    """Number of active products per category, largest first"""
+    groups = _inventory_groups(user_id)
+    counts = groups[groups['active'] == 1].groupby('category', dropna=False)['count'].sum()
+    counts = counts.sort_values(ascending=False).reset_index()
+    counts.columns = ['Category', 'Count']
+    return counts
+
+def category_measurement_matrix(user_id):
+    """Total quantity of every product by Category (rows) and Measurement Category (columns)"""
+    groups = _inventory_groups(user_id)
+    return groups.pivot_table(values='quantity', index='category', columns='measurement_category',
+                              aggfunc='sum', fill_value=0).rename_axis(index='Category', columns='Measurement Category')
+
+def aging_frame(rows):
+    """query_aging rows as a DataFrame in bucket order, most valuable categories first"""
+    aging = pd.DataFrame(rows, columns=['Bucket', 'Category', 'Products', 'Quantity', 'Stock Value'])
+    aging['Bucket'] = pd.Categorical(aging['Bucket'], categories=AGING_BUCKETS, ordered=True)
+    return aging.sort_values(['Bucket', 'Stock Value'], ascending=[True, False], ignore_index=True)
+
+@lru_cache(maxsize=128)
+def _cached_aging(db_path, user_id, version, today):
+    conn = get_connection()
+    rows = query_aging(conn.cursor(), today, user_id)
+    conn.close()
+    return aging_frame(rows)
+
+def inventory_aging(user_id):
+    """Products, quantity and stock value (quantity x purchase price) per aging bucket and category"""
+    today = datetime.now().strftime('%Y-%m-%d')
+    return _cached_aging(database.DB_PATH, user_id, get_data_version(user_id), today).copy()
@@ -0,0 +1,119 @@
+# KPI engine for the Smart Inventory Dashboard
+# Computes the KPI set with one aggregate query per table, so it can run
+# inside the Streamlit app or headlessly from scripts and batch jobs.
+from datetime import datetime
+from functools import lru_cache
+
+import pandas as pd
+
+import database
+from database import day_range_clause, get_connection, get_data_version
+from stock_ledger import query_average_inventory
+
+# Mirrors get_active_products: expired status or a past expiry day is expired,
+# products without a parseable expiry day count as active
+ACTIVE_PRODUCT_SQL = """
+    CASE
+        WHEN status = 'expired' THEN 0
+        WHEN expiry_day < :today THEN 0
+        ELSE 1
+    END
+"""
+
+# Monday of the ISO week containing `day`
+WEEK_START_SQL = "date(day, '-' || ((CAST(strftime('%w', day) AS INTEGER) + 6) % 7) || ' days')"
+
+def compute_kpis(user_id, since=None, until=None):
+    """Return the KPI dictionary for a user, cached on the user's data version"""
+    # Sales, purchase and average inventory figures cover [since, until]; product counts are current
+    today = datetime.now().strftime('%Y-%m-%d')
+    return dict(_cached_kpis(database.DB_PATH, user_id, get_data_version(user_id), today, since, until))
+
+def compute_weekly_kpis(user_id, since=None, until=None):
+    """Return weekly revenue, transactions, quantity, cost and profit for a user"""
+    return _cached_weekly_kpis(database.DB_PATH, user_id, get_data_version(user_id), since, until).copy()
+
+def derive_kpis(total_revenue, total_cost, total_purchases, total_purchased_qty,
+                total_products, active_products, total_transactions, products_sold,
+                total_sales_qty, avg_inventory_level):
+    """Build the KPI dictionary from the per-table aggregates"""
+    gross_profit = total_revenue - total_cost
+    return {
+        'total_revenue': total_revenue,
+        'total_cost': total_cost,
+        'gross_profit': gross_profit,
+        'profit_margin': (gross_profit / total_revenue * 100) if total_revenue > 0 else 0,
+        'total_purchases': total_purchases,
+        'total_purchased_qty': total_purchased_qty,
+        'total_products': total_products,
+        'active_products': active_products,
+        'inventory_accuracy': (active_products / total_products * 100) if total_products > 0 else 0,
+        'total_transactions': total_transactions,
+        'avg_transaction_value': total_revenue / total_transactions if total_transactions > 0 else 0,
+        'products_sold': products_sold,
+        'total_sales_qty': total_sales_qty,
+        'avg_inventory_level': avg_inventory_level,
+        'inventory_turnover': total_sales_qty / avg_inventory_level if avg_inventory_level > 0 else 0,
+    }
+
+def query_kpis(cursor, user_id, today, since=None, until=None):
+    """KPI dictionary from one aggregate query per table, on any connection to an inventory database"""
+    day_clause, day_params = day_range_clause(since, until)
+    cursor.execute(f'''
+        SELECT COUNT(*), COALESCE(SUM(revenue), 0), COALESCE(SUM(quantity), 0), COUNT(DISTINCT product)
+        FROM sales WHERE user_id = ?{day_clause}
+    ''', (user_id, *day_params))
+    total_transactions, total_revenue, total_sales_qty, products_sold = cursor.fetchone()
+
+    cursor.execute(f'''
+        SELECT COUNT(*), COALESCE(SUM(cost), 0), COALESCE(SUM(quantity), 0)
+        FROM expenses WHERE user_id = ?{day_clause}
+    ''', (user_id, *day_params))
+    total_purchases, total_cost, total_purchased_qty = cursor.fetchone()
+
+    cursor.execute(f'''
+        SELECT COUNT(*), COALESCE(SUM({ACTIVE_PRODUCT_SQL}), 0)
+        FROM products WHERE user_id = :user_id
+    ''', {'user_id': user_id, 'today': today})
+    total_products, active_products = cursor.fetchone()
+    # Units on hand averaged over the period from the stock ledger, so turnover
+    # divides sales by the stock actually held while they happened
+    avg_inventory_level = sum(query_average_inventory(cursor, user_id, since, until).values())
+
+    return derive_kpis(total_revenue, total_cost, total_purchases, total_purchased_qty,
+                       total_products, active_products, total_transactions, products_sold,
+                       total_sales_qty, avg_inventory_level)
+
+@lru_cache(maxsize=128)
+def _cached_kpis(db_path, user_id, version, today, since=None, until=None):
+    conn = get_connection()
+    kpis = query_kpis(conn.cursor(), user_id, today, since, until)
+    conn.close()
+    return kpis
+
+def query_weekly_kpis(conn, user_id, since=None, until=None):
+    """Weekly revenue, transactions, quantity, cost and profit, on any connection to an inventory database"""
+    day_clause, day_params = day_range_clause(since, until)
+    weekly_sales = pd.read_sql_query(f'''
+        SELECT {WEEK_START_SQL} AS week_start,
+               SUM(revenue) AS revenue, COUNT(*) AS transactions, SUM(quantity) AS quantity
+        FROM sales WHERE user_id = ? AND day IS NOT NULL{day_clause}
+        GROUP BY week_start
+    ''', conn, params=(user_id, *day_params))
+    weekly_cost = pd.read_sql_query(f'''
+        SELECT {WEEK_START_SQL} AS week_start, SUM(cost) AS cost
+        FROM expenses WHERE user_id = ? AND day IS NOT NULL{day_clause}
+        GROUP BY week_start
+    ''', conn, params=(user_id, *day_params))
+
+    weekly = pd.merge(weekly_sales, weekly_cost, on='week_start', how='outer').fillna(0)
+    weekly['profit'] = weekly['revenue'] - weekly['cost']
+    weekly['week_start'] = pd.to_datetime(weekly['week_start'])
+    return weekly.sort_values('week_start').reset_index(drop=True)
+
+@lru_cache(maxsize=128)
+def _cached_weekly_kpis(db_path, user_id, version, since=None, until=None):
+    conn = get_connection()
+    weekly = query_weekly_kpis(conn, user_id, since, until)
+    conn.close()
+    return weekly
@@ -0,0 +1,150 @@
+# Concurrent-writer load test for the inventory data layer
+# Drives simulated sellers and buyers in separate processes (like several app
+# replicas sharing one inventory.db) and reports throughput, lock-wait
+# latency and stock invariant violations.
+#
+# Usage: python load_test.py --sellers 4 --buyers 2 --duration 10
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+import database
+
+LOAD_TEST_USER_ID = 1
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def seed_database(db_path, products, initial_stock):
+    """Create a fresh database with `products` items of `initial_stock` each"""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    database.DB_PATH = db_path
+    database.init_user_database()
+    expiry = datetime.now().replace(year=datetime.now().year + 1).strftime('%d-%m-%Y')
+    for product_id in range(1, products + 1):
+        database.save_product({
+            'ID': product_id,
+            'Name': f'Load Product {product_id}',
+            'Category': 'Load Test',
+            'Price': 10.0,
+            'Purchase Price': 6.0,
+            'Quantity': initial_stock,
+            'Measurement Category': 'Units',
+            'Expiry Date': expiry,
+        }, LOAD_TEST_USER_ID)
+
+def run_worker(role, db_path, products, duration, seed):
+    """Sell or buy random products until the deadline; returns raw measurements"""
+    database.DB_PATH = db_path
+    lock_waits = []
+    database.lock_wait_observer = lock_waits.append
+    rnd = random.Random(seed)
+    latencies = []
+    rejected = 0
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    while time.perf_counter() < deadline:
+        product_id = rnd.randint(1, products)
+        qty = rnd.randint(1, 5)
+        today = datetime.now().strftime('%d-%m-%Y')
+        started = time.perf_counter()
+        try:
+            if role == 'seller':
+                ok = database.record_sale(product_id, {
+                    'date': today, 'product': f'Load Product {product_id}',
+                    'quantity': qty, 'revenue': qty * 10.0, 'bill_id': '',
+                }, LOAD_TEST_USER_ID)
+            else:
+                ok = database.record_purchase(product_id, {
+                    'date': today, 'product': f'Load Product {product_id}',
+                    'quantity': qty, 'cost': qty * 6.0, 'supplier': 'Load Supplier',
+                }, LOAD_TEST_USER_ID)
+            if not ok:
+                rejected += 1
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+
+    return {'role': role, 'latencies': latencies, 'lock_waits': lock_waits,
+            'rejected': rejected, 'errors': errors}
+
+def check_invariants(db_path, initial_stock):
+    """Count products with negative stock or stock that doesn't match the sales/expense history"""
+    database.DB_PATH = db_path
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT p.quantity,
+               COALESCE((SELECT SUM(quantity) FROM expenses e WHERE e.user_id = p.user_id AND e.product = p.name), 0),
+               COALESCE((SELECT SUM(quantity) FROM sales s WHERE s.user_id = p.user_id AND s.product = p.name), 0)
+        FROM products p WHERE p.user_id = ?
+    ''', (LOAD_TEST_USER_ID,))
+    rows = cursor.fetchall()
+    conn.close()
+    negative = sum(1 for quantity, _, _ in rows if quantity < 0)
+    mismatched = sum(1 for quantity, bought, sold in rows if abs(initial_stock + bought - sold - quantity) > 1e-6)
+    return {'negative_stock': negative, 'ledger_mismatch': mismatched}
+
+def run_load_test(sellers=4, buyers=2, duration=10.0, products=20, initial_stock=50, db_path=None):
+    """Run the load test and return a summary dictionary"""
+    db_path = db_path or os.path.join(tempfile.mkdtemp(prefix='inventory-load-'), 'inventory.db')
+    seed_database(db_path, products, initial_stock)
+
+    roles = ['seller'] * sellers + ['buyer'] * buyers
+    with multiprocessing.Pool(len(roles)) as pool:
+        results = pool.starmap(run_worker, [(role, db_path, products, duration, seed)
+                                            for seed, role in enumerate(roles)])
+
+    latencies = [value for r in results for value in r['latencies']]
+    lock_waits = [value for r in results for value in r['lock_waits']]
+    summary = {
+        'db_path': db_path,
+        'workers': {'sellers': sellers, 'buyers': buyers},
+        'duration_seconds': duration,
+        'operations': len(latencies),
+        'throughput_ops_per_second': len(latencies) / duration if duration else 0.0,
+        'rejected_insufficient_stock': sum(r['rejected'] for r in results),
+        'errors': sum(r['errors'] for r in results),
+        'latency_ms': {f'p{p}': _percentile(latencies, p) * 1000 for p in (50, 95, 99)},
+        'lock_wait_ms': {f'p{p}': _percentile(lock_waits, p) * 1000 for p in (50, 95, 99)},
+    }
+    summary['invariant_violations'] = check_invariants(db_path, initial_stock)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent sellers/buyers load test for inventory.db')
+    parser.add_argument('--sellers', type=int, default=4)
+    parser.add_argument('--buyers', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per worker')
+    parser.add_argument('--products', type=int, default=20)
+    parser.add_argument('--initial-stock', type=int, default=50)
+    parser.add_argument('--db', help='database file to create (default: a temporary file)')
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON')
+    args = parser.parse_args()
+
+    summary = run_load_test(args.sellers, args.buyers, args.duration, args.products, args.initial_stock, args.db)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"Workers: {args.sellers} sellers, {args.buyers} buyers for {args.duration:.0f}s")
+    print(f"Operations: {summary['operations']:,} ({summary['throughput_ops_per_second']:.1f} ops/s)")
+    print(f"Rejected (insufficient stock): {summary['rejected_insufficient_stock']:,}  Errors: {summary['errors']}")
+    print("Latency ms:   " + "  ".join(f"{k}={v:.2f}" for k, v in summary['latency_ms'].items()))
+    print("Lock wait ms: " + "  ".join(f"{k}={v:.2f}" for k, v in summary['lock_wait_ms'].items()))
+    violations = summary['invariant_violations']
+    print(f"Negative stock: {violations['negative_stock']}  Ledger mismatches: {violations['ledger_mismatch']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# Per-interaction latency of the Streamlit app
+# Seeds a throwaway database, drives app.py headlessly with AppTest and times
+# the script run each widget interaction triggers. Widgets inside an
+# st.fragment rerun only their fragment, as they would in the browser.
+#
+# Usage: python measure_latency.py --rows 20000 --repeats 5
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from functools import partial
+from unittest import mock
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+SESSION_USER = {'id': 1, 'username': 'admin', 'role': 'admin', 'full_name': 'Admin'}
+
+def seed(db_path, rows):
+    """Products and sales from benchmark_loaders plus a purchase per product"""
+    import database
+    from benchmark_loaders import BENCHMARK_USER_ID, seed_database
+
+    seed_database(db_path, rows)
+    rnd = random.Random(1)
+    today = datetime.now()
+    conn = database.get_connection()
+    conn.executemany('INSERT INTO expenses (user_id, date, day, product, quantity, cost, supplier) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                     ((BENCHMARK_USER_ID, day.strftime('%d-%m-%Y'), day.strftime('%Y-%m-%d'), f'Product {i}', 10, 80.0,
+                       f'Supplier-{rnd.randint(1, 10)}')
+                      for i in range(1, min(rows, 5000) + 1) for day in [today - timedelta(days=rnd.randint(0, 365))]))
+    conn.commit()
+    conn.close()
+
+def _run(at, fragment_id=None):
+    """One script run; fragment_id reruns only that fragment, like a widget event inside it"""
+    if fragment_id is None:
+        return at.run()
+    # AppTest always reruns the whole script; the browser sends a fragment-scoped rerun instead
+    from streamlit.runtime.scriptrunner_utils.script_requests import RerunData
+    from streamlit.testing.v1 import local_script_runner
+    scoped = partial(RerunData, fragment_id_queue=[fragment_id], is_fragment_scoped_rerun=True)
+    with mock.patch.object(local_script_runner, 'RerunData', scoped):
+        return at.run()
+
+def _page_fragment(at):
+    """The fragment registered by the page just opened; each measurement starts a fresh AppTest"""
+    fragment_ids = list(at._fragment_storage._fragments)
+    return fragment_ids[-1] if fragment_ids else None
+
+# (name, menu, interaction); each interaction changes one widget on that page
+INTERACTIONS = [
+    ('Open View Inventory', '📦 View Inventory', None),
+    ('Sell: type quantity', '💰 Sell Product',
+     lambda at: at.number_input[0].set_value(at.number_input[0].value + 1)),
+    ('Update Stock: enter product id', '🔄 Update Stock',
+     lambda at: at.text_input[0].input('7')),
+    ('Reorder: toggle filter', '🔁 Reorder Recommendations',
+     lambda at: at.checkbox[0].set_value(not at.checkbox[0].value)),
+    ('Open Advanced Analytics', '📈 Advanced Analytics', None),
+    ('Analytics: switch analysis', '📈 Advanced Analytics',
+     lambda at: at.radio(key='analytics_tab').set_value('📈 ABC Analysis' if at.radio(key='analytics_tab').index == 0
+                                                        else '💰 Profit Analysis')),
+]
+
+def measure(db_path, repeats):
+    """Median wall time per interaction, and whether it ran as a fragment"""
+    os.environ['INVENTORY_DB_PATH'] = db_path
+    from streamlit.testing.v1 import AppTest
+
+    results = []
+    for name, menu, interact in INTERACTIONS:
+        at = AppTest.from_file(APP_PATH, default_timeout=600)
+        at.session_state['authenticated'] = True
+        at.session_state['user'] = SESSION_USER
+        at.run()
+        fragment_id = None
+        if interact is None:
+            # Page visits always rerun the whole script
+            def interact(at, menu=menu):
+                at.selectbox(key='main_menu').set_value('📥 Export to CSV').run()
+                at.selectbox(key='main_menu').set_value(menu)
+        else:
+            at.selectbox(key='main_menu').set_value(menu).run()
+            fragment_id = _page_fragment(at)
+        timings = []
+        for _ in range(repeats):
+            interact(at)
+            started = time.perf_counter()
+            _run(at, fragment_id)
+            timings.append(time.perf_counter() - started)
+            if at.exception:
+                raise RuntimeError(f"{name}: {at.exception[0].message}")
+        results.append((name, statistics.median(timings), fragment_id is not None))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the app script run behind each widget interaction')
+    parser.add_argument('--rows', type=int, default=20_000, help='products and sales to seed')
+    parser.add_argument('--repeats', type=int, default=5, help='timed runs per interaction (median is reported)')
+    parser.add_argument('--db', help='existing database to use instead of seeding one')
+    args = parser.parse_args()
+
+    db_path = args.db
+    if not db_path:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='inventory-latency-'), 'inventory.db')
+        seed(db_path, args.rows)
+    print(f"{db_path}, median of {args.repeats} runs")
+    for name, seconds, scoped in measure(db_path, args.repeats):
+        print(f"{name:<34} {seconds * 1000:8.0f} ms  {'fragment' if scoped else 'full rerun'}")
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(APP_PATH))
+    main()
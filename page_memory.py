@@ -0,0 +1,183 @@
+# Opt-in per-page memory profiling for the Streamlit app
+# With INVENTORY_MEMORY_PROFILE=<file> set, tracemalloc runs for the life of
+# the process and every page run of app.py appends one JSON line to <file>:
+# traced memory before and after the page, the peak while it ran, and the
+# allocation sites that grew the most. A run cut short by st.rerun is recorded
+# as interrupted when the next page starts, with figures up to that point.
+# tracemalloc is process-wide, so profile with a single browser session.
+#
+# Usage: INVENTORY_MEMORY_PROFILE=before.jsonl streamlit run app.py
+#        INVENTORY_MEMORY_PROFILE_FRAMES=30 ...   (attribute allocations to app lines)
+#        python page_memory.py show before.jsonl
+#        python page_memory.py diff before.jsonl after.jsonl
+import argparse
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+
+PROFILE_PATH = os.environ.get('INVENTORY_MEMORY_PROFILE')
+# Frames kept per allocation. One frame names the allocating line, usually
+# inside pandas or plotly; around 30 also reach the app line behind it, but
+# slow allocation-heavy pages such as the styled inventory table by ~10x more
+TRACE_FRAMES = int(os.environ.get('INVENTORY_MEMORY_PROFILE_FRAMES', 1))
+TOP_SITES = 10
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_lock = threading.Lock()
+_open_page = None
+_run_id = f"{datetime.now().isoformat(timespec='seconds')}-{os.getpid()}"
+
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+def _short_path(filename):
+    if filename.startswith(APP_DIR):
+        return os.path.relpath(filename, APP_DIR)
+    return filename.split('site-packages/')[-1]
+
+def _site(traceback):
+    """The innermost line of this repo's code behind an allocation, and the library line that made it"""
+    innermost = traceback[-1]
+    app_frames = [frame for frame in traceback if frame.filename.startswith(APP_DIR) and frame.filename != __file__]
+    if not app_frames or app_frames[-1] is innermost:
+        return f"{_short_path(innermost.filename)}:{innermost.lineno}"
+    return (f"{_short_path(app_frames[-1].filename)}:{app_frames[-1].lineno} "
+            f"via {_short_path(innermost.filename)}:{innermost.lineno}")
+
+def _growth_by_site(before, after):
+    """Bytes and blocks allocated between two snapshots and still live, per site, largest first"""
+    sites = defaultdict(lambda: [0, 0])
+    for stat in after.compare_to(before, 'traceback'):
+        totals = sites[_site(stat.traceback)]
+        totals[0] += stat.size_diff
+        totals[1] += stat.count_diff
+    return sorted(sites.items(), key=lambda item: item[1][0], reverse=True)
+
+def start_page(page):
+    """Mark the start of a page run; a no-op unless INVENTORY_MEMORY_PROFILE is set"""
+    global _open_page
+    if not PROFILE_PATH:
+        return
+    with _lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        if _open_page is not None:
+            _record(_open_page, completed=False)
+        tracemalloc.reset_peak()
+        _open_page = {'page': page, 'started': time.perf_counter(),
+                      'current': tracemalloc.get_traced_memory()[0], 'snapshot': _snapshot()}
+
+def end_page():
+    """Record the page run started by start_page"""
+    global _open_page
+    if not PROFILE_PATH:
+        return
+    with _lock:
+        if _open_page is not None:
+            _record(_open_page, completed=True)
+            _open_page = None
+
+def _record(opened, completed):
+    current, peak = tracemalloc.get_traced_memory()
+    growth = _growth_by_site(opened['snapshot'], _snapshot())
+    entry = {
+        'run': _run_id,
+        'at': datetime.now().isoformat(timespec='seconds'),
+        'page': opened['page'],
+        'completed': completed,
+        'seconds': round(time.perf_counter() - opened['started'], 3),
+        'start_mb': opened['current'] / 2**20,
+        'end_mb': current / 2**20,
+        # Peak over the page, above what was already held when it started
+        'peak_mb': (peak - opened['current']) / 2**20,
+        'retained_mb': (current - opened['current']) / 2**20,
+        'top_sites': [{'site': site, 'size_diff_kb': size / 1024, 'count_diff': count}
+                      for site, (size, count) in growth[:TOP_SITES] if size > 0],
+    }
+    with open(PROFILE_PATH, 'a', encoding='utf-8') as profile:
+        profile.write(json.dumps(entry) + '\n')
+
+def summarize(path):
+    """Per page: run count, worst and mean peak, mean retained growth and the sites that grew most overall"""
+    runs = defaultdict(list)
+    with open(path, encoding='utf-8') as profile:
+        for line in profile:
+            if line.strip():
+                entry = json.loads(line)
+                runs[entry['page']].append(entry)
+    summary = {}
+    for page, entries in runs.items():
+        sites = defaultdict(float)
+        for entry in entries:
+            for site in entry['top_sites']:
+                sites[site['site']] += site['size_diff_kb']
+        summary[page] = {
+            'runs': len(entries),
+            'max_peak_mb': max(entry['peak_mb'] for entry in entries),
+            'mean_peak_mb': sum(entry['peak_mb'] for entry in entries) / len(entries),
+            'mean_retained_mb': sum(entry['retained_mb'] for entry in entries) / len(entries),
+            'top_sites': sorted(sites.items(), key=lambda item: item[1], reverse=True)[:TOP_SITES],
+        }
+    return summary
+
+def show(path):
+    for page, stats in sorted(summarize(path).items(), key=lambda item: item[1]['max_peak_mb'], reverse=True):
+        print(f"{page}: {stats['runs']} runs, peak {stats['max_peak_mb']:.1f} MB (mean {stats['mean_peak_mb']:.1f}), "
+              f"retained {stats['mean_retained_mb']:+.1f} MB per run")
+        for site, size_kb in stats['top_sites'][:5]:
+            print(f"    {size_kb / 1024:8.2f} MB  {site}")
+
+def diff(before_path, after_path):
+    """Print per-page peak and retained memory of two profiles, largest peak change first"""
+    before, after = summarize(before_path), summarize(after_path)
+    rows = []
+    for page in before.keys() | after.keys():
+        old, new = before.get(page), after.get(page)
+        change = (new['max_peak_mb'] if new else 0.0) - (old['max_peak_mb'] if old else 0.0)
+        rows.append((change, page, old, new))
+    print(f"{'page':<32} {'peak before':>12} {'peak after':>11} {'change':>9} {'retained before':>16} {'retained after':>15}")
+    for change, page, old, new in sorted(rows, key=lambda row: abs(row[0]), reverse=True):
+        fmt = lambda stats, key: f"{stats[key]:.1f} MB" if stats else '-'
+        print(f"{page:<32} {fmt(old, 'max_peak_mb'):>12} {fmt(new, 'max_peak_mb'):>11} {change:>+7.1f} MB "
+              f"{fmt(old, 'mean_retained_mb'):>16} {fmt(new, 'mean_retained_mb'):>15}")
+
+    # Where the pages that grew are allocating more than before
+    for change, page, old, new in sorted(rows, key=lambda row: row[0], reverse=True):
+        # Ignore changes below 0.1 MB
+        if change < 0.1 or not new:
+            continue
+        old_sites = dict(old['top_sites']) if old else {}
+        grown = sorted(((size - old_sites.get(site, 0.0), site) for site, size in new['top_sites']), reverse=True)
+        print(f"\n{page}: +{change:.1f} MB peak")
+        for growth_kb, site in grown[:5]:
+            if growth_kb > 0:
+                print(f"    {growth_kb / 1024:+8.2f} MB  {site}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarise or compare per-page memory profiles written by app.py')
+    commands = parser.add_subparsers(dest='command', required=True)
+    show_parser = commands.add_parser('show', help='peak, retained memory and top allocation sites per page')
+    show_parser.add_argument('profile')
+    diff_parser = commands.add_parser('diff', help='compare two profiles page by page')
+    diff_parser.add_argument('before')
+    diff_parser.add_argument('after')
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        show(args.profile)
+    else:
+        diff(args.before, args.after)
+
+if __name__ == '__main__':
+    main()
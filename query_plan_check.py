@@ -0,0 +1,218 @@
+# Query-plan regression checks for the data layer
+# Seeds a database of a fixed size, runs a scripted workload through the data
+# layer while database.statement_observer records every statement it issues,
+# and runs EXPLAIN QUERY PLAN on each one. A step fails when a statement scans
+# products, sales, expenses, users, user_sessions or the stock ledger instead of searching the
+# index expected for it, or when the step exceeds its time budget. Schema setup
+# and migrations are also run against a copy of the committed inventory.db.
+# Exits non-zero on any failure. CI runs it on every push and pull request
+# (.github/workflows/query-plans.yml), so a new step added to STEPS is gated
+# from then on.
+#
+# Usage: python query_plan_check.py --rows 100000
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import database
+from benchmark_loaders import BENCHMARK_USER_ID
+from frame_loaders import load_expenses_frame, load_products_frame, load_sales_frame
+from inventory_overview import inventory_aging
+from kpi_engine import compute_kpis, compute_weekly_kpis
+from rolling_stats import rolling_series
+from stock_ledger import average_inventory, stock_at, take_snapshot
+
+DEFAULT_ROWS = 100_000
+SHIPPED_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inventory.db')
+WATCHED_TABLES = ('products', 'sales', 'expenses', 'users', 'user_sessions', 'stock_movements', 'stock_snapshots')
+SKIPPED_STATEMENTS = re.compile(r'^\s*(BEGIN|COMMIT|ROLLBACK|PRAGMA|CREATE|DROP|ALTER|--)', re.IGNORECASE)
+
+def _day(offset):
+    return (datetime.now() - timedelta(days=offset)).strftime('%Y-%m-%d')
+
+def _sale(quantity):
+    return {'date': datetime.now().strftime('%d-%m-%Y'), 'product': 'Product 7', 'quantity': quantity, 'revenue': quantity * 12.5}
+
+def _expense(quantity):
+    return {'date': datetime.now().strftime('%d-%m-%Y'), 'product': 'Product 7', 'quantity': quantity,
+            'cost': quantity * 8.0, 'supplier': 'Supplier-1'}
+
+# (step, work, {table: index its plan must search}, budget in ms at DEFAULT_ROWS).
+# Tables left out of a step's map must not be scanned by it either; None allows a scan.
+STEPS = [
+    ('get_data_version', lambda ctx: database.get_data_version(BENCHMARK_USER_ID), {}, 5),
+    ('get_products', lambda ctx: database.get_products(BENCHMARK_USER_ID), {'products': 'idx_products_user'}, 1500),
+    ('get_active_products', lambda ctx: database.get_active_products(BENCHMARK_USER_ID), {'products': 'idx_products_user'}, 1500),
+    ('get_low_stock_products', lambda ctx: database.get_low_stock_products(BENCHMARK_USER_ID),
+     {'products': 'idx_products_low_stock'}, 200),
+    ('get_sales (90 days)', lambda ctx: database.get_sales(BENCHMARK_USER_ID, _day(89), _day(0)),
+     {'sales': 'idx_sales_user_day'}, 400),
+    ('get_expenses (90 days)', lambda ctx: database.get_expenses(BENCHMARK_USER_ID, _day(89), _day(0)),
+     {'expenses': 'idx_expenses_user_day'}, 100),
+    ('update_price', lambda ctx: database.update_price(7, 12.5, BENCHMARK_USER_ID), {'products': 'PRIMARY KEY'}, 50),
+    ('update_reorder_point', lambda ctx: database.update_reorder_point(7, 5, BENCHMARK_USER_ID), {'products': 'PRIMARY KEY'}, 50),
+    ('update_quantity', lambda ctx: database.update_quantity(7, 100, BENCHMARK_USER_ID), {'products': 'PRIMARY KEY'}, 50),
+    ('record_sale', lambda ctx: ctx.update(bill_id=database.record_sale(7, _sale(1), BENCHMARK_USER_ID)),
+     {'products': 'PRIMARY KEY'}, 50),
+    ('record_purchase', lambda ctx: database.record_purchase(7, _expense(5), BENCHMARK_USER_ID), {'products': 'PRIMARY KEY'}, 50),
+    ('add_sale', lambda ctx: database.add_sale(_sale(2), BENCHMARK_USER_ID), {}, 50),
+    ('add_expense', lambda ctx: database.add_expense(_expense(2), BENCHMARK_USER_ID), {}, 50),
+    ('get_receipt', lambda ctx: database.get_receipt(BENCHMARK_USER_ID, ctx['bill_id']), {}, 20),
+    ('get_receipt (legacy bill)', lambda ctx: database.get_receipt(BENCHMARK_USER_ID, 'BILL-42'),
+     {'sales': 'idx_sales_user_bill'}, 20),
+    ('get_recent_receipts', lambda ctx: database.get_recent_receipts(BENCHMARK_USER_ID), {}, 20),
+    ('get_sale_anomalies', lambda ctx: database.get_sale_anomalies(BENCHMARK_USER_ID), {}, 20),
+    ('save_product', lambda ctx: database.save_product({
+        'ID': 10**9, 'Name': 'Plan Check', 'Category': 'Food', 'Price': 1.0, 'Quantity': 1,
+        'Measurement Category': 'Units', 'Expiry Date': '01-01-2099'}, BENCHMARK_USER_ID), {}, 50),
+    ('delete_product_db', lambda ctx: database.delete_product_db(10**9, BENCHMARK_USER_ID), {'products': 'PRIMARY KEY'}, 50),
+    ('authenticate_user', lambda ctx: database.authenticate_user('admin', 'admin123'),
+     {'users': 'sqlite_autoindex_users_1'}, 1000),
+    ('get_users', lambda ctx: database.get_users(), {'users': None}, 50),
+    ('log_user_action', lambda ctx: database.log_user_action(BENCHMARK_USER_ID, 'plan_check'), {}, 50),
+    ('update_last_login', lambda ctx: database.update_last_login(BENCHMARK_USER_ID), {'users': 'PRIMARY KEY'}, 50),
+    ('get_user_activity', lambda ctx: database.get_user_activity(),
+     {'user_sessions': 'idx_user_sessions_timestamp', 'users': 'PRIMARY KEY'}, 50),
+    # Typed loaders and aggregates behind the dashboard pages
+    ('load_products_frame', lambda ctx: load_products_frame(BENCHMARK_USER_ID), {'products': 'idx_products_user'}, 1500),
+    ('load_sales_frame (90 days)', lambda ctx: load_sales_frame(BENCHMARK_USER_ID, _day(89), _day(0)),
+     {'sales': 'idx_sales_user_day'}, 200),
+    ('load_expenses_frame (90 days)', lambda ctx: load_expenses_frame(BENCHMARK_USER_ID, _day(89), _day(0)),
+     {'expenses': 'idx_expenses_user_day'}, 100),
+    ('compute_kpis (90 days)', lambda ctx: compute_kpis(BENCHMARK_USER_ID, _day(89), _day(0)),
+     {'products': 'idx_products_user', 'sales': 'idx_sales_user_day', 'expenses': 'idx_expenses_user_day'}, 1000),
+    ('compute_weekly_kpis (90 days)', lambda ctx: compute_weekly_kpis(BENCHMARK_USER_ID, _day(89), _day(0)),
+     {'sales': 'idx_sales_user_day', 'expenses': 'idx_expenses_user_day'}, 300),
+    ('inventory_aging', lambda ctx: inventory_aging(BENCHMARK_USER_ID), {'products': 'idx_products_user'}, 1000),
+    ('rolling_series (90 days)', lambda ctx: rolling_series(BENCHMARK_USER_ID, _day(89), _day(0)), {}, 100),
+    # Stock ledger: a snapshot plus the movements after it
+    ('stock_at (30 days ago)', lambda ctx: stock_at(BENCHMARK_USER_ID, _day(30)),
+     {'stock_movements': 'idx_stock_movements_user_day', 'stock_snapshots': 'PRIMARY KEY'}, 500),
+    ('average_inventory (90 days)', lambda ctx: average_inventory(BENCHMARK_USER_ID, _day(89), _day(0)),
+     {'stock_movements': 'idx_stock_movements_user_day', 'stock_snapshots': 'PRIMARY KEY', 'products': 'idx_products_user'}, 1500),
+    ('take_snapshot', lambda ctx: take_snapshot(), {'stock_movements': 'PRIMARY KEY', 'stock_snapshots': 'PRIMARY KEY'}, 2000),
+]
+
+def seed(db_path, rows):
+    """Products, sales and expenses for the benchmark store, a long user activity log and an opening stock snapshot"""
+    from measure_latency import seed as seed_store
+
+    seed_store(db_path, rows)
+    conn = database.get_connection()
+    conn.executemany('INSERT INTO user_sessions (user_id, action, timestamp, details) VALUES (?, ?, ?, ?)',
+                     ((BENCHMARK_USER_ID, 'login', f'{_day(i % 365)} 09:00:00', '') for i in range(rows)))
+    # The seed writes products directly, so open the ledger with their stock, dated before the snapshot
+    # that stock_at reads (a snapshot may not predate the movements it covers)
+    conn.execute("""INSERT INTO stock_movements (user_id, product_id, kind, quantity, day, moved_at, reference)
+                    SELECT user_id, id, 'adjustment', quantity, ?, ?, 'opening stock' FROM products
+                    WHERE user_id IS NOT NULL AND COALESCE(quantity, 0) != 0""", (_day(90), f'{_day(90)}T00:00:00'))
+    conn.commit()
+    conn.close()
+    take_snapshot(_day(60))
+
+def check_shipped_database():
+    """Problems running init_user_database twice on a copy of the committed inventory.db"""
+    if not os.path.exists(SHIPPED_DB_PATH):
+        return []
+    db_path = os.path.join(tempfile.mkdtemp(prefix='inventory-migrate-'), 'inventory.db')
+    shutil.copy(SHIPPED_DB_PATH, db_path)
+    previous_path, database.DB_PATH = database.DB_PATH, db_path
+    try:
+        # The second run covers migrations that must be idempotent
+        database.init_user_database()
+        database.init_user_database()
+        return []
+    except Exception as e:
+        return [f'{type(e).__name__}: {e}']
+    finally:
+        database.DB_PATH = previous_path
+
+def _plan(cursor, statement):
+    cursor.execute('EXPLAIN QUERY PLAN ' + statement)
+    return [row[3] for row in cursor.fetchall()]
+
+def _watched_names(statement):
+    """Names a statement's plan uses for the watched tables, aliases included"""
+    names = {table: table for table in WATCHED_TABLES}
+    for table, alias in re.findall(rf"\b({'|'.join(WATCHED_TABLES)})\s+(?:AS\s+)?(\w+)", statement, re.IGNORECASE):
+        if alias.upper() not in ('WHERE', 'SET', 'JOIN', 'ON', 'USING', 'ORDER', 'GROUP', 'LIMIT', 'VALUES',
+                                 'LEFT', 'INNER', 'CROSS', 'NATURAL', 'UNION', 'WINDOW', 'INDEXED', 'NOT'):
+            names[alias] = table.lower()
+    return names
+
+def check_step(plans, expected):
+    """Problems in one step's plans: a watched table scanned, or not read through its expected index.
+    An ordered scan of the expected index is allowed, for newest-first queries with a LIMIT, and so is
+    a bare SEARCH, SQLite's single-row MIN/MAX lookup."""
+    problems = []
+    for statement, plan in plans:
+        names = _watched_names(statement)
+        for line in plan:
+            match = re.match(r'(SCAN|SEARCH) (\w+)', line)
+            if not match or match.group(2) not in names:
+                continue
+            index = expected.get(names[match.group(2)], '')
+            if index is None or (index and index in line) or line == f'SEARCH {match.group(2)}':
+                continue
+            if match.group(1) == 'SCAN' or index:
+                problems.append(f"{line}{f' (expected {index})' if index else ''}  <-  {' '.join(statement.split())[:120]}")
+    return problems
+
+def run_checks(rows=DEFAULT_ROWS, db_path=None, verbose=False):
+    """Seed, run every step once while recording its statements, and return (step, seconds, budget, problems)"""
+    db_path = db_path or os.path.join(tempfile.mkdtemp(prefix='inventory-plans-'), 'inventory.db')
+    seed(db_path, rows)
+    scale = rows / DEFAULT_ROWS
+
+    statements = []
+    database.statement_observer = statements.append
+    results, context = [], {}
+    conn = database.get_connection()
+    try:
+        for name, work, expected, budget_ms in STEPS:
+            statements.clear()
+            started = time.perf_counter()
+            work(context)
+            elapsed = time.perf_counter() - started
+            recorded = [statement for statement in statements if not SKIPPED_STATEMENTS.match(statement)]
+            plans = [(statement, _plan(conn.cursor(), statement)) for statement in dict.fromkeys(recorded)]
+            if verbose:
+                for statement, plan in plans:
+                    print(f"[{name}] {' '.join(statement.split())[:160]}")
+                    for line in plan:
+                        print(f"    {line}")
+            results.append((name, elapsed, budget_ms * max(scale, 1.0), check_step(plans, expected)))
+    finally:
+        database.statement_observer = None
+        conn.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Check data-layer query plans for index use and time budgets')
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS, help='products and sales to seed (budgets are set for the default)')
+    parser.add_argument('--db', help='database file to create (default: a temporary file)')
+    parser.add_argument('--verbose', action='store_true', help='print every statement with its plan')
+    args = parser.parse_args()
+
+    migration_problems = check_shipped_database()
+    failures = bool(migration_problems)
+    print(f"{'FAIL' if migration_problems else 'ok  '} init on committed inventory.db")
+    for problem in migration_problems:
+        print(f"       {problem}")
+    for name, seconds, budget_ms, problems in run_checks(args.rows, args.db, args.verbose):
+        over_budget = seconds * 1000 > budget_ms
+        failed = over_budget or problems
+        failures += bool(failed)
+        print(f"{'FAIL' if failed else 'ok  '} {name:<28} {seconds * 1000:8.1f} ms (budget {budget_ms:.0f} ms)")
+        for problem in problems:
+            print(f"       {problem}")
+    print(f"{failures} of {len(STEPS) + 1} steps failed")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+# Reorder-point and EOQ recommendation engine
+# Builds a product x day demand matrix from sales and per-product purchase
+# costs from expenses, then computes average daily demand, demand variability,
+# safety stock, reorder point and economic order quantity for every product at
+# once with NumPy. Results are stored in reorder_recommendations.
+#
+# Usage: python reorder_engine.py --user-id 1
+#        python reorder_engine.py --benchmark 100000
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+import database
+from database import get_connection, write_transaction
+
+LOOKBACK_DAYS = 90
+LEAD_TIME_DAYS = 7
+SERVICE_LEVEL = 0.95
+ORDER_COST = 100.0           # INR per purchase order
+ANNUAL_HOLDING_RATE = 0.25   # share of unit cost per year
+
+RECOMMENDATION_COLUMNS = [
+    'product_id', 'name', 'category', 'quantity', 'avg_daily_demand', 'demand_std',
+    'safety_stock', 'reorder_point', 'eoq', 'suggested_order', 'unit_cost',
+]
+
+def _name_codes(names):
+    """Position of each row's name among the distinct names, and the distinct names. Sales and
+    expenses only record the product name, so products sharing a name share its history."""
+    codes, distinct = pd.factorize(np.asarray(names, dtype=object))
+    return codes, pd.Index(distinct)
+
+def demand_matrix(user_id, names, start_day, days):
+    """Units sold per product (rows, in `names` order) per day (columns) since start_day"""
+    conn = get_connection()
+    daily = pd.read_sql_query('''
+        SELECT product, day, SUM(quantity) AS quantity
+        FROM sales WHERE user_id = ? AND day >= ?
+        GROUP BY product, day
+    ''', conn, params=(user_id, start_day.strftime('%Y-%m-%d')))
+    conn.close()
+
+    codes, distinct = _name_codes(names)
+    by_name = np.zeros((len(distinct), days), dtype=np.float64)
+    rows = distinct.get_indexer(daily['product'])
+    cols = (pd.to_datetime(daily['day'], errors='coerce') - pd.Timestamp(start_day)).dt.days.to_numpy()
+    known = (rows >= 0) & (cols >= 0) & (cols < days)
+    by_name[rows[known], cols[known].astype(np.int64)] = daily['quantity'].to_numpy()[known]
+    return by_name[codes]
+
+def purchase_unit_costs(user_id, names, fallback):
+    """Average purchase cost per unit from expenses, or `fallback` where there is none"""
+    conn = get_connection()
+    purchases = pd.read_sql_query('''
+        SELECT product, SUM(cost) AS cost, SUM(quantity) AS quantity
+        FROM expenses WHERE user_id = ? GROUP BY product
+    ''', conn, params=(user_id,))
+    conn.close()
+
+    codes, distinct = _name_codes(names)
+    by_name = np.full(len(distinct), np.nan)
+    rows = distinct.get_indexer(purchases['product'])
+    valid = (rows >= 0) & (purchases['quantity'].to_numpy() > 0)
+    by_name[rows[valid]] = purchases['cost'].to_numpy()[valid] / purchases['quantity'].to_numpy()[valid]
+    unit_cost = by_name[codes]
+    return np.where(np.isnan(unit_cost), np.asarray(fallback, dtype=np.float64), unit_cost)
+
+def compute_reorder_metrics(demand, unit_cost, quantity, lead_time_days=LEAD_TIME_DAYS,
+                            service_level=SERVICE_LEVEL, order_cost=ORDER_COST,
+                            holding_rate=ANNUAL_HOLDING_RATE):
+    """Vectorised demand statistics, safety stock, reorder point and EOQ for every row of `demand`"""
+    avg_daily_demand = demand.mean(axis=1)
+    demand_std = demand.std(axis=1, ddof=1) if demand.shape[1] > 1 else np.zeros(len(demand))
+    z = NormalDist().inv_cdf(service_level)
+    safety_stock = z * demand_std * np.sqrt(lead_time_days)
+    reorder_point = avg_daily_demand * lead_time_days + safety_stock
+
+    annual_demand = avg_daily_demand * 365
+    holding_cost = unit_cost * holding_rate
+    with np.errstate(divide='ignore', invalid='ignore'):
+        eoq = np.where(holding_cost > 0, np.sqrt(2 * annual_demand * order_cost / holding_cost), 0.0)
+    suggested_order = np.where(quantity <= reorder_point, np.maximum(eoq, reorder_point - quantity), 0.0)
+    suggested_order = np.where(avg_daily_demand > 0, suggested_order, 0.0)
+    return {
+        'avg_daily_demand': avg_daily_demand,
+        'demand_std': demand_std,
+        'safety_stock': safety_stock,
+        'reorder_point': reorder_point,
+        'eoq': eoq,
+        'suggested_order': suggested_order,
+    }
+
+def recompute_recommendations(user_id, lookback_days=LOOKBACK_DAYS, lead_time_days=LEAD_TIME_DAYS,
+                              service_level=SERVICE_LEVEL):
+    """Recompute and store recommendations for all of a user's products; returns the DataFrame"""
+    conn = get_connection()
+    products = pd.read_sql_query('''
+        SELECT id AS product_id, name, category, quantity, purchase_price
+        FROM products WHERE user_id = ? ORDER BY id
+    ''', conn, params=(user_id,))
+    conn.close()
+
+    today = datetime.now().date()
+    start_day = today - timedelta(days=lookback_days - 1)
+    names = products['name'].to_numpy()
+    demand = demand_matrix(user_id, names, start_day, lookback_days)
+    unit_cost = purchase_unit_costs(user_id, names, products['purchase_price'].fillna(0).to_numpy())
+    metrics = compute_reorder_metrics(demand, unit_cost, products['quantity'].fillna(0).to_numpy(),
+                                      lead_time_days, service_level)
+
+    recommendations = products.drop(columns='purchase_price').assign(unit_cost=unit_cost, **metrics)
+    recommendations = recommendations[RECOMMENDATION_COLUMNS].round(3)
+    computed_at = datetime.now().isoformat(timespec='seconds')
+
+    def work(cursor):
+        cursor.execute('DELETE FROM reorder_recommendations WHERE user_id = ?', (user_id,))
+        cursor.executemany(f'''
+            INSERT INTO reorder_recommendations (user_id, {', '.join(RECOMMENDATION_COLUMNS)}, computed_at)
+            VALUES (?, {', '.join('?' * len(RECOMMENDATION_COLUMNS))}, ?)
+        ''', ((user_id, *row, computed_at) for row in recommendations.itertuples(index=False, name=None)))
+    write_transaction(work)
+    return recommendations
+
+def get_recommendations(user_id):
+    """Stored recommendations for a user, products needing an order first"""
+    conn = get_connection()
+    recommendations = pd.read_sql_query(f'''
+        SELECT {', '.join(RECOMMENDATION_COLUMNS)}, computed_at
+        FROM reorder_recommendations WHERE user_id = ?
+        ORDER BY suggested_order > 0 DESC, avg_daily_demand DESC
+    ''', conn, params=(user_id,))
+    conn.close()
+    return recommendations
+
+def apply_reorder_points(user_id):
+    """Copy the recommended reorder points into products.reorder_point; returns rows updated"""
+    def work(cursor):
+        cursor.execute('''
+            UPDATE products SET reorder_point = (
+                SELECT r.reorder_point FROM reorder_recommendations r
+                WHERE r.user_id = products.user_id AND r.product_id = products.id)
+            WHERE user_id = ? AND id IN (SELECT product_id FROM reorder_recommendations WHERE user_id = ?)
+        ''', (user_id, user_id))
+        return cursor.rowcount
+    return write_transaction(work)
+
+def run_benchmark(skus):
+    """Time a full recompute for `skus` products with 90 days of sales each"""
+    from benchmark_loaders import BENCHMARK_USER_ID, seed_database
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='inventory-reorder-'), 'inventory.db')
+    seed_database(db_path, skus)
+    # seed_database spreads sales over 5,000 products; give every SKU its own history
+    rng = np.random.default_rng(0)
+    today = datetime.now().date()
+    conn = get_connection()
+    conn.executemany('INSERT INTO sales (user_id, date, day, product, quantity, revenue, bill_id) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                     ((BENCHMARK_USER_ID, day.strftime('%d-%m-%Y'), day.strftime('%Y-%m-%d'), f'Product {product_id}', qty, qty * 10.0, '')
+                      for product_id, offset, qty in zip(rng.integers(1, skus + 1, skus * 5).tolist(),
+                                                         rng.integers(0, LOOKBACK_DAYS, skus * 5).tolist(),
+                                                         rng.integers(1, 10, skus * 5).tolist())
+                      for day in [today - timedelta(days=offset)]))
+    conn.commit()
+    conn.close()
+
+    started = time.perf_counter()
+    recommendations = recompute_recommendations(BENCHMARK_USER_ID)
+    return len(recommendations), time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description='Compute reorder points and EOQ for every product')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--user-id', type=int, help='recompute recommendations for one user')
+    target.add_argument('--benchmark', type=int, metavar='SKUS', help='time a recompute on a synthetic catalogue')
+    parser.add_argument('--apply', action='store_true', help='also copy reorder points into products')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        rows, seconds = run_benchmark(args.benchmark)
+        print(f"Recomputed {rows:,} SKUs in {seconds:.2f}s")
+        return
+
+    database.init_user_database()
+    started = time.perf_counter()
+    recommendations = recompute_recommendations(args.user_id)
+    print(f"Recomputed {len(recommendations):,} SKUs in {time.perf_counter() - started:.2f}s, "
+          f"{int((recommendations['suggested_order'] > 0).sum()):,} need an order")
+    if args.apply:
+        print(f"Applied reorder points to {apply_reorder_points(args.user_id):,} products")
+
+if __name__ == '__main__':
+    main()
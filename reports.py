@@ -0,0 +1,168 @@
+# Offline report generator for the Smart Inventory Dashboard
+# Builds the P&L, turnover, ABC, forecast and KPI reports without Streamlit,
+# one user at a time or for every store in parallel with a process pool, and
+# writes JSON/HTML files the dashboard can offer as prebuilt output.
+#
+# Usage: python reports.py --all-users --format json html --workers 8
+#        python reports.py --user-id 3
+import argparse
+import html
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import database
+from analytics_replica import refresh_replica, replica_connection
+from database import get_connection, get_data_version
+from analytics_engine import abc_classification, category_turnover, kpi_summary, profit_by_product, profit_over_time
+from forecasting import forecast_sales, load_daily_revenue
+
+MIN_SALES_DAYS_FOR_FORECAST = 14
+
+def reports_dir():
+    """Report directory, next to the database unless INVENTORY_REPORTS_DIR is set"""
+    return os.environ.get('INVENTORY_REPORTS_DIR') or os.path.join(os.path.dirname(database.DB_PATH), 'reports')
+
+def report_path(user_id, fmt):
+    return os.path.join(reports_dir(), f'user_{user_id}.{fmt}')
+
+def _records(df):
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+def build_report(user_id):
+    """Compute every analytics section for one user as a JSON-serialisable dict"""
+    report = {
+        'user_id': user_id,
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'data_version': get_data_version(user_id),
+        'kpis': kpi_summary(user_id),
+        'profit_over_time': _records(profit_over_time(user_id)),
+        'profit_by_product': _records(profit_by_product(user_id)),
+        'category_turnover': _records(category_turnover(user_id)),
+        'abc_analysis': _records(abc_classification(user_id)),
+        'forecast': None,
+    }
+
+    conn = replica_connection()
+    daily_revenue = load_daily_revenue(conn, user_id)
+    conn.close()
+    if len(daily_revenue) > MIN_SALES_DAYS_FOR_FORECAST:
+        # Reports already run one process per user, so backtest folds serially
+        forecast = forecast_sales(daily_revenue, horizon=14, n_jobs=1)
+        report['forecast'] = {
+            'model_name': forecast['model_name'],
+            'metrics': forecast['metrics'],
+            'backtest_per_horizon': _records(forecast['backtest']['per_horizon']) if forecast['backtest'] else None,
+            'predictions': _records(forecast['forecast']),
+        }
+    return report
+
+def _html_table(rows):
+    if not rows:
+        return '<p>No data.</p>'
+    columns = list(rows[0])
+    head = ''.join(f'<th>{html.escape(str(c))}</th>' for c in columns)
+    body = ''.join(
+        '<tr>' + ''.join(f'<td>{html.escape(_format_cell(row[c]))}</td>' for c in columns) + '</tr>'
+        for row in rows
+    )
+    return f'<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>'
+
+def _format_cell(value):
+    if isinstance(value, float):
+        return f'{value:,.2f}'
+    return '' if value is None else str(value)
+
+def render_html(report):
+    """Render a report dict as a standalone HTML page"""
+    sections = [
+        ('📋 KPIs', _html_table([{'KPI': k.replace('_', ' ').title(), 'Value': v} for k, v in report['kpis'].items()])),
+        ('💰 Profit by Product', _html_table(report['profit_by_product'])),
+        ('📊 Turnover by Category', _html_table(report['category_turnover'])),
+        ('📈 ABC Analysis', _html_table(report['abc_analysis'])),
+        ('💹 Daily Profit', _html_table(report['profit_over_time'])),
+    ]
+    if report['forecast']:
+        sections.append((f"🔮 14-Day Forecast ({report['forecast']['model_name']})",
+                         _html_table(report['forecast']['predictions'])))
+    body = ''.join(f'<h2>{html.escape(title)}</h2>{table}' for title, table in sections)
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Inventory report - user {report['user_id']}</title>
+<style>
+body {{ font-family: sans-serif; margin: 2rem; }}
+table {{ border-collapse: collapse; margin-bottom: 1.5rem; }}
+th, td {{ border: 1px solid #ddd; padding: 4px 8px; text-align: right; }}
+th {{ background: #2a5298; color: white; }}
+</style></head>
+<body><h1>🏪 Smart Inventory Report</h1>
+<p>User {report['user_id']} &middot; generated {report['generated_at']} &middot; data version {report['data_version']}</p>
+{body}</body></html>
+"""
+
+def write_report(user_id, formats=('json', 'html')):
+    """Build and write one user's report; returns (user_id, paths, seconds)"""
+    started = time.perf_counter()
+    report = build_report(user_id)
+    os.makedirs(reports_dir(), exist_ok=True)
+    paths = []
+    for fmt in formats:
+        path = report_path(user_id, fmt)
+        content = json.dumps(report, indent=2) if fmt == 'json' else render_html(report)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(path + '.tmp', path)
+        paths.append(path)
+    return user_id, paths, time.perf_counter() - started
+
+def _init_worker(db_path, output_dir):
+    database.DB_PATH = db_path
+    os.environ['INVENTORY_REPORTS_DIR'] = output_dir
+
+def active_user_ids():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT id FROM users WHERE is_active = 1 ORDER BY id')
+    user_ids = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return user_ids
+
+def generate_reports(user_ids, formats=('json', 'html'), workers=None):
+    """Write reports for many users in parallel; yields (user_id, paths, seconds)"""
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(database.DB_PATH, reports_dir())) as pool:
+        futures = [pool.submit(write_report, user_id, tuple(formats)) for user_id in user_ids]
+        for future in as_completed(futures):
+            yield future.result()
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate inventory analytics reports without Streamlit')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--user-id', type=int, help='report for a single user')
+    target.add_argument('--all-users', action='store_true', help='report for every active user')
+    parser.add_argument('--format', nargs='+', choices=['json', 'html'], default=['json', 'html'])
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--output-dir', help='where to write reports (default: reports/ next to the database)')
+    args = parser.parse_args()
+
+    if args.output_dir:
+        os.environ['INVENTORY_REPORTS_DIR'] = args.output_dir
+
+    # Migrate the schema before copying it, as the app does on start
+    database.init_user_database()
+    started = time.perf_counter()
+    # Reports read the analytics replica; bring it up to date once for every worker
+    refresh_replica()
+    if args.user_id:
+        results = [write_report(args.user_id, tuple(args.format))]
+        print(f"user {args.user_id}: {', '.join(results[0][1])}")
+    else:
+        results = []
+        for result in generate_reports(active_user_ids(), args.format, args.workers):
+            results.append(result)
+            print(f"user {result[0]}: {result[2]:.2f}s -> {', '.join(result[1])}")
+    print(f"Generated {len(results)} report(s) in {time.perf_counter() - started:.2f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+# Rolling sales statistics from the sales_daily running sums
+# sales_daily holds each day's sales per user and product together with the
+# running sums up to that day, maintained by a trigger on sales. A window's
+# revenue total and sum of squared daily revenue are the difference of the
+# running sums at its two ends, so moving averages, volatility and
+# week-over-week change cost two index lookups whatever the window length, and
+# a whole series is one vectorised pass over the days in range.
+#
+# Usage: python rolling_stats.py --rebuild   (recompute sales_daily from sales)
+import argparse
+import math
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import database
+from database import ALL_PRODUCTS, get_connection, get_data_version, rebuild_sales_daily, write_transaction
+
+WINDOWS = (7, 30, 90)
+
+RUNNING_SUMS = ['cum_revenue', 'cum_revenue_sq', 'cum_quantity', 'cum_transactions']
+
+def _iso(day):
+    return day.strftime('%Y-%m-%d') if isinstance(day, (date, datetime)) else day
+
+def _running_sums_at(cursor, user_id, product, day):
+    """Running sums at the last recorded day on or before `day`, zeros before the first sale"""
+    cursor.execute(f'''
+        SELECT {', '.join(RUNNING_SUMS)} FROM sales_daily
+        WHERE user_id = ? AND product = ? AND day <= ? ORDER BY day DESC LIMIT 1
+    ''', (user_id, product, day))
+    return cursor.fetchone() or (0.0, 0.0, 0.0, 0)
+
+def _window_from_sums(end, start, window):
+    revenue, revenue_sq = end[0] - start[0], end[1] - start[1]
+    mean = revenue / window
+    # Sample variance over every calendar day in the window, days without sales counting as zero
+    variance = max(revenue_sq - revenue * mean, 0.0) / (window - 1) if window > 1 else 0.0
+    return {
+        'revenue': revenue,
+        'mean': mean,
+        'std': math.sqrt(variance),
+        'quantity': end[2] - start[2],
+        'transactions': end[3] - start[3],
+    }
+
+def window_stats(user_id, day, window, product=ALL_PRODUCTS):
+    """Revenue total, daily mean and standard deviation, quantity and transactions over the `window` days ending on `day`"""
+    end_day = datetime.strptime(_iso(day), '%Y-%m-%d').date()
+    conn = get_connection()
+    cursor = conn.cursor()
+    end = _running_sums_at(cursor, user_id, product, end_day.isoformat())
+    start = _running_sums_at(cursor, user_id, product, (end_day - timedelta(days=window)).isoformat())
+    conn.close()
+    return _window_from_sums(end, start, window)
+
+def week_over_week(user_id, day, product=ALL_PRODUCTS):
+    """Revenue of the 7 days ending on `day` against the 7 days before, with the change in percent"""
+    end_day = datetime.strptime(_iso(day), '%Y-%m-%d').date()
+    conn = get_connection()
+    cursor = conn.cursor()
+    end, middle, start = (_running_sums_at(cursor, user_id, product, (end_day - timedelta(days=offset)).isoformat())
+                          for offset in (0, 7, 14))
+    conn.close()
+    current, previous = end[0] - middle[0], middle[0] - start[0]
+    return {
+        'current': current,
+        'previous': previous,
+        'change_pct': (current - previous) / previous * 100 if previous else None,
+    }
+
+def rolling_series(user_id, since=None, until=None, windows=WINDOWS, product=ALL_PRODUCTS):
+    """Daily revenue with moving averages and standard deviations for each window, one row per calendar day"""
+    return _cached_rolling_series(database.DB_PATH, user_id, get_data_version(user_id),
+                                  _iso(since), _iso(until), tuple(windows), product).copy()
+
+@lru_cache(maxsize=64)
+def _cached_rolling_series(db_path, user_id, version, since, until, windows, product):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT MIN(day), MAX(day) FROM sales_daily WHERE user_id = ? AND product = ?', (user_id, product))
+    first_day, last_day = cursor.fetchone()
+    columns = ['date', 'revenue'] + [f'{kind}_{window}' for window in windows for kind in ('ma', 'std')]
+    if first_day is None:
+        conn.close()
+        return pd.DataFrame(columns=columns)
+
+    start = datetime.strptime(max(since or first_day, first_day), '%Y-%m-%d').date()
+    end = datetime.strptime(until or last_day, '%Y-%m-%d').date()
+    lookback = start - timedelta(days=max(windows))
+    # Only the days in range plus the longest window before it are read
+    baseline = _running_sums_at(cursor, user_id, product, (lookback - timedelta(days=1)).isoformat())
+    recorded = pd.read_sql_query(f'''
+        SELECT day, revenue, {', '.join(RUNNING_SUMS[:2])} FROM sales_daily
+        WHERE user_id = ? AND product = ? AND day BETWEEN ? AND ?
+    ''', conn, params=(user_id, product, lookback.isoformat(), end.isoformat()))
+    conn.close()
+
+    days = pd.date_range(lookback, end, freq='D')
+    recorded = recorded.set_index(pd.to_datetime(recorded['day'])).reindex(days)
+    revenue = recorded['revenue'].fillna(0.0).to_numpy()
+    cum_revenue = recorded['cum_revenue'].ffill().fillna(baseline[0]).to_numpy()
+    cum_revenue_sq = recorded['cum_revenue_sq'].ffill().fillna(baseline[1]).to_numpy()
+
+    series = {'date': days, 'revenue': revenue}
+    for window in windows:
+        # Running sums `window` days back; the first rows fall back to the baseline before lookback
+        total = cum_revenue - np.concatenate([np.full(window, baseline[0]), cum_revenue[:-window]])
+        total_sq = cum_revenue_sq - np.concatenate([np.full(window, baseline[1]), cum_revenue_sq[:-window]])
+        series[f'ma_{window}'] = total / window
+        series[f'std_{window}'] = np.sqrt(np.maximum(total_sq - total * total / window, 0.0) / max(window - 1, 1))
+    frame = pd.DataFrame(series, columns=columns)
+    return frame[frame['date'] >= pd.Timestamp(start)].reset_index(drop=True)
+
+def rebuild(user_id=None):
+    """Recompute sales_daily from the sales table, for one user or everyone"""
+    write_transaction(lambda cursor: rebuild_sales_daily(cursor, user_id))
+
+def main():
+    parser = argparse.ArgumentParser(description='Rolling sales statistics from the sales_daily running sums')
+    parser.add_argument('--rebuild', action='store_true', help='recompute sales_daily from the sales table first')
+    parser.add_argument('--user', type=int, help='limit to one user id')
+    args = parser.parse_args()
+
+    database.init_user_database()
+    if args.rebuild:
+        rebuild(args.user)
+    conn = get_connection()
+    user_ids = [args.user] if args.user else [row[0] for row in conn.execute(
+        'SELECT DISTINCT user_id FROM sales_daily WHERE product = ?', (ALL_PRODUCTS,))]
+    conn.close()
+    today = date.today()
+    for user_id in user_ids:
+        stats = ', '.join(f"{window}d avg ₹{window_stats(user_id, today, window)['mean']:,.2f}" for window in WINDOWS)
+        change = week_over_week(user_id, today)['change_pct']
+        print(f"user {user_id}: {stats}, week over week {'n/a' if change is None else f'{change:+.1f}%'}")
+
+if __name__ == '__main__':
+    main()
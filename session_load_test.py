@@ -0,0 +1,173 @@
+# Concurrent-session load test for the Streamlit app
+# Runs N simulated browser sessions of app.py inside one process, one thread
+# each as the Streamlit server does, using streamlit.testing AppTest. Every
+# session logs in through the login form (authenticate_user) and then loops
+# over a scripted mix: cashiers sell, purchase and view inventory, managers
+# view inventory and open analytics. For each N it reports rerun latency
+# percentiles, reruns per second and resident memory per session.
+#
+# Usage: python session_load_test.py --sessions 1 2 4 8 --rounds 3
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+from load_test import _percentile
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+# seed_database leaves the default admin account owning the seeded store
+LOGIN = ('admin', 'admin123')
+
+def _rss_mb():
+    """Current resident set size, or the peak where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _select(at, label):
+    return next(widget for widget in at.selectbox if widget.label == label)
+
+def _open(at, menu):
+    at.selectbox(key='main_menu').set_value(menu)
+
+def login(at, rnd):
+    next(widget for widget in at.text_input if widget.label == 'Username').input(LOGIN[0])
+    next(widget for widget in at.text_input if widget.label == 'Password').input(LOGIN[1])
+    yield next(button for button in at.button if button.label == 'Login').click()
+
+def sell(at, rnd):
+    _open(at, '💰 Sell Product')
+    yield at
+    product = _select(at, 'Select Product')
+    product.set_value(rnd.choice(product.options))
+    yield next(widget for widget in at.number_input if widget.label == 'Quantity to Sell').set_value(1.0)
+    yield next(button for button in at.button if button.label == 'Confirm Sale').click()
+
+def purchase(at, rnd):
+    _open(at, '🛒 Purchase Stock')
+    yield at
+    product = _select(at, 'Select Product to Restock')
+    product.set_value(rnd.choice(product.options))
+    next(widget for widget in at.number_input if widget.label == 'Quantity Purchased').set_value(float(rnd.randint(5, 50)))
+    yield next(widget for widget in at.number_input if widget.label == 'Total Cost (INR)').set_value(100.0)
+    yield next(button for button in at.button if button.label == 'Confirm Purchase').click()
+
+def view_inventory(at, rnd):
+    _open(at, '📦 View Inventory')
+    yield at
+
+def open_analytics(at, rnd):
+    _open(at, '📈 Advanced Analytics')
+    yield at
+    tabs = at.radio(key='analytics_tab')
+    yield tabs.set_value(rnd.choice(tabs.options))
+
+MIXES = {
+    'cashier': [sell, purchase, sell, view_inventory],
+    'manager': [view_inventory, open_analytics],
+}
+
+def run_session(role, rounds, seed, records, errors):
+    """Log in, then run the role's mix `rounds` times, appending (step, seconds) per rerun"""
+    from streamlit.testing.v1 import AppTest
+
+    rnd = random.Random(seed)
+    at = AppTest.from_file(APP_PATH, default_timeout=600)
+    at.run()
+    steps = [login] + MIXES[role] * rounds
+    for step in steps:
+        try:
+            # Each yield is one widget interaction, and so one script rerun
+            for _ in step(at, rnd):
+                started = time.perf_counter()
+                at.run()
+                records.append((step.__name__, time.perf_counter() - started))
+                if at.exception:
+                    raise RuntimeError(at.exception[0].message)
+        except Exception as e:
+            errors.append(f"{role} {step.__name__}: {e}")
+    return at
+
+def run_level(sessions, managers, rounds):
+    """Run `sessions` concurrent sessions and summarise their reruns"""
+    records, errors, apps = [], [], []
+    roles = ['manager'] * managers + ['cashier'] * (sessions - managers)
+    rss_before = _rss_mb()
+
+    def target(role, seed):
+        apps.append(run_session(role, rounds, seed, records, errors))
+
+    threads = [threading.Thread(target=target, args=(role, seed)) for seed, role in enumerate(roles)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    # Sessions are still referenced here, so their state counts towards RSS
+    rss_after = _rss_mb()
+
+    latencies = [seconds for _, seconds in records]
+    return {
+        'sessions': sessions,
+        'managers': managers,
+        'reruns': len(records),
+        'seconds': elapsed,
+        'reruns_per_second': len(records) / elapsed if elapsed else 0.0,
+        'latency_ms': {f'p{p}': _percentile(latencies, p) * 1000 for p in (50, 95, 99)},
+        'step_p95_ms': {step: _percentile([s for name, s in records if name == step], 95) * 1000
+                        for step in sorted({name for name, _ in records})},
+        'rss_mb': rss_after,
+        'mb_per_session': max(rss_after - rss_before, 0.0) / sessions,
+        'errors': errors,
+    }
+
+def run_load_test(levels=(1, 2, 4, 8), rounds=3, manager_share=0.25, rows=5000, db_path=None):
+    """Seed a store, warm the process caches with one session, then run each session count in turn"""
+    import database
+    from benchmark_loaders import seed_database
+
+    db_path = db_path or os.path.join(tempfile.mkdtemp(prefix='inventory-sessions-'), 'inventory.db')
+    seed_database(db_path, rows)
+    os.environ['INVENTORY_DB_PATH'] = database.DB_PATH = db_path
+
+    # Shared caches (schema, products, figures) fill on first use; keep that out of the levels
+    run_level(1, 0, 1)
+    run_level(1, 1, 1)
+    return [run_level(sessions, round(sessions * manager_share), rounds) for sessions in levels]
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate concurrent cashier and manager sessions against app.py')
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8], help='concurrent session counts to run')
+    parser.add_argument('--rounds', type=int, default=3, help='times each session repeats its mix')
+    parser.add_argument('--manager-share', type=float, default=0.25, help='share of sessions following the manager mix')
+    parser.add_argument('--rows', type=int, default=5000, help='products and sales to seed')
+    parser.add_argument('--db', help='database file to create (default: a temporary file)')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    results = run_load_test(args.sessions, args.rounds, args.manager_share, args.rows, args.db)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{os.cpu_count()} CPU(s), {args.rows:,} products, {args.rounds} rounds per session")
+    print(f"{'sessions':>8} {'reruns':>7} {'reruns/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'MB/session':>11} {'errors':>7}")
+    for level in results:
+        latency = level['latency_ms']
+        print(f"{level['sessions']:>8} {level['reruns']:>7} {level['reruns_per_second']:>9.1f} {latency['p50']:>8.0f} "
+              f"{latency['p95']:>8.0f} {latency['p99']:>8.0f} {level['mb_per_session']:>11.1f} {len(level['errors']):>7}")
+    for level in results:
+        for error in level['errors'][:5]:
+            print(f"  {level['sessions']} sessions: {error}")
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(APP_PATH))
+    main()
@@ -0,0 +1,130 @@
+# Point-in-time stock and average inventory from the stock movement ledger
+# Every stock change is a row in stock_movements, and a full per-product
+# snapshot is derived from the ledger every few days (stock_snapshot_runs
+# records the last movement each one covers). Stock at the end of any day is
+# the latest snapshot on or before it plus the movements after that snapshot,
+# and the average over a range is that opening stock plus each movement in the
+# range weighted by the days it was held, so both cost one snapshot plus the
+# movements in question instead of a replay of the whole history.
+#
+# Usage: python stock_ledger.py --snapshot          (e.g. from cron; the expiry job also takes one when due)
+#        python stock_ledger.py --reconcile         (record adjustments for stock changed outside the ledger)
+#        python stock_ledger.py --user 1 --stock-at 2026-06-30 --average 2026-04-01 2026-06-30
+import argparse
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import pandas as pd
+
+import database
+from database import get_connection, get_data_version, reconcile_stock_ledger, snapshot_stock, write_transaction
+
+def _iso(day):
+    return day.strftime('%Y-%m-%d') if isinstance(day, (date, datetime)) else day
+
+def _day_before(day):
+    return (datetime.strptime(day, '%Y-%m-%d').date() - timedelta(days=1)).isoformat()
+
+def query_stock_at(cursor, user_id, day):
+    """{product_id: quantity} at the end of `day`: the latest snapshot on or before it plus the movements after it"""
+    cursor.execute('''
+        WITH run AS (SELECT day, last_movement_id FROM stock_snapshot_runs WHERE day <= :day ORDER BY day DESC LIMIT 1)
+        SELECT product_id, SUM(quantity) FROM (
+            SELECT product_id, quantity FROM stock_snapshots
+            WHERE day = (SELECT day FROM run) AND user_id = :user_id
+            UNION ALL
+            -- Movements after a snapshot are dated on or after its day, which bounds the index range
+            SELECT product_id, quantity FROM stock_movements
+            WHERE user_id = :user_id AND day >= COALESCE((SELECT day FROM run), '') AND day <= :day
+              AND id > COALESCE((SELECT last_movement_id FROM run), 0)
+        ) GROUP BY product_id
+    ''', {'user_id': user_id, 'day': day})
+    return {product_id: quantity for product_id, quantity in cursor.fetchall() if abs(quantity) > 1e-9}
+
+def query_average_inventory(cursor, user_id, since=None, until=None):
+    """{product_id: average units on hand} over the days in [since, until], clipped to the ledger's first day and today"""
+    cursor.execute('SELECT MIN(day) FROM stock_movements WHERE user_id = ?', (user_id,))
+    first_day = cursor.fetchone()[0]
+    today = date.today().isoformat()
+    if first_day is None:
+        return {}
+    since, until = max(since or first_day, first_day), min(until or today, today)
+    if since > until:
+        return {}
+
+    days = (datetime.strptime(until, '%Y-%m-%d') - datetime.strptime(since, '%Y-%m-%d')).days + 1
+    averages = query_stock_at(cursor, user_id, _day_before(since))
+    # A movement on day d is held for the days from d to until
+    cursor.execute('''
+        SELECT product_id, SUM(quantity * (julianday(:until) - julianday(day) + 1))
+        FROM stock_movements WHERE user_id = :user_id AND day >= :since AND day <= :until
+        GROUP BY product_id
+    ''', {'user_id': user_id, 'since': since, 'until': until})
+    for product_id, unit_days in cursor.fetchall():
+        averages[product_id] = averages.get(product_id, 0.0) + unit_days / days
+    return {product_id: average for product_id, average in averages.items() if abs(average) > 1e-9}
+
+def query_inventory_levels(cursor, user_id, since=None, until=None):
+    """Average units on hand per product over [since, until] with its name and category (None once removed)"""
+    averages = query_average_inventory(cursor, user_id, since, until)
+    cursor.execute('SELECT id, name, category FROM products WHERE user_id = ?', (user_id,))
+    names = {product_id: (name, category) for product_id, name, category in cursor.fetchall()}
+    return pd.DataFrame([(product_id, *names.get(product_id, (None, None)), average) for product_id, average in averages.items()],
+                        columns=['product_id', 'Name', 'Category', 'avg_inventory'])
+
+def stock_at(user_id, day, product_id=None):
+    """Units on hand at the end of `day`, per product, or for one product"""
+    conn = get_connection()
+    stock = query_stock_at(conn.cursor(), user_id, _iso(day))
+    conn.close()
+    return stock.get(product_id, 0.0) if product_id is not None else stock
+
+def average_inventory(user_id, since=None, until=None):
+    """Average units on hand per product over [since, until], with name and category"""
+    return _cached_average_inventory(database.DB_PATH, user_id, get_data_version(user_id),
+                                     _iso(since), _iso(until), date.today().isoformat()).copy()
+
+@lru_cache(maxsize=64)
+def _cached_average_inventory(db_path, user_id, version, since, until, today):
+    conn = get_connection()
+    levels = query_inventory_levels(conn.cursor(), user_id, since, until)
+    conn.close()
+    return levels
+
+def take_snapshot(day=None, min_interval_days=0):
+    """Snapshot every product's stock for `day` (default today); None if the last one is too recent.
+    Raises ValueError for a day before the latest movement, which the snapshot would already include."""
+    day = _iso(day) or date.today().isoformat()
+    return write_transaction(lambda cursor: snapshot_stock(cursor, day, min_interval_days))
+
+def reconcile():
+    """Record adjustments bringing the ledger in line with products.quantity; returns how many were needed"""
+    return write_transaction(reconcile_stock_ledger)
+
+def main():
+    parser = argparse.ArgumentParser(description='Stock movement ledger: snapshots, reconciliation and point-in-time stock')
+    parser.add_argument('--snapshot', action='store_true', help="snapshot every product's stock for today")
+    parser.add_argument('--reconcile', action='store_true', help='record adjustments for stock changed outside the ledger')
+    parser.add_argument('--user', type=int, help='user id for --stock-at and --average')
+    parser.add_argument('--stock-at', metavar='YYYY-MM-DD', help='print units on hand at the end of this day')
+    parser.add_argument('--average', nargs=2, metavar=('SINCE', 'UNTIL'), help='print average units on hand over the range')
+    args = parser.parse_args()
+
+    database.init_user_database()
+    if args.reconcile:
+        print(f"Recorded {reconcile()} reconciling adjustment(s)")
+    if args.snapshot:
+        print(f"Snapshot of {take_snapshot()} product(s) for {date.today().isoformat()}")
+    if (args.stock_at or args.average) and not args.user:
+        parser.error('--stock-at and --average need --user')
+    if args.stock_at:
+        stock = stock_at(args.user, args.stock_at)
+        print(f"user {args.user} at end of {args.stock_at}: {len(stock)} product(s), {sum(stock.values()):,.3f} units")
+    if args.average:
+        levels = average_inventory(args.user, *args.average)
+        print(f"user {args.user} {args.average[0]}..{args.average[1]}: average {levels['avg_inventory'].sum():,.3f} units on hand")
+        for category, units in levels.groupby('Category', dropna=False)['avg_inventory'].sum().sort_values(ascending=False).items():
+            print(f"    {category if isinstance(category, str) else '(removed)'}: {units:,.3f}")
+
+if __name__ == '__main__':
+    main()